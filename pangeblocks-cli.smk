@@ -8,6 +8,7 @@ print(DECOMPOSITION)
 PATH_OUTPUT = config["PATH_OUTPUT"]
 PATH_MSAS   = config["PATH_MSAS"]
 LOG_LEVEL = config["LOG_LEVEL"]
+MSA_CACHE = pjoin(PATH_OUTPUT, "msa-cache") # encoded MSAs shared by all rules
 
 ALPHA=[config["THRESHOLD_VERTICAL_BLOCKS"]]
 
@@ -97,38 +98,29 @@ rule install_wild_pbwt:
         fi
         """
 
-rule compute_vertical_blocks:
+rule vertical_blocks_and_submsa_index:
+    # vertical blocks and subMSAs for all values of alpha, scanning the MSA once
     input:
         msa=pjoin(PATH_MSAS, "{name_msa}" + EXT_MSA),
     output: 
-        pjoin(PATH_OUTPUT, "maximal-blocks", "{name_msa}","vertical_blocks_alpha{alpha}.json")
+        vertical_blocks=expand(pjoin(PATH_OUTPUT, "maximal-blocks", "{{name_msa}}","vertical_blocks_alpha{alpha}.json"), alpha=ALPHA),
+        submsa_index=expand(pjoin(PATH_OUTPUT, "submsas", "{{name_msa}}_alpha{alpha}.txt"), alpha=ALPHA),
     params:
-        log_level=LOG_LEVEL
+        alphas=" ".join(str(alpha) for alpha in ALPHA),
+        # '{alpha}' is replaced by each alpha in vertical_blocks_submsas.py
+        output_vertical_blocks=lambda wildcards: pjoin(PATH_OUTPUT, "maximal-blocks", wildcards.name_msa, "vertical_blocks_alpha{alpha}.json"),
+        output_submsa_index=lambda wildcards: pjoin(PATH_OUTPUT, "submsas", wildcards.name_msa + "_alpha{alpha}.txt"),
+        max_positions=config["MAX_POSITIONS_SUBMSAS"],
+        log_level=LOG_LEVEL,
+        msa_cache=MSA_CACHE
     log:
-        stderr=pjoin(PATH_OUTPUT, "logs", "{name_msa}-rule-compute_blocks_alpha{alpha}.err.log"),
+        stderr=pjoin(PATH_OUTPUT, "logs", "{name_msa}-rule-vertical_blocks_and_submsa_index.err.log"),
     conda: 
         "envs/pangeblocks.yml"
     shell:
-        """/usr/bin/time --verbose src/greedy_vertical_blocks.py {input.msa} --output {output} \
-        --threshold-vertical-blocks {wildcards.alpha} --log-level {params.log_level} > {log.stderr} 2>&1"""
-
-rule submsa_index:
-    input:
-        path_msa=pjoin(PATH_MSAS, "{name_msa}" + EXT_MSA),
-        path_vertical_blocks=pjoin(PATH_OUTPUT, "maximal-blocks", "{name_msa}", "vertical_blocks_alpha{alpha}.json"),
-    output:
-        path_submsa_index=pjoin(PATH_OUTPUT, "submsas", "{name_msa}_alpha{alpha}.txt")
-    params:
-        max_positions=config["MAX_POSITIONS_SUBMSAS"]
-    log: 
-        stdout=pjoin(PATH_OUTPUT, "logs", "{name_msa}-alpha{alpha}-rule-submsa_index.out.log"),
-    conda: 
-        "envs/pangeblocks.yml"
-    shell:
-        """/usr/bin/time --verbose src/submsas.py --path-msa {input.path_msa} \
-        --path-vertical-blocks {input.path_vertical_blocks} --threshold-vertical-blocks {wildcards.alpha} \
-        --max-positions-submsas {params.max_positions} --output {output} > {log.stdout} 2>&1
-        """
+        """/usr/bin/time --verbose src/vertical_blocks_submsas.py {input.msa} --alphas {params.alphas} \
+        --output-vertical-blocks "{params.output_vertical_blocks}" --output-submsa-index "{params.output_submsa_index}" \
+        --max-positions-submsas {params.max_positions} --log-level {params.log_level} --msa-cache-dir {params.msa_cache} > {log.stderr} 2>&1"""
 
 rule ilp:
     input:
@@ -145,8 +137,10 @@ rule ilp:
         workers=config["SUBMSAS"],
         standard_decomposition=config["STANDARD"],
         alpha_consistent=config["ALPHA_CONSISTENT"],
+        collapse_haplotypes=config["COLLAPSE_HAPLOTYPES"],
         min_nrows_fix_block=config["MIN_ROWS_FIX_BLOCK"],
-        min_ncols_fix_block=config["MIN_COLS_FIX_BLOCK"]
+        min_ncols_fix_block=config["MIN_COLS_FIX_BLOCK"],
+        msa_cache=MSA_CACHE
     threads:
         config["ILP"]
     log:
@@ -163,8 +157,9 @@ rule ilp:
         --submsa-index {input.path_submsas_index} --time-limit {params.time_limit} --solve-ilp True \
         --use-wildpbwt True --bin-wildpbwt {input.bin_wildpbwt} \
         --standard-decomposition {params.standard_decomposition} --threads-ilp {params.threads_ilp} \
-        --workers {params.workers} --alpha-consistent {params.alpha_consistent} \
-        --min-rows-fixblock {params.min_nrows_fix_block} --min-columns-fixblock {params.min_ncols_fix_block} > {output.auxfile} 2> {log.stderr}
+        --workers {params.workers} --alpha-consistent {params.alpha_consistent} --collapse-haplotypes {params.collapse_haplotypes} \
+        --min-rows-fixblock {params.min_nrows_fix_block} --min-columns-fixblock {params.min_ncols_fix_block} \
+        --msa-cache-dir {params.msa_cache} > {output.auxfile} 2> {log.stderr}
         """
 
 rule coverage_to_graph:
@@ -176,6 +171,7 @@ rule coverage_to_graph:
         path_gfa=pjoin(PATH_OUTPUT, "gfa","{obj_func}", "penalization{penalization}-min_len{min_len}-min_coverage{min_coverage}-alpha{alpha}", "{name_msa}.gfa")
     params:
         dir_subsols=pjoin(PATH_OUTPUT, "ilp", "{name_msa}", "{obj_func}","penalization{penalization}-min_len{min_len}-min_coverage{min_coverage}-alpha{alpha}"),
+        msa_cache=MSA_CACHE
     log:
         stdout=pjoin(PATH_OUTPUT, "logs", "{name_msa}-{obj_func}-penalization{penalization}-min_len{min_len}-min_coverage{min_coverage}-alpha{alpha}-rule-coverage_to_graph.log")
     conda: 
@@ -183,7 +179,7 @@ rule coverage_to_graph:
     shell:
         """/usr/bin/time --verbose src/compute_gfa.py --path-msa {input.path_msa} \
         --dir-subsolutions {params.dir_subsols} --path-vert-blocks {input.path_vb} \
-        --path-gfa {output} > {log} 2>&1"""
+        --msa-cache-dir {params.msa_cache} --path-gfa {output} > {log} 2>&1"""
 
 rule postprocessing_gfa:
     input:
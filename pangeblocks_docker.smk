@@ -12,6 +12,7 @@ config['alpha']=config["THRESHOLD_VERTICAL_BLOCKS"]
 # path msas
 config['tmpdir']=pjoin(config["PATH_OUTPUT"], "tmp")
 config['logdir']=pjoin(config["PATH_OUTPUT"], "logs")
+config['msa_cache']=pjoin(config['tmpdir'], "msa-cache") # encoded MSA shared by all rules
 Path(config['tmpdir']).mkdir(parents=True, exist_ok=True)
 Path(config['logdir']).mkdir(parents=True, exist_ok=True)
 pprint.pprint(config)
@@ -21,38 +22,25 @@ rule all:
     input:
         gfa=config['gfa'],
 
-rule compute_vertical_blocks:
+rule vertical_blocks_and_submsa_index:
+    # vertical blocks and subMSAs scanning the MSA once
     input:
         msa=config['msa'],
     output: 
-        pjoin(config['tmpdir'], "maximal-blocks", "vertical_blocks.json")
+        vertical_blocks=pjoin(config['tmpdir'], "maximal-blocks", "vertical_blocks.json"),
+        submsa_index=pjoin(config['tmpdir'], "submsas.txt")
     params:
         root_dir=config['root_dir'],
         alpha=config['alpha'],
-        log_level=config['LOG_LEVEL']
+        max_positions=config["MAX_POSITIONS_SUBMSAS"],
+        log_level=config['LOG_LEVEL'],
+        msa_cache=config['msa_cache']
     log:
-        stderr=pjoin(config['logdir'], "rule-compute_vertical_blocks.log"),
+        stderr=pjoin(config['logdir'], "rule-vertical_blocks_and_submsa_index.log"),
     shell:
-        """/usr/bin/time --verbose {params.root_dir}/src/greedy_vertical_blocks.py {input.msa} --output {output} \
-        --threshold-vertical-blocks {params.alpha} --log-level {params.log_level} > {log.stderr} 2>&1"""
-
-rule submsa_index:
-    input:
-        path_msa=config['msa'],
-        path_vertical_blocks=pjoin(config['tmpdir'], "maximal-blocks", "vertical_blocks.json"),
-    output:
-        path_submsa_index=pjoin(config['tmpdir'], "submsas.txt")
-    params:
-        root_dir=config['root_dir'],
-        alpha=config['alpha'],
-        max_positions=config["MAX_POSITIONS_SUBMSAS"]
-    log: 
-        stdout=pjoin(config['logdir'], "rule-submsa_index.log"),
-    shell:
-        """/usr/bin/time --verbose {params.root_dir}/src/submsas.py --path-msa {input.path_msa} \
-        --path-vertical-blocks {input.path_vertical_blocks} --threshold-vertical-blocks {params.alpha} \
-        --max-positions-submsas {params.max_positions} --output {output} > {log.stdout} 2>&1
-        """
+        """/usr/bin/time --verbose {params.root_dir}/src/vertical_blocks_submsas.py {input.msa} --alphas {params.alpha} \
+        --output-vertical-blocks {output.vertical_blocks} --output-submsa-index {output.submsa_index} \
+        --max-positions-submsas {params.max_positions} --log-level {params.log_level} --msa-cache-dir {params.msa_cache} > {log.stderr} 2>&1"""
 
 rule ilp:
     input:
@@ -69,12 +57,14 @@ rule ilp:
         workers=config["SUBMSAS"],
         standard_decomposition=config["STANDARD"],
         alpha_consistent=config["ALPHA_CONSISTENT"],
+        collapse_haplotypes=config["COLLAPSE_HAPLOTYPES"],
         min_nrows_fix_block=config["MIN_ROWS_FIX_BLOCK"],
         obj_function=config['OBJECTIVE_FUNCTION'],
         penalization=config['PENALIZATION'],
         min_len=config['MIN_LEN'],
         min_coverage=config['MIN_COVERAGE'],
-        min_ncols_fix_block=config["MIN_COLS_FIX_BLOCK"]
+        min_ncols_fix_block=config["MIN_COLS_FIX_BLOCK"],
+        msa_cache=config['msa_cache']
     log:
         stderr=pjoin(config['logdir'], "rule-ilp.log"),
     resources:
@@ -87,8 +77,9 @@ rule ilp:
         --submsa-index {input.path_submsas_index} --time-limit {params.time_limit} --solve-ilp True \
         --use-wildpbwt True --bin-wildpbwt "{params.root_dir}/lib/Wild-pBWT/bin/wild-pbwt" \
         --standard-decomposition {params.standard_decomposition} --threads-ilp {params.threads_ilp} \
-        --workers {params.workers} --alpha-consistent {params.alpha_consistent} \
-        --min-rows-fixblock {params.min_nrows_fix_block} --min-columns-fixblock {params.min_ncols_fix_block} > {output.auxfile} 2> {log.stderr}
+        --workers {params.workers} --alpha-consistent {params.alpha_consistent} --collapse-haplotypes {params.collapse_haplotypes} \
+        --min-rows-fixblock {params.min_nrows_fix_block} --min-columns-fixblock {params.min_ncols_fix_block} \
+        --msa-cache-dir {params.msa_cache} > {output.auxfile} 2> {log.stderr}
         """
 
 rule coverage_to_graph:
@@ -101,12 +92,13 @@ rule coverage_to_graph:
     params:
         root_dir=config['root_dir'],
         dir_subsols=pjoin(config['tmpdir'], "ilp"),
+        msa_cache=config['msa_cache'],
     log:
         stdout=pjoin(config['logdir'], "coverage_to_graph.log")
     shell:
         """/usr/bin/time --verbose {params.root_dir}/src/compute_gfa.py --path-msa {input.msa} \
         --dir-subsolutions {params.dir_subsols} --path-vert-blocks {input.path_vb} \
-        --path-gfa {output} > {log} 2>&1"""
+        --msa-cache-dir {params.msa_cache} --path-gfa {output} > {log} 2>&1"""
 
 rule postprocessing_gfa:
     input:
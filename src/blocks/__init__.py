@@ -2,4 +2,6 @@ from .block import LightBlock as Block
 # from .block_decomposition import block_decomposition
 from .analyzer import BlockAnalyzer
 from .block_decomposer import Decomposer
-from .positional_string import PositionalString
\ No newline at end of file
+from .positional_string import PositionalString
+from .block_index import BlockIndex, CellIndex
+from .block_table import BlockTable
\ No newline at end of file
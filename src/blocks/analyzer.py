@@ -3,6 +3,8 @@ import numpy as np
 from typing import Optional, Union
 from pathlib import Path
 from .block import Block
+from .block_table import BlockTable
+from .overlaps import overlapping_pairs
 
 class BlockAnalyzer:
     """Compute some stats for a list of blocks"""
@@ -55,18 +57,8 @@ class BlockAnalyzer:
         
         # save pairs of indexes for the sorted blocks that intersect
         intersections = [] 
-        for pos1, block1 in enumerate(blocks[:-1]):
-            # compare against the next blocks in the sorted list 
-            for rel_pos, block2 in enumerate(blocks[pos1+1:]):
-                pos2 = rel_pos + pos1 + 1
-                block2 = blocks[pos2]
-
-                # check for not empty intersection
-                common_rows = list(set(block1.K).intersection(set(block2.K))) # intersection set K
-                common_cols = list(set(range(block1.start,block1.end+1)).intersection(set(range(block2.start,block2.end+1)))) # intersection columns [i,j]
-
-                if (common_rows and common_cols):
-                    intersections.append((pos1,pos2))
+        for pos1, pos2, _ in overlapping_pairs(BlockTable.from_blocks(blocks)):
+            intersections.extend(zip(pos1.tolist(), pos2.tolist()))
 
         if return_sorted_list is True:
             return intersections, blocks
@@ -1,17 +1,56 @@
-from pydantic import root_validator, validator
-from pydantic.dataclasses import dataclass as pydataclass
-from dataclasses import dataclass
+"""
+Blocks are named tuples (K, start, end[, label]): creating them costs about the same as a tuple,
+and they can be used wherever a tuple (K, start, end) was used (hashing, sets, json).
+
+K is sorted when the block is created (whatever the collection of rows, tuples too),
+and start and end are cast to int, so equal blocks always compare and hash as equal.
+Blocks are not validated when created, set the environment variable PANGEBLOCKS_VALIDATE_BLOCKS=1
+to check every block (debug mode), or call validate() explicitly.
+"""
+import os
+from typing import NamedTuple
 from .positional_string import PositionalString
-from typing import Optional
 
-@pydataclass(eq=True, frozen=True)
-class Block:
-    "class for keeping track a block"
+VALIDATE_BLOCKS = os.environ.get("PANGEBLOCKS_VALIDATE_BLOCKS", "0") not in ("", "0")
+
+_tuple_new = tuple.__new__
+
+
+def _validate(K, start, end):
+    "K is a non empty tuple of rows without repetitions and start <= end"
+    if type(K) is not tuple or not K:
+        raise ValueError(f"K must be a non empty tuple, K={K}")
+    if any(r1 >= r2 for r1, r2 in zip(K, K[1:])):
+        raise ValueError(f"K must be sorted without repetitions, K={K}")
+    if not (isinstance(start, int) and isinstance(end, int)):
+        raise ValueError(f"start and end must be int, start={start!r} and end={end!r}")
+    if start > end:
+        raise ValueError(f"start must be <= than end, start={start} and end={end}")
+
+
+class _Block(NamedTuple):
     K: tuple
     start: int
     end: int
     label: str
 
+
+class Block(_Block):
+    "class for keeping track a block"
+    __slots__ = ()
+
+    def __new__(cls, K, start: int, end: int, label: str):
+        block = _tuple_new(cls, (tuple(sorted(K)), int(start), int(end), label))
+        if VALIDATE_BLOCKS:
+            block.validate()
+        return block
+
+    def validate(self):
+        "raise ValueError if the block is not valid"
+        _validate(self.K, self.start, self.end)
+        if len(self.label) != self.end-self.start+1:
+            raise ValueError("len of the string 'label' must match the distance between columns 'start' and 'end'")
+
     def to_positional_string(self,) -> PositionalString:
         return PositionalString(self.label, self.start, self.end)
 
@@ -21,40 +60,28 @@ class Block:
     def len(self):
         "Length of the blocks, number of columns it spans"
         return self.end-self.start+1
-    
-    @root_validator
-    def check_len_label(cls, values):
-        "length of string must be equal to end-start+1"
-        label = values.get("label")
-        start = values.get("start")
-        end = values.get("end")
-
-        if len(label) != end-start+1:
-            raise ValueError("len of the string 'label' must match the distance between columns 'start' and 'end'")
-        return values
-
-    @root_validator
-    def check_start_less_or_equal_end(cls, values):
-        "start <=end"
-        start = values.get("start")
-        end = values.get("end")
-
-        if start > end:
-            raise ValueError(f"start must be <= than end, start={start} and end={end}")
-        return values
 
-    @validator("K")
-    def sort_K(cls, v):
-        "sort values in K"
-        return tuple(sorted(v))
 
-@pydataclass(eq=True, frozen=True)
-class LightBlock:
-    "class for keeping track a block without the label"
+class _LightBlock(NamedTuple):
     K: tuple
     start: int
     end: int
-        
+
+
+class LightBlock(_LightBlock):
+    "class for keeping track a block without the label"
+    __slots__ = ()
+
+    def __new__(cls, K, start: int, end: int):
+        block = _tuple_new(cls, (tuple(sorted(K)), int(start), int(end)))
+        if VALIDATE_BLOCKS:
+            block.validate()
+        return block
+
+    def validate(self):
+        "raise ValueError if the block is not valid"
+        _validate(self.K, self.start, self.end)
+
     def str(self):
         return "%s,%s,%s" % (self.K,self.start,self.end)
 
@@ -69,32 +96,3 @@ class LightBlock:
     
     def ncells(self):
         return self.nrows()*self.ncols()
-    
-    @root_validator
-    def check_start_less_or_equal_end(cls, values):
-        "start <=end"
-        start = values.get("start")
-        end = values.get("end")
-
-        if start > end:
-            raise ValueError(f"start must be <= than end, start={start} and end={end}")
-        return values
-
-    @validator("K")
-    def sort_K(cls, v):
-        "sort values in K"
-        return tuple(sorted(v))
-    
-    def __getitem__(self, item):
-        if item==0:
-            return self.K
-        elif item==1 or item==-2: 
-            return self.start 
-        elif item==2 or item == -1: 
-            return self.end
-
-    # def __hash__(self) -> int:
-    #     pass
-
-    # def __eq__(self, __value: object) -> bool:
-    #     pass
\ No newline at end of file
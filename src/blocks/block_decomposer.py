@@ -1,16 +1,25 @@
 import json
+import numpy as np
 from pathlib import Path
-from typing import Optional, Union
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Union
 from . import Block
+from .block_table import BlockTable
+from .block_index import CellIndex
+from .row_sets import row_words, words_rows
+from .overlaps import overlapping_pairs
 from .analyzer import BlockAnalyzer
 # from .block_decomposition import block_decomposition
 from .decompositions import (
     block_decomposition_row_maximal,
     block_decomposition_standard, 
     block_decomposition_complete,
+    batch_decomposition_row_maximal,
+    batch_decomposition_complete,
 )
 
-from dataclasses import astuple
 
 import sys # sys.getsizeof()
 import logging
@@ -18,6 +27,11 @@ logging.basicConfig(level=logging.INFO,
                     format='[Block Decomposer] %(asctime)s.%(msecs)03d | %(message)s',
                     datefmt='%Y-%m-%d@%H:%M:%S')
 
+PAIRS_BY_SHARD = 1 << 15 # pairs of blocks decomposed by each task of the pool of processes
+BATCH_BITS = 1 << 26 # bits of rows of new blocks decoded at once by the batch decomposition
+MAX_BLOCKS_BY_PAIR = 11 # blocks created by the decomposition of one pair (complete decomposition)
+
+
 class Decomposer:
     """
     Given a list of maximal blocks, apply a decomposition by pairs and return a list with all new blocks + the input set of blocks
@@ -28,161 +42,171 @@ class Decomposer:
     """
 
     def __init__(self, return_positional_strings: bool=False, standard_decomposition: bool = False,
-                 min_nrows_to_fix_block: int = 0, min_ncols_to_fix_block: int = 0
+                 min_nrows_to_fix_block: int = 0, min_ncols_to_fix_block: int = 0,
+                 n_processes: int = 1, pairs_by_shard: int = PAIRS_BY_SHARD,
                  ):
         self.return_positional_strings=return_positional_strings
         self.standard_decomposition=standard_decomposition
         self.min_nrows_to_fix_block = min_nrows_to_fix_block
         self.min_ncols_to_fix_block = min_ncols_to_fix_block
+        # pairs of blocks are decomposed by shards in a pool of processes if n_processes > 1
+        self.n_processes = n_processes
+        self.pairs_by_shard = pairs_by_shard
 
         logging.info(f">>>> Decomposer standard_decomposition={standard_decomposition}")
         if standard_decomposition is True:
             logging.info("Using complete decomposition")
             self.block_decomposition=block_decomposition_complete
+            self.batch_decomposition=batch_decomposition_complete
         else:
             logging.info("Using row maximal decomposition")
             self.block_decomposition=block_decomposition_row_maximal
+            self.batch_decomposition=batch_decomposition_row_maximal
 
         if min_nrows_to_fix_block>0 or min_ncols_to_fix_block>0:
             logging.info(f"Fix blocks: blocks with at least {min_nrows_to_fix_block} rows and {min_ncols_to_fix_block} columns will be fixed")
         else:
             logging.info("Fix blocks: no blocks will be fixed")
 
-    def __call__(self, list_blocks: Optional[list[Block]] = None, path_blocks: Optional[Union[str, Path]] = None, **kwargs) -> dict:
+    def __call__(self, list_blocks: Optional[Union[list[Block], BlockTable]] = None, path_blocks: Optional[Union[str, Path]] = None, **kwargs) -> dict:
         start,end = kwargs.get("start",0), kwargs.get("end",0)
         self.start, self.end = start, end # only for logging 
         if path_blocks:
             list_blocks = self._load_list_blocks(path_blocks)
             logging.info(f"Blocks loaded from {str(path_blocks)}")
 
-        # compute list with (idx1,idx2) of intersected blocks
-        logging.info(f"Computing pairs of overlapping blocks ({start},{end})")
-        inter_blocks, list_blocks=self._list_inter_blocks(list_blocks, return_sorted_list=True) 
-        logging.info(f"Computed pairs of overlapping blocks ({start},{end})")
-        logging.info(f"Number of pairs of overlapping blocks {len(inter_blocks)} ({start},{end})")
-        logging.info(f"Size [bytes] list of pairs indexes of overlapping blocks {sys.getsizeof(inter_blocks)} ({start},{end})")
+        # blocks sorted by start, as required by _iter_inter_blocks
+        list_blocks = sorted(list_blocks, key=lambda block: (block.start, len(block.K)))
+        table = BlockTable.from_blocks(list_blocks)
+
+        # pairs (idx1,idx2) of intersected blocks, streamed by chunks to the decomposition
+        inter_blocks = self._iter_inter_blocks(table)
         logging.info(f"Size [bytes] list of blocks {sys.getsizeof(list_blocks)} ({start},{end})")
         
         # find blocks to fix: indexes of the 'list_blocks'
         if self.min_ncols_to_fix_block>0 or self.min_nrows_to_fix_block>0:
-            pos_blocks_to_fix = self.find_blocks_to_fix(list_blocks)
+            pos_blocks_to_fix = self.find_blocks_to_fix(table)
         else: 
             pos_blocks_to_fix = []
         for pos in pos_blocks_to_fix:
             logging.info(f"block fixed {list_blocks[pos]} ({start},{end})")
 
         # decompose blocks: do not contain fixed blocks (given in 'pos_blocks_to_fix' or any block intersecting one of those ones) 
-        logging.info(f"Computing decomposition from intersections of blocks ({start},{end})")
-        decomposed_blocks=self.decomposition_from_inter_blocks(list_blocks, inter_blocks, pos_blocks_to_fix) 
+        logging.info(f"Computing pairs of overlapping blocks and decomposition from intersections of blocks ({start},{end})")
+        decomposed_blocks=self.decomposition_from_inter_blocks(list_blocks, inter_blocks, pos_blocks_to_fix, table=table) 
         logging.info(f"Computed decomposition from intersections of blocks ({start},{end})")
         logging.info(f"Size [bytes] list of decomposed blocks {sys.getsizeof(list_blocks)} ({start},{end})")
         
         if self.return_positional_strings is True:
-            return [block.to_positional_string() for block in decomposed_blocks]        
+            return [Block(*block).to_positional_string() for block in decomposed_blocks]        
         
         fixed_blocks = [list_blocks[pos] for pos in pos_blocks_to_fix]
         logging.info(f"intersection between decomposed_blocks and fixed_blocks {len(set(decomposed_blocks).intersection(fixed_blocks))}")
-        return decomposed_blocks, fixed_blocks
+        return BlockTable.from_blocks(decomposed_blocks), BlockTable.from_blocks(fixed_blocks)
 
-    def decomposition_from_inter_blocks(self, list_blocks, inter_blocks, pos_blocks_to_fix):
+    def decomposition_from_inter_blocks(self, list_blocks, inter_blocks, pos_blocks_to_fix, table: Optional[BlockTable] = None):
         """Return a new list of blocks that arise from the decomposition of the intersections. This list:
         - DO CONTAIN maximal blocks
         - DO NOT CONTAIN the blocks that are fixed (pos_blocks_to_fix), or any block intersecting one of the fixed blocks
+        'inter_blocks' are chunks of pairs of positions (pos1, pos2), as two arrays by chunk
+        'table' is the BlockTable of 'list_blocks', built if not given
         """
         # decomposed_blocks=set(astuple(block) for pos,block in enumerate(list_blocks) if pos not in pos_blocks_to_fix)
         decomposed_blocks=set()
         pos_discard_block = set() # positions of maximal blocks that intersects with one of the fixed blocks
-        # decompose pairs of blocks with non-empty intersection
-        for pos1, pos2 in inter_blocks:
-            block1 = list_blocks[pos1]
-            block2 = list_blocks[pos2]
-            list_blocks_decomposition = self.block_decomposition(block1, block2)
-
-            # remove any block intersecting one of the fixed blocks
-            if pos1 in pos_blocks_to_fix:
-                pos_discard_block.add(pos2)
-                fixed_block = block1
-                other_block = block2
-
-                for block in list_blocks_decomposition:
-                    if self._blocks_intersect(block, fixed_block):
-                        list_blocks_decomposition.remove(block)
-                if fixed_block in list_blocks_decomposition:
-                    list_blocks_decomposition.remove(fixed_block)
-                if other_block in list_blocks_decomposition:
-                    list_blocks_decomposition.remove(other_block)
-                # decomposed_blocks.discard(other_block)
-
-            if pos2 in pos_blocks_to_fix:
-                pos_discard_block.add(pos1)
-                fixed_block = block2
-                other_block = block1
-
-                for block in list_blocks_decomposition:
-                    if self._blocks_intersect(block, fixed_block):
-                        list_blocks_decomposition.remove(block)
-                if fixed_block in list_blocks_decomposition:
-                    list_blocks_decomposition.remove(fixed_block)
-                if other_block in list_blocks_decomposition:
-                    list_blocks_decomposition.remove(other_block)
-                # decomposed_blocks.discard(other_block)
-            
-            for block in list_blocks_decomposition:
-                if not any([self._blocks_intersect(block,fix_block) for fix_block in [list_blocks[pos] for pos in pos_blocks_to_fix]]):
-                    # logging.info(f"> > block from decomposition in input set {block}")
-                    decomposed_blocks.add(astuple(block))
-        
+
+        # pairs are decomposed by batches with numpy, new blocks are tested against the cells of the fixed blocks
+        table = BlockTable.from_blocks(list_blocks if table is None else table)
+        words = row_words(table)
+        pos_fixed = np.unique(np.asarray(pos_blocks_to_fix, dtype=np.int64))
+        fixed_cells = CellIndex(table.take(pos_fixed), words.shape[1]) if len(pos_fixed) else None
+        state = (self, table, words, pos_fixed, fixed_cells, _SeenBlocks())
+
+        # decompose pairs of blocks with non-empty intersection, by shards in parallel if there are enough pairs
+        shards = _shards(inter_blocks, self.pairs_by_shard)
+        first_shard = next(shards, None)
+        if first_shard is not None:
+            shards = chain([first_shard], shards)
+        if self.n_processes > 1 and first_shard is not None and len(first_shard[0]) == self.pairs_by_shard:
+            self._decompose_shards(shards, state, decomposed_blocks, pos_discard_block)
+        else:
+            for shard in shards:
+                blocks, pos_discard = _decompose_shard(shard, state)
+                decomposed_blocks.update(blocks)
+                pos_discard_block.update(pos_discard)
+
         # add maximal blocks not intersecting fixed blocks
         pos_discard_block.update(pos_blocks_to_fix)
 
         for pos,block in enumerate(list_blocks):
             if pos not in pos_discard_block:
                 # logging.info(f"> > maximal block in input set {block}")
-                decomposed_blocks.add(astuple(block))
+                decomposed_blocks.add(block)
 
-        return [Block(*b) for b in decomposed_blocks]
-    
-    def _list_inter_blocks(self, list_blocks: list[Block], return_sorted_list: bool = False) -> list[tuple]:
-        # FIXME: remove return_sorted_list param, does not make sense to not return the sorted list, since 'intersections' correspond to indexes in the sorted list
-        "list of indexes (in a sorted list by i) of pairs of blocks with non-empty intersection"
-        blocks = sorted(list_blocks, key=lambda block: (block.start, len(block.K)))
-        
-        # save pairs of indexes for the sorted blocks that intersect
-        intersections = [] 
+        return list(decomposed_blocks)
 
-        # Lemma1: given two overlapping maximal blocks (K1,b1,e1) and (K2,b2,e2) 
-        # [b1,e1] subset [b2,e2] iff K2 subset K1
-        # primary intersection: the one that fits the above equivalence, secondary intersection: negation of the equivalence
+    def _decompose_shards(self, shards, state, decomposed_blocks, pos_discard_block):
+        """Decompose shards of pairs in a pool of processes, each shard is deduplicated by its worker.
+        Shards are merged in order, so 'decomposed_blocks' is the same set built by the serial decomposition"""
+        logging.info(f"Decomposition with {self.n_processes} processes ({self.start},{self.end})")
+        with ProcessPoolExecutor(max_workers=self.n_processes, initializer=_init_worker, initargs=(state,)) as pool:
+            # a bounded number of shards in flight, pairs are not all materialized at once
+            pending = deque()
+            for shard in chain(shards, [None]):
+                if shard is not None:
+                    pending.append(pool.submit(_decompose_shard, shard))
+                while pending and (shard is None or len(pending) > 2 * self.n_processes):
+                    blocks, pos_discard = pending.popleft().result()
+                    decomposed_blocks.update(blocks)
+                    pos_discard_block.update(pos_discard)
 
-        n_primary_intersections = 0
-        n_secondary_intersections = 0            
+    def _decompose_batch(self, pos1, pos2, table, words, seen, fixed_cells=None) -> list[tuple]:
+        """Decompose the pairs (pos1, pos2) of blocks of 'table' with the batch kernel, 'words' are the bitsets of their rows.
+        Return the new blocks as tuples, in order and without the ones in 'seen' (blocks returned before)
+        or intersecting the cells of the fixed blocks ('fixed_cells')"""
+        blocks = []
+        starts, ends = table.starts.astype(np.int64), table.ends.astype(np.int64)
+        # bound the bits of the rows decoded at once
+        batch = max(1, BATCH_BITS // (MAX_BLOCKS_BY_PAIR * 64 * words.shape[1]))
+        for first in range(0, len(pos1), batch):
+            p1, p2 = pos1[first:first + batch], pos2[first:first + batch]
+            new_words, new_starts, new_ends = self.batch_decomposition(words[p1], starts[p1], ends[p1], words[p2], starts[p2], ends[p2])
+            if fixed_cells is not None:
+                keep = ~fixed_cells.intersects(new_words, new_starts, new_ends)
+                new_words, new_starts, new_ends = new_words[keep], new_starts[keep], new_ends[keep]
 
-        for pos1, block1 in enumerate(blocks[:-1]):
-            # compare against the next blocks in the sorted list 
-            for rel_pos, block2 in enumerate(blocks[pos1+1:]):
-                pos2 = rel_pos + pos1 + 1
-                block2 = blocks[pos2]
+            # first occurrence of each block, in order, not returned before
+            keys = np.ascontiguousarray(np.concatenate([new_words, new_starts[:, None].astype(np.uint64), new_ends[:, None].astype(np.uint64)], axis=1))
+            _, first_occurrence = np.unique(keys.view(np.dtype((np.void, keys.shape[1] * 8))).ravel(), return_index=True)
+            first_occurrence.sort()
+            first_occurrence = first_occurrence[seen.new(keys[first_occurrence])]
 
-                # TODO: change this for the method does_block_intersect(block1, block2)
-                # check for not empty intersection
-                common_rows = list(set(block1.K).intersection(set(block2.K))) # intersection set K
-                common_cols = list(set(range(block1.start,block1.end+1)).intersection(set(range(block2.start,block2.end+1)))) # intersection columns [i,j]
+            rows, offsets = words_rows(new_words[first_occurrence])
+            rows, offsets = rows.tolist(), offsets.tolist()
+            blocks.extend(
+                (tuple(rows[offsets[j]:offsets[j + 1]]), start, end) 
+                for j, (start, end) in enumerate(zip(new_starts[first_occurrence].tolist(), new_ends[first_occurrence].tolist()))
+            )
+        return blocks
 
-                if (common_rows and common_cols):
-                    intersections.append((pos1,pos2))
+    def _iter_inter_blocks(self, blocks: Union[list[Block], BlockTable]) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """chunks of pairs of indexes (pos1 < pos2, in lexicographic order) of blocks with non-empty intersection,
+        as two arrays pos1 and pos2 by chunk. 'blocks' must be sorted by start"""
+        # Lemma1: given two overlapping maximal blocks (K1,b1,e1) and (K2,b2,e2) 
+        # [b1,e1] subset [b2,e2] iff K2 subset K1
+        # primary intersection: the one that fits the above equivalence, secondary intersection: negation of the equivalence
+        n_pairs = 0
+        n_primary_intersections = 0
 
-                    # count primary and second intersections
-                    if set(block1.K).issubset(block2.K) or set(block2.K).issubset(block1.K):
-                        n_primary_intersections +=1                        
-                    else:
-                        n_secondary_intersections +=1
+        for pos1, pos2, nested in overlapping_pairs(BlockTable.from_blocks(blocks)):
+            n_pairs += len(pos1)
+            # count primary and second intersections (K1 subset K2 or K2 subset K1)
+            n_primary_intersections += int(nested.sum())
+            yield pos1, pos2
 
+        logging.info(f"Number of pairs of overlapping blocks {n_pairs} ({self.start},{self.end})")
         logging.info(f"Number of primary intersections {n_primary_intersections} ({self.start},{self.end})")
-        logging.info(f"Number of secondary intersections {n_secondary_intersections} ({self.start},{self.end})")
-
-        if return_sorted_list is True:
-            return intersections, blocks
-        return intersections
+        logging.info(f"Number of secondary intersections {n_pairs - n_primary_intersections} ({self.start},{self.end})")
 
     @staticmethod
     def _load_list_blocks(path_list_blocks: Union[str,Path]) -> list[Block]:
@@ -193,36 +217,96 @@ class Decomposer:
     
     def find_blocks_to_fix(self, list_blocks):
         "Return positions in the list_blocks of the blocks that will be fixed"
+        table = BlockTable.from_blocks(list_blocks)
         # filter (position in the list of) blocks that satisfy the criteria of minimum number of rows and columns
-        potential_blocks_to_fix = [pos for pos,block in enumerate(list_blocks) if block.nrows() >= self.min_nrows_to_fix_block and block.ncols() >= self.min_ncols_to_fix_block]
-        blocks_to_discard = [] # list of (positions in the list of) blocks that will be discarded
-        
+        potential_blocks_to_fix = np.flatnonzero((table.nrows() >= self.min_nrows_to_fix_block) & (table.ncols() >= self.min_ncols_to_fix_block))
         logging.info(f"Number of potential blocks to fix {len(potential_blocks_to_fix)}")
-        # idx<n>: index in the current list | pos<n>: index in the list of blocks
-        for idx1, pos1 in enumerate(potential_blocks_to_fix[:-1]):
-            # logging.info(f"{idx1}, {pos1}")
-            block1 = list_blocks[pos1]
-            
-            for rel_pos, pos2 in enumerate(potential_blocks_to_fix[idx1+1:]):
-                idx2 = rel_pos + idx1 + 1
-                # logging.info(f"{idx2}, {pos2}")
-                pos2 = potential_blocks_to_fix[idx2]
-                block2 = list_blocks[pos2]
-
-                # resolve overlapping blocks: the one with the more number of positions (nrows x ncols) is preferred
-                if self._blocks_intersect(block1,block2):
-                    if block1.ncells() < block2.ncells():
-                        blocks_to_discard.append(pos1)
-                    else:
-                        blocks_to_discard.append(pos2)
-
-        return [pos for pos in potential_blocks_to_fix if pos not in blocks_to_discard]
+
+        # resolve overlapping blocks: the one with the more number of positions (nrows x ncols) is preferred,
+        # the first one (in the list) is kept on ties. Pairs of overlapping blocks are listed by a sweep line over the columns
+        candidates = table.take(potential_blocks_to_fix)
+        ncells = candidates.ncells()
+        order = np.argsort(candidates.starts, kind="stable")
+        discard = np.zeros(len(candidates), dtype=bool)
+        for idx1, idx2, _ in overlapping_pairs(candidates.take(order)):
+            idx1, idx2 = order[idx1], order[idx2]
+            first, second = np.minimum(idx1, idx2), np.maximum(idx1, idx2)
+            discard[np.where(ncells[first] < ncells[second], first, second)] = True
+
+        return potential_blocks_to_fix[~discard].tolist()
+
+
+class _SeenBlocks:
+    """Keys (words of the rows, start, end) of the blocks returned by the batch decomposition, 
+    to skip repeated blocks before building them. A block is skipped only if its key is equal to a seen key
+    (with the same hash), a block not skipped is discarded later by the set of decomposed blocks.
+    Shards are processed in order, so a block seen in a previous shard is already in that set"""
+
+    def __init__(self):
+        self.position = {} # hash -> position in keys
+        self.keys = None
+        self.size = 0
+
+    def new(self, keys: np.ndarray) -> np.ndarray:
+        "mask of the keys (without repetitions) not seen before, they are added to the seen keys"
+        if self.keys is None:
+            self.keys = np.zeros((1024, keys.shape[1]), dtype=np.uint64)
+        hashes = self.hashes(keys).tolist()
+        get = self.position.get
+        positions = np.array([get(h, -1) for h in hashes], dtype=np.int64)
+        is_new = positions < 0
+        found = np.flatnonzero(~is_new)
+        is_new[found] = ~(self.keys[positions[found]] == keys[found]).all(axis=1)
+
+        # add new keys, growing the array by doubling its size
+        new_keys = keys[is_new]
+        if self.size + len(new_keys) > len(self.keys):
+            grown = np.zeros((2 * (self.size + len(new_keys)), keys.shape[1]), dtype=np.uint64)
+            grown[:self.size] = self.keys[:self.size]
+            self.keys = grown
+        self.keys[self.size:self.size + len(new_keys)] = new_keys
+        for offset, h in enumerate(h for h, new in zip(hashes, is_new.tolist()) if new):
+            self.position.setdefault(h, self.size + offset)
+        self.size += len(new_keys)
+        return is_new
 
     @staticmethod
-    def _blocks_intersect(block1, block2):
-        "Return True if block1 and block2 intersect"
-        # check for not empty intersection
-        common_rows = list(set(block1.K).intersection(set(block2.K))) # intersection set K
-        common_cols = list(set(range(block1.start,block1.end+1)).intersection(set(range(block2.start,block2.end+1)))) # intersection columns [i,j]
+    def hashes(keys: np.ndarray) -> np.ndarray:
+        "hash (uint64) of each key"
+        h = np.zeros(len(keys), dtype=np.uint64)
+        for column in keys.T:
+            x = (column ^ (column >> np.uint64(31))) * np.uint64(0x9E3779B97F4A7C15)
+            h = (h ^ x ^ (h >> np.uint64(29))) * np.uint64(0xBF58476D1CE4E5B9)
+        return h
+
+
+def _shards(chunks, size: int):
+    "chunks of pairs (pos1, pos2) as arrays, cut in shards of 'size' pairs (the last one can be smaller)"
+    buffer1, buffer2, n_pairs = [], [], 0
+    for pos1, pos2 in chunks:
+        buffer1.append(np.asarray(pos1, dtype=np.int64)); buffer2.append(np.asarray(pos2, dtype=np.int64))
+        n_pairs += len(pos1)
+        while n_pairs >= size:
+            pos1, pos2 = np.concatenate(buffer1), np.concatenate(buffer2)
+            yield pos1[:size], pos2[:size]
+            buffer1, buffer2, n_pairs = [pos1[size:]], [pos2[size:]], n_pairs - size
+    if n_pairs:
+        yield np.concatenate(buffer1), np.concatenate(buffer2)
+
+
+# state of the workers of the pool of processes, set once by worker
+_worker = None
+
+def _init_worker(state):
+    global _worker
+    _worker = state
 
-        return common_rows and common_cols
\ No newline at end of file
+def _decompose_shard(shard, state=None):
+    """new blocks of a shard of pairs (pos1, pos2), without repetitions and in order, and positions of maximal blocks to discard.
+    'state' is (decomposer, table, words, pos_fixed, fixed_cells, seen), the one of the worker if not given"""
+    decomposer, table, words, pos_fixed, fixed_cells, seen = state or _worker
+    pos1, pos2 = shard
+    blocks = decomposer._decompose_batch(pos1, pos2, table, words, seen, fixed_cells)
+    # maximal blocks intersecting a fixed block
+    pos_discard = set(pos2[np.isin(pos1, pos_fixed)].tolist()) | set(pos1[np.isin(pos2, pos_fixed)].tolist())
+    return blocks, pos_discard
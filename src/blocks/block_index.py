@@ -0,0 +1,80 @@
+"""
+Index of a set of blocks by their columns.
+
+Blocks are sorted by their starting column, the blocks contained in a range of columns
+[start, end] are found with a binary search over the starts, and then filtered by their ends.
+The index is read-only, it can be shared by threads solving different subMSAs.
+
+CellIndex keeps the cells (rows x columns) covered by a set of blocks, to test if other blocks
+intersect any of them: columns are split in segments by the starts and ends of the blocks,
+each segment has the bitset of the rows covered in its columns, and the union of the rows
+covered in a range of segments is found with a sparse table (O(1) by query).
+"""
+import numpy as np
+
+from .block_table import BlockTable
+from .row_sets import row_words
+
+
+class BlockIndex:
+    "Blocks sorted by starting column, to retrieve the blocks contained in a range of columns"
+
+    def __init__(self, blocks):
+        self.blocks = BlockTable.from_blocks(blocks)
+        self.order = np.argsort(self.blocks.starts, kind="stable")
+        self.starts = self.blocks.starts[self.order]
+        self.ends = self.blocks.ends[self.order]
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def contained(self, start_column: int, end_column: int) -> BlockTable:
+        "Blocks contained in the columns [start_column, end_column], in the same order as in the input"
+        first = np.searchsorted(self.starts, start_column, side="left")
+        last = np.searchsorted(self.starts, end_column, side="right")
+        inside = self.order[first:last][self.ends[first:last] <= end_column]
+        return self.blocks.take(np.sort(inside))
+
+
+class CellIndex:
+    "Cells covered by a set of blocks, to test if other blocks intersect any of them"
+
+    def __init__(self, blocks, n_words: int):
+        blocks = BlockTable.from_blocks(blocks)
+        starts, ends = blocks.starts.astype(np.int64), blocks.ends.astype(np.int64) + 1
+        # segment i covers the columns [boundaries[i], boundaries[i+1])
+        self.boundaries = np.unique(np.concatenate([starts, ends]))
+        n_segments = max(len(self.boundaries) - 1, 1)
+
+        # rows covered in each segment
+        first, last = np.searchsorted(self.boundaries, starts), np.searchsorted(self.boundaries, ends)
+        n_covered = last - first
+        segments = np.repeat(first - np.cumsum(n_covered) + n_covered, n_covered) + np.arange(int(n_covered.sum()))
+        words = row_words(blocks, n_words)
+        covered = np.zeros((n_segments, n_words), dtype=np.uint64)
+        np.bitwise_or.at(covered, segments, np.repeat(words, n_covered, axis=0))
+
+        # sparse table: level k has the rows covered in the segments [i, i + 2^k)
+        self.levels = [covered]
+        while (1 << len(self.levels)) <= n_segments:
+            previous, half = self.levels[-1], 1 << (len(self.levels) - 1)
+            self.levels.append(previous[:-half] | previous[half:])
+
+    def __len__(self) -> int:
+        return max(len(self.boundaries) - 1, 0)
+
+    def intersects(self, words: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        "mask of the blocks (bitsets of rows 'words', starts, ends) with at least one cell covered by the index"
+        if len(self) == 0:
+            return np.zeros(len(starts), dtype=bool)
+        first = np.maximum(np.searchsorted(self.boundaries, starts, side="right") - 1, 0)
+        last = np.minimum(np.searchsorted(self.boundaries, ends, side="right") - 1, len(self) - 1)
+        valid = first <= last
+        first, last = np.where(valid, first, 0), np.where(valid, last, 0)
+
+        level = np.floor(np.log2(last - first + 1)).astype(np.int64)
+        covered = np.zeros_like(words)
+        for k in np.unique(level):
+            at = level == k
+            covered[at] = self.levels[k][first[at]] | self.levels[k][last[at] - (1 << k) + 1]
+        return valid & (covered & words).any(axis=1)
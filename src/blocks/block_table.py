@@ -0,0 +1,164 @@
+"""
+Blocks stored by columns (struct of arrays).
+
+A BlockTable keeps the starts and ends of the blocks as int32 arrays, and their rows K in CSR format:
+the rows of all blocks concatenated (uint32, sorted within each block), and the offsets of the rows
+of each block. Filtering by columns, dedup, sorting and concatenation are done with numpy.
+
+Iterating (or indexing with an int) returns Block objects, so a BlockTable can be used wherever a
+list of blocks was used. Indexing with a slice, an array of indexes or a boolean mask returns a BlockTable.
+"""
+import numpy as np
+from itertools import chain
+from typing import Iterable
+
+from .block import LightBlock as Block
+
+
+class BlockTable:
+    "Blocks (K, start, end) as arrays: rows of all blocks (CSR with offsets), starts and ends"
+
+    def __init__(self, rows: np.ndarray, offsets: np.ndarray, starts: np.ndarray, ends: np.ndarray, msa=None):
+        self.rows = np.asarray(rows, dtype=np.uint32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        # optional reference to the (sub)MSA, to get the labels of the blocks
+        self.msa = msa
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable, msa=None) -> "BlockTable":
+        "Table from blocks (K, start, end) with sorted K, or from another BlockTable (no copy)"
+        if hasattr(blocks, "csr"):
+            return cls(*blocks.csr(), msa=msa if msa is not None else blocks.msa)
+        blocks = list(blocks)
+        lengths = np.fromiter((len(b[0]) for b in blocks), dtype=np.int64, count=len(blocks))
+        offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(
+            rows=np.fromiter(chain.from_iterable([b[0] for b in blocks]), dtype=np.uint32, count=int(offsets[-1])),
+            offsets=offsets,
+            starts=np.fromiter((b[1] for b in blocks), dtype=np.int32, count=len(blocks)),
+            ends=np.fromiter((b[2] for b in blocks), dtype=np.int32, count=len(blocks)),
+            msa=msa,
+        )
+
+    @classmethod
+    def empty(cls, msa=None) -> "BlockTable":
+        return cls(np.zeros(0), np.zeros(1), np.zeros(0), np.zeros(0), msa=msa)
+
+    @classmethod
+    def concatenate(cls, tables: Iterable) -> "BlockTable":
+        "One table with the blocks of all tables (or lists of blocks), in order"
+        tables = [cls.from_blocks(table) for table in tables]
+        if not tables:
+            return cls.empty()
+        shifts = np.cumsum([0] + [len(table.rows) for table in tables[:-1]])
+        return cls(
+            rows=np.concatenate([table.rows for table in tables]),
+            offsets=np.concatenate([[0]] + [table.offsets[1:] + shift for table, shift in zip(tables, shifts)]),
+            starts=np.concatenate([table.starts for table in tables]),
+            ends=np.concatenate([table.ends for table in tables]),
+            msa=tables[0].msa,
+        )
+
+    def csr(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        "rows, offsets, starts and ends"
+        return self.rows, self.offsets, self.starts, self.ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.offsets.nbytes + self.starts.nbytes + self.ends.nbytes
+
+    def __iter__(self):
+        rows, offsets = self.rows.tolist(), self.offsets.tolist()
+        for j, (start, end) in enumerate(zip(self.starts.tolist(), self.ends.tolist())):
+            yield Block(tuple(rows[offsets[j]:offsets[j+1]]), start, end)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            item = int(item)
+            if item < 0:
+                item += len(self)
+            first, last = self.offsets[item:item + 2].tolist()
+            return Block(tuple(self.rows[first:last].tolist()), int(self.starts[item]), int(self.ends[item]))
+        if isinstance(item, slice):
+            item = np.arange(len(self))[item]
+        return self.take(np.asarray(item))
+
+    def take(self, idx: np.ndarray) -> "BlockTable":
+        "Table with the blocks at the indexes 'idx' (or where the boolean mask 'idx' is True), in that order"
+        idx = np.asarray(idx)
+        idx = np.flatnonzero(idx) if idx.dtype == bool else idx.astype(np.int64, copy=False)
+        lengths = self.offsets[idx + 1] - self.offsets[idx]
+        offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # position of each row of the selected blocks in self.rows
+        positions = np.repeat(self.offsets[idx] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return BlockTable(self.rows[positions], offsets, self.starts[idx], self.ends[idx], msa=self.msa)
+
+    def nrows(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def ncols(self) -> np.ndarray:
+        return self.ends.astype(np.int64) - self.starts + 1
+
+    def ncells(self) -> np.ndarray:
+        return self.nrows() * self.ncols()
+
+    def label(self, idx: int, msa=None) -> str:
+        "string spelled by the block at 'idx', from 'msa' or the MSA of the table"
+        msa = msa if msa is not None else self.msa
+        return msa.label(self.rows[self.offsets[idx]], self.starts[idx], self.ends[idx])
+
+    def window(self, start_column: int, end_column: int) -> "BlockTable":
+        "Blocks contained in the columns [start_column, end_column]"
+        return self.take((self.starts >= start_column) & (self.ends <= end_column))
+
+    def overlapping(self, start_column: int, end_column: int) -> "BlockTable":
+        "Blocks with at least one column in [start_column, end_column]"
+        return self.take((self.starts <= end_column) & (self.ends >= start_column))
+
+    def argsort(self, by: tuple[str, ...] = ("start", "end")) -> np.ndarray:
+        "Stable order of the blocks by the keys in 'by' (start, end, nrows, ncols), the first key is the primary one"
+        keys = dict(start=self.starts, end=self.ends, nrows=self.nrows(), ncols=self.ncols())
+        return np.lexsort([keys[key] for key in reversed(by)])
+
+    def sort(self, by: tuple[str, ...] = ("start", "end")) -> "BlockTable":
+        return self.take(self.argsort(by))
+
+    def hashes(self) -> np.ndarray:
+        "hash (uint64) of the rows of each block"
+        # mix each row and add them by block, empty blocks get 0
+        x = self.rows.astype(np.uint64) + np.uint64(1)
+        x = (x ^ (x >> np.uint64(16))) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(29))) * np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(32)
+        sums = np.zeros(len(x) + 1, dtype=np.uint64)
+        np.cumsum(x, out=sums[1:])
+        return sums[self.offsets[1:]] - sums[self.offsets[:-1]]
+
+    def unique(self) -> "BlockTable":
+        "Table without repeated blocks, the first occurrence of each block is kept (in order)"
+        if len(self) == 0:
+            return self
+        keys = np.rec.fromarrays([self.hashes(), self.starts, self.ends, self.nrows()])
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        representative = first[inverse.reshape(-1)]
+
+        # blocks with the same key must have the same rows, otherwise (hash collision) compare them one by one
+        repeated = np.flatnonzero(representative != np.arange(len(self)))
+        if not np.array_equal(self.take(repeated).rows, self.take(representative[repeated]).rows):
+            seen = set()
+            keep = [j for j, block in enumerate(self) if not (block in seen or seen.add(block))]
+            return self.take(np.array(keep, dtype=np.int64))
+        return self.take(np.sort(first))
+
+    def to_blocks(self) -> list:
+        return list(self)
+
+    def __repr__(self) -> str:
+        return f"BlockTable({len(self)} blocks, {self.nbytes} bytes)"
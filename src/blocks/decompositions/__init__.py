@@ -1,3 +1,4 @@
 from .block_decomposition_row_maximal import block_decomposition as block_decomposition_row_maximal
 from .block_decomposition_complete import block_decomposition as block_decomposition_complete
-from .block_decomposition_standard import block_decomposition as block_decomposition_standard
\ No newline at end of file
+from .block_decomposition_standard import block_decomposition as block_decomposition_standard
+from .block_decomposition_batch import complete as batch_decomposition_complete, row_maximal as batch_decomposition_row_maximal
@@ -0,0 +1,85 @@
+"""
+Decompositions of batches of pairs of blocks with numpy.
+
+Each pair is given by the bitsets of the rows (rows of 64-bit words) and the columns of its blocks.
+The rules of a decomposition are evaluated for all pairs at once: each rule is a slot with the rows,
+columns and condition of the block it creates, and the blocks of the slots whose condition holds are
+returned pair by pair, in the order of the slots. This is the order of the blocks returned by the
+decomposition of one pair (block_decomposition_complete and block_decomposition_row_maximal).
+"""
+import numpy as np
+
+
+def _emit(rows: list, slots: list, valid: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """blocks (words, starts, ends) of the slots (index of rows, starts, ends, condition)
+    for the valid pairs, pair by pair and in the order of the slots"""
+    n_pairs = len(valid)
+    keep = np.stack([np.broadcast_to(condition & valid, (n_pairs,)) for *_, condition in slots], axis=1)
+    pair, slot = np.nonzero(keep)
+    source = np.array([idx_rows for idx_rows, *_ in slots])[slot]
+    starts = np.stack([np.broadcast_to(start, (n_pairs,)) for _, start, _, _ in slots], axis=1)[pair, slot]
+    ends = np.stack([np.broadcast_to(end, (n_pairs,)) for _, _, end, _ in slots], axis=1)[pair, slot]
+    words = np.stack(rows, axis=1)[pair, source]
+    return words, starts, ends
+
+
+def _sort_pairs(swap, words1, starts1, ends1, words2, starts2, ends2):
+    "swap the blocks of the pairs where 'swap' is True"
+    return (np.where(swap[:, None], words2, words1), np.where(swap, starts2, starts1), np.where(swap, ends2, ends1),
+            np.where(swap[:, None], words1, words2), np.where(swap, starts1, starts2), np.where(swap, ends1, ends2))
+
+
+def complete(words1: np.ndarray, starts1: np.ndarray, ends1: np.ndarray,
+             words2: np.ndarray, starts2: np.ndarray, ends2: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "complete decomposition of the pairs of blocks (manuscript eqs 1-9), blocks as (words, starts, ends)"
+    starts1, ends1, starts2, ends2 = (np.asarray(x, dtype=np.int64) for x in (starts1, ends1, starts2, ends2))
+    # sort blocks (left most first)
+    w1, s1, e1, w2, s2, e2 = _sort_pairs(starts2 < starts1, words1, starts1, ends1, words2, starts2, ends2)
+
+    inter, only1, only2 = w1 & w2, w1 & ~w2, w2 & ~w1
+    has_inter, has_only1, has_only2 = inter.any(axis=1), only1.any(axis=1), only2.any(axis=1)
+    # not empty intersection
+    valid = has_inter & (s1 <= e2) & (s2 <= e1)
+    overlap = s2 < e1
+
+    W1, W2, INTER, ONLY1, ONLY2 = range(5)
+    slots = [
+        (W1, s1, s2 - 1, s1 < s2),                       # manuscript eq (1)
+        (W2, e1 + 1, e2, e1 < e2),                       # manuscript eq (2)
+        (W1, e2 + 1, e1, e1 > e2),                       # manuscript eq (3)
+        (INTER, s1, e1, has_inter),                      # manuscript eq (4)
+        (ONLY1, s1, e1, has_only1),                      # manuscript eq (5)
+        (ONLY1, s2, e2, has_only1),
+        (ONLY2, s1, e1, has_only2),                      # manuscript eq (6)
+        (ONLY2, s2, e2, has_only2),
+        (INTER, s2, e1, has_inter & overlap),            # manuscript eq (7)
+        (ONLY1, s2, e1, has_only1 & overlap),            # manuscript eq (8)
+        (ONLY2, s2, e1, has_only2 & overlap),            # manuscript eq (9)
+    ]
+    return _emit([w1, w2, inter, only1, only2], slots, valid)
+
+
+def row_maximal(words1: np.ndarray, starts1: np.ndarray, ends1: np.ndarray,
+                words2: np.ndarray, starts2: np.ndarray, ends2: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "row maximal decomposition of the pairs of blocks (conditions 1-4), blocks as (words, starts, ends)"
+    starts1, ends1, starts2, ends2 = (np.asarray(x, dtype=np.int64) for x in (starts1, ends1, starts2, ends2))
+    # sort blocks (left most first)
+    swap = (starts2 < starts1) | ((starts2 == starts1) & (ends2 < ends1))
+    w1, s1, e1, w2, s2, e2 = _sort_pairs(swap, words1, starts1, ends1, words2, starts2, ends2)
+
+    # not empty intersection
+    valid = (w1 & w2).any(axis=1) & (s1 <= e2) & (s2 <= e1)
+    condition1 = (s1 == s2) & (e1 < e2)
+    condition2 = (s1 < s2) & (e2 < e1)
+    condition3 = (s1 < s2) & (e1 == e2)
+    condition4 = (s1 < s2) & (s2 < e1) & (e1 < e2)
+    any_condition = condition1 | condition2 | condition3 | condition4
+
+    W1, W2 = range(2)
+    slots = [
+        (W1, s1, np.where(condition1, e1, s2 - 1), any_condition),   # b1 (1) or left of b1 (2, 3, 4)
+        (W2, np.where(condition1, e1 + 1, s2), e2, any_condition),   # right of b2 (1) or b2 (2, 3, 4)
+        (W1, np.where(condition2, e2 + 1, s1), e1, condition2 | condition4), # right of b1 (2) or b1 (4)
+        (W2, e1 + 1, e2, condition4),                                # right of b2 (4)
+    ]
+    return _emit([w1, w2], slots, valid)
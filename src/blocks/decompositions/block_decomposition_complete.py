@@ -1,32 +1,32 @@
+from typing import Optional
 from .. import Block
+from ..row_sets import row_mask, mask_rows, columns_overlap
 
 import logging
 logging.basicConfig(level=logging.INFO,
                     format='[Complete Decomposition] %(asctime)s.%(msecs)03d | %(message)s',
                     datefmt='%Y-%m-%d@%H:%M:%S')
 
-def block_decomposition(block1: Block, block2: Block):
+def block_decomposition(block1: Block, block2: Block, rows1: Optional[int] = None, rows2: Optional[int] = None):
     """Decompose 2 blocks based on their intersection
 
     Args:
         block1 (Block): a block
         block2 (Block): another block
+        rows1, rows2 (int, optional): bitsets of the rows of block1 and block2, computed if not given
 
     Returns:
         list: blocks decomposed from the intersection. If input blocks
                 does not intersect, the output is an empty list.
     """
+    if rows1 is None: rows1 = row_mask(block1.K)
+    if rows2 is None: rows2 = row_mask(block2.K)
     # sort blocks (left most first)
-    b1,b2=sorted([block1,block2], key=lambda b: b.start)
+    (b1, r1), (b2, r2) = sorted([(block1, rows1), (block2, rows2)], key=lambda b: b[0].start)
 
     blocks=[]
     # not empty intersection
-    common_rows = list(set(b1.K).intersection(set(b2.K)))
-    common_cols = list(set(range(b1.start,b1.end+1)).intersection(set(range(b2.start,b2.end+1))))
-
-    if common_rows and common_cols:
-        K = list(common_rows)
-        K.sort()
+    if r1 & r2 and columns_overlap(b1, b2):
 
         if b1.start < b2.start:                                   # manuscript eq (1)
             blocks.append( Block(b1.K, b1.start, b2.start - 1) )     
@@ -38,9 +38,9 @@ def block_decomposition(block1: Block, block2: Block):
             blocks.append( Block(b1.K, b2.end + 1 , b1.end) )     # manuscript eq (3)
 
         # extra blocks, part of the complete decomposition 
-        K_inter = set(b1.K).intersection(b2.K) 
-        K1_minus_K2 = set(b1.K) - set(b2.K)
-        K2_minus_K1 = set(b2.K) - set(b1.K)
+        K_inter = mask_rows(r1 & r2)
+        K1_minus_K2 = mask_rows(r1 & ~r2)
+        K2_minus_K1 = mask_rows(r2 & ~r1)
 
         if K_inter:                                              # manuscript eq (4)
             blocks.append( Block(K_inter, b1.start, b1.end) )  
@@ -1,15 +1,18 @@
+from typing import Optional
 from .. import Block
+from ..row_sets import row_mask, columns_overlap
 
 import logging
 logging.basicConfig(level=logging.INFO,
                     format='[Row-maximal Decomposition] %(asctime)s.%(msecs)03d | %(message)s',
                     datefmt='%Y-%m-%d@%H:%M:%S')
 
-def block_decomposition(block1: Block, block2: Block):
+def block_decomposition(block1: Block, block2: Block, rows1: Optional[int] = None, rows2: Optional[int] = None):
     """Decompose 2 blocks based on their intersection
     Args:
         block1 (Block): a block
         block2 (Block): another block
+        rows1, rows2 (int, optional): bitsets of the rows of block1 and block2, computed if not given
     Returns:
         list: blocks decomposed from the intersection. If input blocks 
                 does not intersect, the output is an empty list.
@@ -17,14 +20,12 @@ def block_decomposition(block1: Block, block2: Block):
     # sort blocks (left most first)
     b1,b2=sorted([block1,block2], key=lambda b: (b.start,b.end))
 
+    if rows1 is None: rows1 = row_mask(block1.K)
+    if rows2 is None: rows2 = row_mask(block2.K)
+
     nb = [] # new blocks
     # not empty intersection
-    common_rows = list(set(b1.K).intersection(set(b2.K)))
-    common_cols = list(set(range(b1.start,b1.end+1)).intersection(set(range(b2.start,b2.end+1))))
-    
-    if common_rows and common_cols: 
-        K = list(common_rows)
-        K.sort()
+    if rows1 & rows2 and columns_overlap(b1, b2): 
 
         # Condition 1
         if b1.start == b2.start and b1.end < b2.end:
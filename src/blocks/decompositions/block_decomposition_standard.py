@@ -1,4 +1,6 @@
+from typing import Optional
 from .. import Block
+from ..row_sets import row_mask, mask_rows, columns_overlap
 
 
 import logging
@@ -6,20 +8,20 @@ logging.basicConfig(level=logging.INFO,
                     format='[Block Decomposition Row Maximal] %(asctime)s.%(msecs)03d | %(message)s',
                     datefmt='%Y-%m-%d@%H:%M:%S')
 
-def block_decomposition(block1: Block, block2: Block):
+def block_decomposition(block1: Block, block2: Block, rows1: Optional[int] = None, rows2: Optional[int] = None):
     """Decomposition of maximal blocks
-    two cases according to lemma 1 in the manuscript
+    two cases according to lemma 1 in the manuscript.
+    'rows1' and 'rows2' are the bitsets of the rows of block1 and block2, computed if not given
     """
     logging.debug("standard decomposition")
     # sort blocks by starting positions
-    B = [block1, block2]
-    l2, l1 = list(sorted(B, key=lambda l: (l.start,len(l.K))))
+    if rows1 is None: rows1 = row_mask(block1.K)
+    if rows2 is None: rows2 = row_mask(block2.K)
+    B = [(block1, rows1), (block2, rows2)]
+    (l2, r2), (l1, r1) = list(sorted(B, key=lambda l: (l[0].start,len(l[0].K))))
 
     # not empty intersection
-    common_rows = list(set(l1.K).intersection(set(l2.K)))
-    common_cols = list(set(range(l1.start,l1.end+1)).intersection(set(range(l2.start,l2.end+1))))
-    
-    if common_rows and common_cols: 
+    if r1 & r2 and columns_overlap(l1, l2): 
 
         logging.debug(f"l1: {l1}")
         logging.debug(f"l2: {l2}")
@@ -33,17 +35,17 @@ def block_decomposition(block1: Block, block2: Block):
         
             blocks.extend(
                 [
-                Block(set(l1.K).intersection(l2.K), l1.start, l1.end),
-                Block(set(l1.K).difference(l2.K), l1.start, l1.end)
+                Block(mask_rows(r1 & r2), l1.start, l1.end),
+                Block(mask_rows(r1 & ~r2), l1.start, l1.end)
                 ]
                 )
         else:
-            l1, l2 = list(sorted(B, key=lambda l: (l.start, len(l.K)))) # l1 es el de mas a la izquierda
+            (l1, r1), (l2, r2) = list(sorted(B, key=lambda l: (l[0].start, len(l[0].K)))) # l1 es el de mas a la izquierda
             blocks = [
                 Block(l1.K, l1.start, l2.start-1),
-                Block(set(l1.K).difference(l2.K), l2.start, l1.end),
-                Block(set(l1.K).intersection(l2.K), l2.start, l1.end),
-                Block(set(l2.K).difference(l1.K), l2.start, l1.end),
+                Block(mask_rows(r1 & ~r2), l2.start, l1.end),
+                Block(mask_rows(r1 & r2), l2.start, l1.end),
+                Block(mask_rows(r2 & ~r1), l2.start, l1.end),
                 Block(l2.K, l1.end + 1, l2.end)
             ]
         
@@ -0,0 +1,53 @@
+"""
+Vertical blocks: maximal runs of consecutive columns with the same character in all the rows.
+As in the loop over the columns it replaces, characters are compared with their case ('a' and 'A'
+are different characters), and labels spell the MSA as it is.
+
+Columns with a single character are found with one vectorised comparison over the
+(packed) MSA, and the runs are delimited with np.diff, no loop over the columns.
+"""
+import numpy as np
+from bisect import bisect_left
+
+from msa import MsaContext
+
+
+def vertical_runs(unique_columns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "first and last (included) positions of each run of True values"
+    padded = np.concatenate(([False], unique_columns, [False])).astype(np.int8)
+    borders = np.diff(padded)
+    starts = np.flatnonzero(borders == 1)
+    ends = np.flatnonzero(borders == -1) - 1
+    return starts, ends
+
+
+def compute_vertical_blocks(msa: MsaContext, threshold_vertical_blocks: int = 1) -> list:
+    """Vertical blocks of the (sub)MSA with at least 'threshold_vertical_blocks' columns.
+    Each block is ([0,...,n_seqs-1], start, end, label), columns w.r.t. the (sub)MSA"""
+    return vertical_blocks_by_alpha(msa, alphas=[threshold_vertical_blocks])[threshold_vertical_blocks]
+
+
+def vertical_blocks_by_alpha(msa: MsaContext, alphas: list[int]) -> dict[int, list]:
+    """Vertical blocks of the (sub)MSA for each threshold alpha (minimum number of columns), 
+    the MSA is scanned only once. Blocks are sorted by position, as in compute_vertical_blocks"""
+    assert all(alpha >= 1 for alpha in alphas), "thresholds of vertical blocks must be at least 1"
+    packed = msa.packed
+
+    starts, ends = vertical_runs(packed.unique_columns())
+    starts, ends = starts.tolist(), ends.tolist()
+    # runs with length >= alpha are a suffix of the runs sorted by length
+    lengths = np.array([end - start + 1 for start, end in zip(starts, ends)], dtype=np.int64)
+    order = np.argsort(lengths, kind="stable")
+    sorted_lengths = lengths[order].tolist()
+
+    labels = {}
+    def label(run):
+        if run not in labels:
+            labels[run] = packed.label(0, starts[run], ends[run])
+        return labels[run]
+
+    blocks_by_alpha = {}
+    for alpha in alphas:
+        runs = np.sort(order[bisect_left(sorted_lengths, alpha):]).tolist()
+        blocks_by_alpha[alpha] = [(list(range(packed.nrows)), starts[run], ends[run], label(run)) for run in runs]
+    return blocks_by_alpha
@@ -0,0 +1,127 @@
+"""
+Compute Maximal Blocks from an (sub)MSA with a multi-allelic positional BWT (pBWT),
+in-process and with the same output as wild-pbwt.
+
+Rows are kept sorted by their reversed prefixes (prefix array), and the divergence array
+stores, for each pair of consecutive rows, the first column of their longest common suffix.
+After each column, the groups of consecutive rows sharing a suffix are the candidates
+to be maximal blocks ending at that column, they are reported if the rows do not all
+have the same character in the next column.
+"""
+import json
+import logging
+import numpy as np
+from pathlib import Path
+from typing import Union, Optional
+
+from msa import MsaContext
+
+
+def update_prefix_divergence(prefix: np.ndarray, divergence: np.ndarray, column: np.ndarray, pos_column: int):
+    """Sort the rows including one more column (pos_column) of the MSA.
+    'column' are the characters of the column in the original order of the rows"""
+    chars = column[prefix]
+    order = np.argsort(chars, kind="stable")
+    sorted_chars = chars[order]
+
+    # rows starting a group of a character do not share the new column with the previous row
+    new_divergence = np.full(len(prefix), pos_column + 1, dtype=divergence.dtype)
+    # for two consecutive rows of a group, their common suffix starts at the maximum divergence
+    # between them in the previous order: max(divergence[p+1..q]) for old positions p < q
+    padded = np.append(divergence, 0)
+    borders = np.flatnonzero(np.diff(sorted_chars)) + 1
+    for group_start, group_end in zip(np.concatenate(([0], borders)), np.concatenate((borders, [len(order)]))):
+        if group_end - group_start > 1:
+            old_positions = order[group_start:group_end]
+            new_divergence[group_start + 1:group_end] = np.maximum.reduceat(padded, old_positions + 1)[:-1]
+
+    return prefix[order], new_divergence
+
+
+def blocks_ending_at(prefix: np.ndarray, divergence: np.ndarray, pos_column: int, next_column: Optional[np.ndarray]) -> list:
+    """Maximal blocks [K, start, end] ending at pos_column.
+    Groups of consecutive rows sharing a suffix are enumerated with a stack over the lengths of the common suffixes
+    (as lcp-intervals in a suffix array), only groups whose rows differ in the next column are right-maximal"""
+    n_seqs = len(prefix)
+    common_suffix = (pos_column + 1 - divergence).tolist()
+    common_suffix[0] = 0
+    common_suffix.append(0)
+
+    if next_column is not None:
+        # number of changes of character in the next column up to each row, a group differs iff it has a change inside
+        next_chars = next_column[prefix]
+        changes = np.concatenate(([0], np.cumsum(next_chars[1:] != next_chars[:-1]))).tolist()
+
+    blocks = []
+    prefix = prefix.tolist()
+    stack = [(0, 0)]  # (length common suffix, first row of the group)
+    for pos in range(1, n_seqs + 1):
+        first_row = pos - 1
+        while common_suffix[pos] < stack[-1][0]:
+            length, first_row = stack.pop()
+            if next_column is None or changes[pos - 1] != changes[first_row]:
+                blocks.append([sorted(prefix[first_row:pos]), pos_column - length + 1, pos_column])
+        if common_suffix[pos] > stack[-1][0]:
+            stack.append((common_suffix[pos], first_row))
+    return blocks
+
+
+def pbwt_maximal_blocks(matrix: np.ndarray) -> list:
+    "Maximal blocks [K, start, end] (with at least 2 rows) of a matrix of encoded characters, columns w.r.t. the matrix"
+    n_seqs, n_cols = matrix.shape
+    prefix = np.arange(n_seqs)
+    divergence = np.zeros(n_seqs, dtype=np.int64)
+
+    max_blocks = []
+    for pos_column in range(n_cols):
+        prefix, divergence = update_prefix_divergence(prefix, divergence, matrix[:, pos_column], pos_column)
+        next_column = matrix[:, pos_column + 1] if pos_column + 1 < n_cols else None
+        max_blocks.extend(blocks_ending_at(prefix, divergence, pos_column, next_column))
+    return max_blocks
+
+
+def compute_maximal_blocks(msa: Union[str,Path, MsaContext], output: Optional[Union[str,Path]] = None,
+                           start_column: int = 0, end_column: int = -1,
+                           only_vertical: bool = False,
+                           label_blocks: bool = False,
+                           **kwargs
+                           ):
+    """Compute maximal blocks in a submsa, same arguments and output as wild_pbwt.compute_maximal_blocks.
+    Arguments of the binary (alphabet_to_ascii, bin_wildpbwt) are ignored"""
+    logging.info("Computing maximal blocks with pBWT (in-process)")
+
+    if type(msa) in (str,Path):
+        # load subMSA
+        msa=MsaContext.from_fasta(msa).submsa(start_column, end_column)
+
+    n_seqs=msa.nrows
+    max_blocks = pbwt_maximal_blocks(np.asarray(msa.matrix))
+
+    if only_vertical:
+        max_blocks = [
+            b for b in max_blocks if len(b[0]) == n_seqs
+        ]
+
+    # adjust start and end columns
+    if label_blocks:
+        max_blocks = [
+            [b[0], start_column + b[1], start_column + b[2], msa.label(b[0][0], start_column + b[1], start_column + b[2]).upper() ] for b in max_blocks
+        ]
+    else:
+        max_blocks = [
+            [b[0], start_column + b[1], start_column + b[2]] for b in max_blocks
+        ]
+
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        if Path(output).suffix == ".txt":
+            with open(output, "w") as fp:
+                for block in max_blocks:
+                    fp.write(str(block))
+                    fp.write("\n")
+        elif Path(output).suffix == ".json":
+            with open(output, "w") as fp:
+                json.dump(max_blocks, fp)
+        else:
+            raise ValueError("Output file must be .txt or .json")
+    return max_blocks
@@ -0,0 +1,117 @@
+"""
+Compute Maximal Blocks from an (sub)MSA with a suffix array and LCP array of its rows.
+
+Characters are anchored to their column (positional strings), so only suffixes starting at
+the same column share a prefix: the suffix array is a sorting of the rows for each column,
+by the suffix of the row starting at that column. It is built with prefix doubling over the
+whole matrix of encoded characters at once, and the LCP between consecutive suffixes is
+computed by binary lifting over the ranks of each round.
+
+Maximal repeats anchored at a column are the lcp-intervals of that column, their rows K are
+read directly from the suffix array (no rescan of the rows), and they are maximal blocks
+if the rows in K do not all have the same character in the previous column.
+"""
+import json
+import logging
+import numpy as np
+from pathlib import Path
+from typing import Union, Optional
+
+from msa import MsaContext
+
+
+def rank_columns(keys: np.ndarray) -> np.ndarray:
+    "Dense rank (starting at 1) of the keys of each column, equal keys get the same rank"
+    order = np.argsort(keys, axis=0, kind="stable")
+    sorted_keys = np.take_along_axis(keys, order, axis=0)
+    sorted_ranks = np.ones(keys.shape, dtype=np.int64)
+    sorted_ranks[1:] += np.cumsum(sorted_keys[1:] != sorted_keys[:-1], axis=0)
+    ranks = np.empty_like(sorted_ranks)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=0)
+    return ranks
+
+
+def suffix_array(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Suffix array and LCP array of the positional strings of the rows.
+    Column c of the suffix array are the rows sorted by their suffix starting at c (ties by row),
+    lcp[p, c] is the length of the common prefix of the suffixes at p-1 and p (lcp[0, c] = 0)"""
+    n_seqs, n_cols = matrix.shape
+    # ranks[t][r, c]: rank of the string of length 2**t starting at (r, c), 0 after the end of the row
+    ranks = [rank_columns(matrix.astype(np.int64))]
+    length = 1
+    while length < n_cols:
+        rank = ranks[-1]
+        next_rank = np.zeros_like(rank)
+        next_rank[:, :n_cols - length] = rank[:, length:]
+        ranks.append(rank_columns(rank * (n_seqs + 1) + next_rank))
+        length *= 2
+
+    sa = np.argsort(ranks[-1], axis=0, kind="stable")
+
+    # common prefix of consecutive suffixes, extended by the longest equal power of 2 at each step
+    prev_rows, rows = sa[:-1], sa[1:]
+    columns = np.broadcast_to(np.arange(n_cols), rows.shape)
+    lcp = np.zeros(rows.shape, dtype=np.int64)
+    for t in range(len(ranks) - 1, -1, -1):
+        pos = columns + lcp
+        valid = pos < n_cols
+        pos = np.where(valid, pos, 0)
+        equal = valid & (ranks[t][prev_rows, pos] == ranks[t][rows, pos])
+        lcp += np.where(equal, np.minimum(2 ** t, n_cols - pos), 0)
+    return sa, np.vstack((np.zeros((1, n_cols), dtype=np.int64), lcp))
+
+
+def suffix_array_maximal_blocks(matrix: np.ndarray) -> list:
+    "Maximal blocks [K, start, end] (with at least 2 rows) of a matrix of encoded characters, columns w.r.t. the matrix"
+    n_seqs, n_cols = matrix.shape
+    if n_seqs < 2 or n_cols == 0:
+        return []
+    sa, lcp = suffix_array(matrix)
+
+    # number of changes of character in the previous column up to each suffix,
+    # an interval is left-maximal iff it has a change inside
+    prev_chars = np.take_along_axis(matrix[:, :-1], sa[:, 1:], axis=0)
+    changes = np.zeros(sa.shape, dtype=np.int64)
+    changes[1:, 1:] = np.cumsum(prev_chars[1:] != prev_chars[:-1], axis=0)
+
+    max_blocks = []
+    for col, (rows, common_prefix, changes_col) in enumerate(zip(sa.T.tolist(), lcp.T.tolist(), changes.T.tolist())):
+        common_prefix.append(0)
+        stack = [(0, 0)]  # (length common prefix, first suffix of the interval)
+        for pos in range(1, n_seqs + 1):
+            first = pos - 1
+            while common_prefix[pos] < stack[-1][0]:
+                length, first = stack.pop()
+                if col == 0 or changes_col[pos - 1] != changes_col[first]:
+                    max_blocks.append([sorted(rows[first:pos]), col, col + length - 1])
+            if common_prefix[pos] > stack[-1][0]:
+                stack.append((common_prefix[pos], first))
+    return max_blocks
+
+
+def compute_maximal_blocks(msa: Union[str,Path,MsaContext], output: Optional[Union[str,Path]] = None,
+                           start_column: int = 0, end_column: int = -1,
+                           only_vertical: bool = False):
+    "Compute maximal blocks in a submsa, same arguments and output as suffix_tree.compute_maximal_blocks"
+    logging.info("Computing maximal blocks with Suffix Array")
+    if type(msa) in (str,Path):
+        # load subMSA
+        msa=MsaContext.from_fasta(msa).submsa(start_column, end_column)
+    n_seqs=msa.nrows
+
+    max_blocks = []
+    # case sensitive, as suffix_tree
+    for K, start, end in suffix_array_maximal_blocks(msa.cased_matrix):
+        if only_vertical and len(K) < n_seqs:
+            continue
+        max_blocks.append(
+            (K, start + start_column, end + start_column, msa.label(K[0], start + start_column, end + start_column))
+        )
+
+    # Save maximal blocks
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as fp:
+            json.dump(max_blocks, fp,)
+
+    return max_blocks
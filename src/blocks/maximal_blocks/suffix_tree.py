@@ -1,14 +1,14 @@
 import argparse
 import json
 import time
-from Bio import AlignIO
 from pathlib import Path
 import numpy as np
 from collections import defaultdict, namedtuple
 from suffix_tree import Tree
 from typing import Tuple, List, Union, Optional
 import logging
-from .utils import timer, load_submsa
+from msa import MsaContext
+from .utils import timer
 
 @timer
 def compute_pos_strings(seqs):
@@ -62,21 +62,22 @@ def maximal_blocks_from_pos_strings(pos_strings: list, seqs: list, only_vertical
 
     return max_blocks
 
-def compute_maximal_blocks(filename: Union[str,Path], output: Optional[Union[str,Path]] = None, 
+def compute_maximal_blocks(msa: Union[str,Path,MsaContext], output: Optional[Union[str,Path]] = None, 
                            start_column: int = 0, end_column: int = -1, 
                            only_vertical: bool = False):# multi: bool = True):
     "Compute maximal blocks in a submsa"
     logging.info(f"Computing maximal blocks with Suffix Tree")
-    # load subMSA
-    msa=load_submsa(filename, start_column, end_column)
-    n_cols=msa.get_alignment_length()
-    n_seqs=len(msa)
+    if type(msa) in (str,Path):
+        # load subMSA
+        msa=MsaContext.from_fasta(msa).submsa(start_column, end_column)
+    n_cols=msa.ncols
+    n_seqs=msa.nrows
 
     # # identify unique sequences to create the Tree and compute maximal blocks
     seq_by_string = defaultdict(list)
     all_seqs = []
-    for seq, record in enumerate(msa):
-        str_seq = str(record.seq)
+    for seq in range(n_seqs):
+        str_seq = msa.seq(seq)
         seq_by_string[str_seq].append(seq)
         all_seqs.append(str_seq)
     # n_unique_seqs = len(seq_by_string)
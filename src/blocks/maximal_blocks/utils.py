@@ -1,5 +1,4 @@
-from time import time
-from Bio import AlignIO
+import time
 
 def timer(func):
     "returns output and execution time of 'func'"
@@ -10,20 +9,3 @@ def timer(func):
         print(f'Function {func.__name__!r} executed in {(t2-t1):.4f}s')
         return result, round(t2-t1, 4)
     return wrap_func
-
-def load_submsa(filename, start_column=0, end_column=-1):
-    "Return MSA from start_column to end_column (both included)"
-    # load MSA
-    msa = AlignIO.read(filename, "fasta")
-    
-    # filter sub-MSA if start/end columns are given
-    if start_column>0 or end_column!=-1:
-        # get last column
-        n_cols = msa.get_alignment_length()
-        assert start_column < n_cols and end_column < n_cols, f"start_column={start_column}, end_column={end_column}. Must be < {n_cols} (number of columns in the MSA)"
-        if end_column == -1:
-            msa = msa[:, start_column:] # end_column included
-        else:
-            msa = msa[:, start_column:end_column+1] # end_column included
-    
-    return msa
\ No newline at end of file
@@ -1,86 +1,225 @@
-"Compute Maximal Blocks from an (sub)MSA using wild-pBWT"
+"""Compute Maximal Blocks from an (sub)MSA using wild-pBWT
+
+The panel is written to a temporary file, as wild-pbwt expects a path (-f), and the output
+of the binary is parsed while it is still running.
+With 'stdin_panel' (or a WildPbwtPool) the panel is written instead to the standard input of
+the binary (-f /dev/stdin), without temporary files. This assumes that wild-pbwt reads its
+input once and sequentially (no seek or stat of the file), it has not been checked against
+the binary, so it is not the default.
+A WildPbwtPool keeps processes of wild-pbwt spawned in advance, waiting for their panel.
+"""
 import os
 import tempfile
+import threading
 import subprocess
 import json
-from collections import defaultdict
+import numpy as np
+from collections import deque
+from contextlib import suppress
 from pathlib import Path
 from typing import Union, Optional
 
-from Bio.AlignIO import MultipleSeqAlignment as MSA
-
-# import sys
-# sys.path.append("../../../..")
-from .utils import load_submsa
-# from src.blocks.maximal_blocks.utils import (
-#     load_submsa,
-# ) 
+from msa import MsaContext
+from msa.alphabet import ALPHABET, INVALID_CODE, DECODE
 
 import logging
 
-def compute_maximal_blocks(msa: Union[str,Path, MSA], output: Optional[Union[str,Path]] = None, 
-                           start_column: int = 0, end_column: int = -1, 
+CHUNK_ROWS = 1 << 10  # rows of the panel translated and written to the pipe at once
+CHUNK_LINES = 1 << 14 # lines of the output of wild-pbwt parsed at once
+
+
+def panel_table(alphabet_to_ascii: dict) -> bytes:
+    """Translation table from encoded characters to the alphabet of wild-pbwt,
+    characters not in 'alphabet_to_ascii' are written as they are. INVALID_CODE is the end of line"""
+    table = np.zeros(256, dtype=np.uint8)
+    table[:len(ALPHABET)] = DECODE[:len(ALPHABET)]
+    for char, ascii_code in alphabet_to_ascii.items():
+        if not 0 <= int(ascii_code) <= 9:
+            raise ValueError(f"wild-pbwt alphabet must be encoded with one digit, '{char}' is encoded as {ascii_code}")
+        table[ALPHABET.index(char)] = ord(str(ascii_code))
+    table[INVALID_CODE] = ord("\n")
+    return table.tobytes()
+
+
+def write_panel(fp, matrix: np.ndarray, table: bytes):
+    "Write the rows of the matrix to 'fp' in the alphabet of wild-pbwt, each chunk of rows with one bytes.translate"
+    end_of_line = np.full((min(CHUNK_ROWS, len(matrix)), 1), INVALID_CODE, dtype=np.uint8)
+    for start in range(0, len(matrix), CHUNK_ROWS):
+        rows = np.asarray(matrix[start:start + CHUNK_ROWS], dtype=np.uint8)
+        fp.write(np.hstack((rows, end_of_line[:len(rows)])).tobytes().translate(table))
+
+
+def parse_blocks(lines: list[bytes]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Parse lines '[r1,r2,...,rk],start,end' of the output of wild-pbwt.
+    Return the rows of all blocks (concatenated), the offsets of the rows of each block, and starts and ends"""
+    numbers = np.array(b" ".join(lines).translate(None, b"[]").replace(b",", b" ").split(), dtype=np.int64)
+    numbers_by_line = np.array([line.count(b",") + 1 for line in lines], dtype=np.int64)
+    line_ends = np.cumsum(numbers_by_line)
+    starts, ends = numbers[line_ends - 2], numbers[line_ends - 1]
+
+    is_row = np.ones(len(numbers), dtype=bool)
+    is_row[line_ends - 2] = False
+    is_row[line_ends - 1] = False
+    offsets = np.concatenate(([0], np.cumsum(numbers_by_line - 2)))
+    return numbers[is_row], offsets, starts, ends
+
+
+def read_blocks(stdout) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    "Parse the output of wild-pbwt by chunks of lines, while it is being written"
+    rows, offsets, starts, ends = [], [np.zeros(1, dtype=np.int64)], [], []
+    n_rows = 0
+    lines = []
+
+    def parse():
+        nonlocal n_rows
+        chunk_rows, chunk_offsets, chunk_starts, chunk_ends = parse_blocks(lines)
+        rows.append(chunk_rows)
+        offsets.append(n_rows + chunk_offsets[1:])
+        starts.append(chunk_starts)
+        ends.append(chunk_ends)
+        n_rows += len(chunk_rows)
+        lines.clear()
+
+    for line in stdout:
+        if len(line) > 1:
+            lines.append(line)
+        if len(lines) == CHUNK_LINES:
+            parse()
+    if lines:
+        parse()
+
+    empty = [np.zeros(0, dtype=np.int64)]
+    return tuple(np.concatenate(arrays or empty) for arrays in (rows, offsets, starts, ends))
+
+
+class WildPbwtPool:
+    "Processes of wild-pbwt spawned in advance, each one waits for a panel in its standard input (see 'stdin_panel')"
+
+    def __init__(self, bin_wildpbwt: str = "Wild-pBWT/bin/wild-pbwt", size_alphabet: int = 6, n_processes: int = 4):
+        assert os.path.isfile(bin_wildpbwt), f"it seems that {bin_wildpbwt} is not the correct path to the binary 'wild-pbwt'"
+        self.command = [bin_wildpbwt, "-a", str(size_alphabet), "-f", "/dev/stdin", "-o", "y"]
+        self.size_alphabet = size_alphabet
+        self.lock = threading.Lock()
+        self.idle = deque(self.spawn() for _ in range(n_processes))
+
+    def spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def get(self) -> subprocess.Popen:
+        "Return an idle process, and spawn a new one in its place"
+        with self.lock:
+            process = self.idle.popleft() if self.idle else self.spawn()
+            self.idle.append(self.spawn())
+        return process
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                process = self.idle.popleft()
+                process.kill()
+                process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def collect_blocks(process: subprocess.Popen) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    "Parse the output of a running wild-pbwt, raise RuntimeError (with its stderr) if it fails"
+    stderr = []
+    error_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()))
+    error_reader.start()
+    blocks = read_blocks(process.stdout)
+    error_reader.join()
+    if process.wait() != 0:
+        raise RuntimeError(f"wild-pbwt failed with exit code {process.returncode}: {stderr[0].decode(errors='replace')}")
+    return blocks
+
+
+def run_wild_pbwt(matrix: np.ndarray, bin_wildpbwt: str, alphabet_to_ascii: dict,
+                  pool: Optional[WildPbwtPool] = None, stdin_panel: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Run wild-pbwt on a matrix of encoded characters, the panel is written to a temporary file,
+    or to its standard input if 'stdin_panel' or a pool is given.
+    Return the maximal blocks as arrays, see parse_blocks"""
+    table = panel_table(alphabet_to_ascii)
+    if pool is None and not stdin_panel:
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                write_panel(fp, matrix, table)
+            command = [bin_wildpbwt, "-a", str(len(alphabet_to_ascii)), "-f", path, "-o", "y"]
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return collect_blocks(process)
+        finally:
+            os.remove(path)
+
+    if pool is not None and pool.size_alphabet == len(alphabet_to_ascii):
+        process = pool.get()
+    else:
+        command = [bin_wildpbwt, "-a", str(len(alphabet_to_ascii)), "-f", "/dev/stdin", "-o", "y"]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # the panel is written from another thread, so the output is parsed while the binary is running
+    def feed():
+        # if the binary exits before reading the whole panel, its exit code is checked below
+        with suppress(BrokenPipeError):
+            with process.stdin:
+                write_panel(process.stdin, matrix, table)
+    writer = threading.Thread(target=feed)
+    writer.start()
+    try:
+        return collect_blocks(process)
+    finally:
+        writer.join()
+
+
+def compute_maximal_blocks(msa: Union[str,Path, MsaContext], output: Optional[Union[str,Path]] = None,
+                           start_column: int = 0, end_column: int = -1,
                            only_vertical: bool = False,
                            alphabet_to_ascii: dict = {"-":0,"A":1,"C":2,"G":3,"T":4,"N":5},
                            bin_wildpbwt: str = "Wild-pBWT/bin/wild-pbwt",
-                           label_blocks: bool = False 
+                           label_blocks: bool = False,
+                           pool: Optional[WildPbwtPool] = None,
+                           stdin_panel: bool = False,
                            ):
-    "Compute maximal blocks in a submsa"
-    
+    """Compute maximal blocks in a submsa. If a pool is given, one of its processes is used.
+    With 'stdin_panel' (or a pool) the panel is written to the standard input of wild-pbwt instead of a temporary file"""
+
     PATH_WILD_PBWT=bin_wildpbwt
     logging.info(f"Computing maximal blocks with Wild-pBWT: {PATH_WILD_PBWT}")
     if PATH_WILD_PBWT:
         assert os.path.isfile(PATH_WILD_PBWT), f"it seems that {PATH_WILD_PBWT} is not the correct path to the binary 'wild-pbwt'"
-    SIZE_ALPHABET=len(alphabet_to_ascii)
-    
+
     if type(msa) in (str,Path):
         # load subMSA
-        msa=load_submsa(msa, start_column, end_column)
-        
-    n_cols=msa.get_alignment_length()
-    n_seqs=len(msa)
-
-    # create file to store input matrix for wild-pBWT
-    fd, path = tempfile.mkstemp()
-    logging.info(f"tmp file [{start_column},{end_column}] {path}")
-    try:
-        with os.fdopen(fd, 'w') as fileTemp:
-            for seq, record in enumerate(msa):
-                row_panel=str(record.seq).upper()
-                for a, c in alphabet_to_ascii.items():
-                    row_panel = row_panel.replace(a,str(c))
-                # print(row_panel)
-                # write rows in ASCII alphabetto the tmp file
-                fileTemp.write(row_panel + "\n")
-
-        # compute maximal blocks with wild-pBWT
-        logging.info("")
-        COMMANDS = f"{PATH_WILD_PBWT} -a {SIZE_ALPHABET} -f {path} -o y".split(" ")
-        # print(COMMANDS)
-        result = subprocess.run(COMMANDS, capture_output=True, text=True)
-        # print(result.stderr)
-        # print(result.stdout)
-        max_blocks = [eval(f"[{r}]") for r in result.stdout.split("\n") if len(r)>1]
+        msa=MsaContext.from_fasta(msa).submsa(start_column, end_column)
 
-    finally:
-        # print(os.path.exists(path))
-        os.remove(path)
+    n_seqs=msa.nrows
 
-    if only_vertical: 
+    # compute maximal blocks with wild-pBWT
+    rows, offsets, starts, ends = run_wild_pbwt(msa.matrix, PATH_WILD_PBWT, alphabet_to_ascii, pool=pool, stdin_panel=stdin_panel)
+    rows, offsets = rows.tolist(), offsets.tolist()
+    max_blocks = [
+        [rows[offsets[j]:offsets[j+1]], start, end] for j, (start, end) in enumerate(zip(starts.tolist(), ends.tolist()))
+    ]
+
+    if only_vertical:
         max_blocks = [
             b for b in max_blocks if len(b[0]) == n_seqs
         ]
 
     # adjust start and end columns
-    if label_blocks: 
+    if label_blocks:
         max_blocks = [
-            [b[0], start_column + b[1], start_column + b[2], str(msa[b[0][0], b[1]:b[2]+1].seq).upper() ] for b in max_blocks
+            [b[0], start_column + b[1], start_column + b[2], msa.label(b[0][0], start_column + b[1], start_column + b[2]).upper() ] for b in max_blocks
         ]
     else:
         max_blocks = [
             [b[0], start_column + b[1], start_column + b[2]] for b in max_blocks
         ]
-    
+
     if output:
         Path(output).parent.mkdir(parents=True, exist_ok=True)
         if Path(output).suffix == ".txt":
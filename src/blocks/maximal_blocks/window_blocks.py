@@ -0,0 +1,84 @@
+"""
+Maximal blocks of subMSAs (windows) derived from the maximal blocks of the entire MSA.
+
+Every maximal block (K, i, j) of a window [a, b] is a maximal block of the entire MSA clipped
+to the window: extending it to the left and right while all rows in K agree gives a maximal
+block of the MSA with the same rows. Conversely, a clipped block is maximal in the window iff
+no other row spells the same string in the clipped columns (row-maximal), which can only fail
+for blocks that were actually clipped, since they lost the columns where the other rows differ.
+Two different maximal blocks of the MSA with the same rows do not overlap, so clipped blocks
+are never duplicated.
+
+Row-maximality of clipped blocks is checked with the sizes of the groups of identical rows in
+the columns [a, e] (blocks clipped on the left) and [s, b] (clipped on the right), computed
+for all e and s by refining a partition of the rows one column at a time.
+"""
+import logging
+import numpy as np
+
+from msa import MsaContext
+
+
+def group_sizes(columns: np.ndarray) -> np.ndarray:
+    """For each column c and each row r, the number of rows identical to r from the first column to c.
+    'columns' is a (n_seqs x n_cols) matrix of encoded characters"""
+    n_seqs, n_cols = columns.shape
+    sizes = np.empty((n_cols, n_seqs), dtype=np.int32)
+    groups = np.zeros(n_seqs, dtype=np.int64)
+    for col in range(n_cols):
+        # groups of the previous column are split by the character in the current one
+        _, groups, counts = np.unique(groups * 256 + columns[:, col], return_inverse=True, return_counts=True)
+        groups = groups.reshape(-1)
+        sizes[col] = counts[groups]
+    return sizes
+
+
+class GlobalMaximalBlocks:
+    "Maximal blocks [K, start, end] of the entire MSA (columns w.r.t. the MSA), to be clipped to windows"
+
+    def __init__(self, msa: MsaContext, maximal_blocks: list):
+        self.msa = msa
+        starts = np.array([b[1] for b in maximal_blocks], dtype=np.int64)
+        ends = np.array([b[2] for b in maximal_blocks], dtype=np.int64)
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.rows = [maximal_blocks[idx][0] for idx in self.order.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def window(self, start_column: int, end_column: int) -> list:
+        "Maximal blocks [K, start, end] of the window [start_column, end_column] (both included, w.r.t. the MSA)"
+        if end_column == -1:
+            end_column = self.msa.ncols - 1
+
+        # blocks overlapping the window: start <= end_column and end >= start_column
+        last = np.searchsorted(self.starts, end_column, side="right")
+        overlapping = np.flatnonzero(self.ends[:last] >= start_column)
+        starts = np.maximum(self.starts[overlapping], start_column).tolist()
+        ends = np.minimum(self.ends[overlapping], end_column).tolist()
+        clipped_left = (self.starts[overlapping] < start_column).tolist()
+        clipped_right = (self.ends[overlapping] > end_column).tolist()
+
+        prefix_sizes = suffix_sizes = None
+        if any(clipped_left) or any(clipped_right):
+            columns = np.asarray(self.msa.cols(start_column, end_column))
+            prefix_sizes = group_sizes(columns)
+            suffix_sizes = group_sizes(columns[:, ::-1])[::-1]
+
+        max_blocks = []
+        for idx, start, end, left, right in zip(overlapping.tolist(), starts, ends, clipped_left, clipped_right):
+            K = self.rows[idx]
+            if left:
+                # identical rows in [start_column, end]
+                if prefix_sizes[end - start_column, K[0]] != len(K):
+                    continue
+            elif right:
+                # identical rows in [start, end_column]
+                if suffix_sizes[start - start_column, K[0]] != len(K):
+                    continue
+            max_blocks.append([K, start, end])
+
+        logging.info(f"{len(max_blocks)} maximal blocks clipped from {len(overlapping)} global blocks ({start_column},{end_column})")
+        return max_blocks
@@ -0,0 +1,105 @@
+"""
+Pairs of blocks sharing at least one position of the MSA.
+
+Blocks are sorted by their starting column, so the blocks after a block b (in that order)
+overlapping its columns are a contiguous range: those starting before the end of b (sweep line).
+Among them, the ones sharing a row with b are found with an inverted index (row -> blocks including it),
+so only pairs with both common columns and common rows are generated. When the blocks in the range
+share many rows with b, testing each block of the range with the bitsets of the rows is cheaper,
+the cheapest of both is used for each block.
+
+Pairs are generated by chunks of blocks, to bound the memory used.
+"""
+import numpy as np
+from typing import Iterator
+
+from .block_table import BlockTable
+from .row_sets import row_words
+
+CHUNK_SIZE = 1 << 22 # (block, common row, block) triples, or words of bitsets of candidate pairs, expanded at once
+
+
+def _expand(first: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    "concatenation of the ranges [first, first + length)"
+    total = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(first - offsets, lengths) + np.arange(total)
+
+
+def overlapping_pairs(blocks: BlockTable, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Pairs (pos1, pos2) with pos1 < pos2 of blocks with at least one common position, in lexicographic order.
+    Blocks must be sorted by starting column. Yield chunks of arrays pos1, pos2 and 'nested'
+    (True if the rows of one block of the pair are a subset of the rows of the other one)"""
+    n_blocks = len(blocks)
+    if n_blocks < 2:
+        return
+    starts = blocks.starts.astype(np.int64)
+    assert np.all(starts[1:] >= starts[:-1]), "blocks must be sorted by starting column"
+    all_blocks = np.arange(n_blocks, dtype=np.int64)
+
+    # sweep line: blocks pos2 overlapping the columns of pos1 are pos1 < pos2 < last[pos1]
+    last = np.searchsorted(starts, blocks.ends.astype(np.int64), side="right")
+
+    # inverted index: (row, block) entries sorted by row and then by block
+    nrows = blocks.nrows()
+    block_of_entry = np.repeat(all_blocks, nrows)
+    index_keys = blocks.rows.astype(np.int64) * (n_blocks + 1) + block_of_entry
+    order = np.argsort(index_keys, kind="stable")
+    index_keys, index_blocks = index_keys[order], block_of_entry[order]
+
+    # for each row r of each block pos1, the entries of r in the index for the blocks pos1 < pos2 < last[pos1]:
+    # they start right after the entry of (r, pos1), queries are done in the order of the index
+    first, lengths = np.empty_like(order), np.empty_like(order)
+    first[order] = np.arange(1, len(order) + 1)
+    lengths[order] = np.searchsorted(index_keys, index_keys - index_blocks + last[index_blocks], side="left")
+    lengths -= first
+    np.maximum(lengths, 0, out=lengths)
+    cum_lengths = np.concatenate(([0], np.cumsum(lengths)))
+    n_triples = cum_lengths[blocks.offsets[1:]] - cum_lengths[blocks.offsets[:-1]]
+
+    # candidate pairs by the columns, tested with the bitsets of the rows when cheaper than the triples
+    window = last - all_blocks - 1
+    n_words = (int(blocks.rows.max()) // 64 + 1) if len(blocks.rows) else 1
+    by_bitsets = window * n_words < n_triples
+    packed = row_words(blocks, n_words) if by_bitsets.any() else None
+    cost = np.where(by_bitsets, window * n_words, n_triples)
+    cumulative = np.concatenate(([0], np.cumsum(cost)))
+
+    start_block = 0
+    while start_block < n_blocks:
+        # at least one block per chunk
+        end_block = max(np.searchsorted(cumulative, cumulative[start_block] + chunk_size, side="right") - 1, start_block + 1)
+        pos1, pos2, nested = [], [], []
+
+        # bitsets: all blocks in the column window, keep the ones with common rows
+        bitset_blocks = start_block + np.flatnonzero(by_bitsets[start_block:end_block])
+        if len(bitset_blocks):
+            p1 = np.repeat(bitset_blocks, window[bitset_blocks])
+            p2 = _expand(bitset_blocks + 1, window[bitset_blocks])
+            rows1, rows2 = packed[p1], packed[p2]
+            common = rows1 & rows2
+            keep = common.any(axis=1)
+            common, rows1, rows2 = common[keep], rows1[keep], rows2[keep]
+            pos1.append(p1[keep]); pos2.append(p2[keep])
+            nested.append((common == rows1).all(axis=1) | (common == rows2).all(axis=1))
+
+        # inverted index: blocks of the window by each row, a pair is repeated once by common row
+        entries = np.arange(blocks.offsets[start_block], blocks.offsets[end_block])
+        entries = entries[~by_bitsets[block_of_entry[entries]]]
+        if int(lengths[entries].sum()):
+            p1 = np.repeat(block_of_entry[entries], lengths[entries])
+            p2 = index_blocks[_expand(first[entries], lengths[entries])]
+            pairs, common = np.unique(p1 * n_blocks + p2, return_counts=True)
+            p1, p2 = pairs // n_blocks, pairs % n_blocks
+            pos1.append(p1); pos2.append(p2)
+            nested.append((common == nrows[p1]) | (common == nrows[p2]))
+
+        if pos1:
+            merge = len(pos1) > 1
+            pos1, pos2, nested = np.concatenate(pos1), np.concatenate(pos2), np.concatenate(nested)
+            # pairs of each method are sorted, merge them
+            if merge:
+                order = np.argsort(pos1 * n_blocks + pos2, kind="stable")
+                pos1, pos2, nested = pos1[order], pos2[order], nested[order]
+            yield pos1, pos2, nested
+        start_block = end_block
@@ -0,0 +1,59 @@
+"""
+Rows of blocks as bitsets.
+
+The rows K of a block are stored as a Python int with the bit r set for each row r in K,
+intersection, difference and subset tests are operations over the words of the ints
+(no set is built). Columns of two blocks overlap iff their intervals do, O(1).
+
+For batches of blocks (BlockTable), the bitsets are rows of 64-bit words of a numpy array.
+"""
+import numpy as np
+
+ROWS_BY_LOOP = 32 # rows of a bitset decoded one by one, more rows are decoded with numpy
+
+
+def row_mask(K) -> int:
+    "bitset of the rows in K"
+    mask = 0
+    for r in K:
+        mask |= 1 << r
+    return mask
+
+
+def mask_rows(mask: int) -> tuple:
+    "sorted rows of a bitset"
+    if mask.bit_count() <= ROWS_BY_LOOP:
+        rows = []
+        while mask:
+            low = mask & -mask
+            rows.append(low.bit_length() - 1)
+            mask ^= low
+        return tuple(rows)
+    bits = np.unpackbits(np.frombuffer(mask.to_bytes((mask.bit_length() + 7) // 8, "little"), dtype=np.uint8), bitorder="little")
+    return tuple(np.flatnonzero(bits).tolist())
+
+
+def columns_overlap(block1, block2) -> bool:
+    "True if the columns [start, end] of the blocks have at least one column in common"
+    return block1.start <= block2.end and block2.start <= block1.end
+
+
+def row_words(blocks, n_words: int = None) -> np.ndarray:
+    "bitsets of the rows of the blocks of a BlockTable, one row of 64-bit words by block"
+    if n_words is None:
+        n_words = int(blocks.rows.max()) // 64 + 1 if len(blocks.rows) else 1
+    words = np.zeros((len(blocks), n_words), dtype=np.uint64)
+    rows = blocks.rows.astype(np.uint64)
+    block_of_row = np.repeat(np.arange(len(blocks)), blocks.nrows())
+    # rows are unique within a block, adding the bits sets them
+    np.add.at(words, (block_of_row, (rows >> np.uint64(6)).astype(np.int64)), np.uint64(1) << (rows & np.uint64(63)))
+    return words
+
+
+def words_rows(words: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "sorted rows of bitsets given as rows of 64-bit words, in CSR format (rows, offsets)"
+    bits = np.unpackbits(np.ascontiguousarray(words, dtype="<u8").view(np.uint8), axis=1, bitorder="little")
+    blocks, rows = np.nonzero(bits)
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(blocks, minlength=len(words)), out=offsets[1:])
+    return rows, offsets
@@ -8,6 +8,7 @@ import json
 import argparse
 from blocks import Block
 from ilp.variaton_graph_parser import asGFA
+from msa import MsaContext
 from pathlib import Path
 from dataclasses import astuple
 import logging
@@ -33,8 +34,9 @@ def main(args):
     # parse optimal coverage as GFA
     ti = time.time()
     logging.info("Parsing graph as GFA")
+    msa = MsaContext.load(path_msa, cache_dir=args.msa_cache_dir)
     parser = asGFA()
-    parser(opt_coverage, path_gfa, path_msa)
+    parser(opt_coverage, path_gfa, msa)
     tf = time.time()
     t_gfa = tf - ti
     print(f"time GFA: {t_gfa:0.2}")
@@ -56,6 +58,12 @@ if __name__ == "__main__":
         dest="path_vert_blocks",
         type=str,
     )
+    parser.add_argument(
+        "--msa-cache-dir",
+        help="directory to cache the encoded MSA, shared by all stages of the pipeline",
+        dest="msa_cache_dir",
+        default=None,
+    )
     parser.add_argument(
         "--log-level",
         default="ERROR",
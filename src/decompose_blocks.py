@@ -1,7 +1,6 @@
 import argparse
 import json
 import time
-from dataclasses import astuple
 from pathlib import Path
 from blocks import BlockAnalyzer, block_decomposition, Decomposer
 from utils import MonitorValuesPlus
@@ -35,7 +34,7 @@ t_decomp_blocks = t2-t1
 Path(args.output).parent.mkdir(parents=True, exist_ok=True)
 print(args.output)
 with open(args.output, "w") as fp:
-    json.dump([astuple(block) for block in decomposed_blocks], fp)
+    json.dump([tuple(block) for block in decomposed_blocks], fp)
 
 # save times
 path_time = Path(args.output).parent / (Path(args.output).stem + ".txt")
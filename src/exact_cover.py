@@ -9,17 +9,20 @@ import cProfile
 import time
 import json
 import argparse
-from Bio import AlignIO
 from pathlib import Path
-from dataclasses import astuple
 import logging
 
 # pangeblocks
-from blocks import Block
+from blocks import Block, BlockIndex, BlockTable
 from ilp.input import InputBlockSet
+from ilp.input_cache import InputSetCache
 from ilp.optimization import Optimization
+from msa import MsaContext, FastaIndex, Haplotypes
 from blocks.maximal_blocks.suffix_tree import compute_maximal_blocks as maximal_blocks_suffixtree # FIXME: did not touch this
-from blocks.maximal_blocks.wild_pbwt import compute_maximal_blocks as maximal_blocks_pbwt
+from blocks.maximal_blocks.wild_pbwt import compute_maximal_blocks as maximal_blocks_pbwt, WildPbwtPool
+from blocks.maximal_blocks.pbwt import compute_maximal_blocks as maximal_blocks_native_pbwt
+from blocks.maximal_blocks.suffix_array import compute_maximal_blocks as maximal_blocks_suffixarray
+from blocks.maximal_blocks.window_blocks import GlobalMaximalBlocks
 
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
@@ -38,50 +41,57 @@ def boolean_string(s):
     return s == 'True'
 
 
-def label_from_block(block, msa):
-    K, start, end = block
-    start, end = int(start), int(end)
-    return str(msa[int(K[0])].seq[start:end+1])
+def label_from_block(block, msa: MsaContext):
+    K, start, end = block[:3]
+    return msa.label(K[0], start, end)
 
+# engines to compute maximal blocks with the pBWT, wild-pbwt runs the external binary
+PBWT_ENGINES = {"wild-pbwt": maximal_blocks_pbwt, "native": maximal_blocks_native_pbwt}
+# engines to compute maximal blocks as maximal repeats, used if the pBWT is not
+SUFFIX_ENGINES = {"suffix-tree": maximal_blocks_suffixtree, "suffix-array": maximal_blocks_suffixarray}
 
-def load_submsa(filename, start_column=0, end_column=-1):
-    "Return 0-indexed MSA from start_column to end_column (both included)"
-    # load MSA
-    msa = AlignIO.read(filename, "fasta")
-    
-    # filter sub-MSA if start/end columns are given
-    if start_column>0 or end_column!=-1:
-        # get last column
-        n_cols = msa.get_alignment_length()
-        assert start_column < n_cols and end_column < n_cols, f"start_column={start_column}, end_column={end_column}. Must be < {n_cols} (number of columns in the MSA)"
-        if end_column == -1:
-            msa = msa[:, start_column:] # end_column included
-        else:
-            msa = msa[:, start_column:end_column+1] # end_column included
-    return msa
-
-def generate_input_set(path_msa, start_column, end_column, bin_wildpbwt, use_wildpbwt, standard_decomposition, min_nrows_to_fix_block, min_ncols_to_fix_block):
-    # 1. compute maximal blocks
-    logging.info(f"Computing maximal blocks")
-    # Return positions w.r.t. the full MSA
+def compute_maximal_blocks(submsa: MsaContext, start_column, end_column, bin_wildpbwt, use_wildpbwt,
+                           pbwt_engine: str = "wild-pbwt", pbwt_pool: Optional[WildPbwtPool] = None, suffix_engine: str = "suffix-tree"):
+    "Maximal blocks of the subMSA, positions w.r.t. the full MSA. 'pbwt_pool' are wild-pbwt processes spawned in advance"
     if use_wildpbwt:
-        maximal_blocks = maximal_blocks_pbwt(
-                    msa=path_msa,
+        return PBWT_ENGINES[pbwt_engine](
+                    msa=submsa,
                     start_column=start_column, end_column=end_column,
                     alphabet_to_ascii = {"-":0,"A":1,"C":2,"G":3,"T":4,"N":5},
                     bin_wildpbwt = bin_wildpbwt,
-                    label_blocks = True
+                    label_blocks = True,
+                    pool = pbwt_pool,
+                )
+    return SUFFIX_ENGINES[suffix_engine](
+                msa=submsa, 
+                start_column=start_column, end_column=end_column, only_vertical=False
                 )
+
+def generate_input_set(msa: MsaContext, start_column, end_column, bin_wildpbwt, use_wildpbwt, standard_decomposition, min_nrows_to_fix_block, min_ncols_to_fix_block,
+                       haplotypes: Optional[Haplotypes] = None, pbwt_engine: str = "wild-pbwt", pbwt_pool: Optional[WildPbwtPool] = None,
+                       global_blocks: Optional[GlobalMaximalBlocks] = None, suffix_engine: str = "suffix-tree",
+                       decomposition_processes: int = 1):
+    """'msa' is the full MSA, the subMSA [start_column, end_column] is used as a view of it.
+    If 'haplotypes' is given, 'msa' is the collapsed subMSA.
+    If 'global_blocks' is given, maximal blocks are clipped from the maximal blocks of the entire MSA"""
+    submsa = msa.submsa(start_column, end_column)
+
+    # 1. compute maximal blocks
+    logging.info(f"Computing maximal blocks")
+    # Return positions w.r.t. the full MSA
+    if global_blocks is not None:
+        maximal_blocks = global_blocks.window(start_column, end_column)
     else:
-        maximal_blocks = maximal_blocks_suffixtree(
-                    filename=path_msa, 
-                    start_column=start_column, end_column=end_column, only_vertical=False
-                    )
-    
-    msa = load_submsa(path_msa, start_column, end_column)
-    nrows_msa=len(msa)
-    ncols_msa=msa.get_alignment_length()
+        maximal_blocks = compute_maximal_blocks(submsa, start_column, end_column, bin_wildpbwt, use_wildpbwt,
+                                                pbwt_engine=pbwt_engine, pbwt_pool=pbwt_pool, suffix_engine=suffix_engine)
     
+    # a row representing several identical rows is a maximal block by itself
+    if haplotypes:
+        maximal_blocks.extend(((row,), submsa.start_column, submsa.end_column) for row, weight in enumerate(haplotypes.weights) if weight > 1)
+
+    nrows_msa=submsa.nrows
+    ncols_msa=submsa.ncols
+
 
     # 2. compute input set of blocks for the ILP (decomposition is included)
     logging.info(f"Generating input set ({start_column},{end_column})")
@@ -90,11 +100,12 @@ def generate_input_set(path_msa, start_column, end_column, bin_wildpbwt, use_wil
     inputset_gen = InputBlockSet(
         standard_decomposition=standard_decomposition,
         min_nrows_to_fix_block=min_nrows_to_fix_block, min_ncols_to_fix_block=min_ncols_to_fix_block,       # to fix a maximal block in the solution
-        nrows=nrows_msa, ncols=ncols_msa                                                                    # to compute min_rows and min_cols in case they are percentage in (0,1)
+        nrows=nrows_msa, ncols=ncols_msa,                                                                   # to compute min_rows and min_cols in case they are percentage in (0,1)
+        decomposition_processes=decomposition_processes,                                                    # to decompose pairs of blocks in parallel
     )
     # inputset is a list with blocks to be used by the ILP
     # missing blocks is a list of one-row blocks with the positions not covered by maximal blocks 
-    inputset, missing_blocks = inputset_gen(path_msa, maximal_blocks, start_column, end_column)
+    inputset, missing_blocks = inputset_gen(submsa, maximal_blocks, start_column, end_column)
     logging.info(f"Generated input set ({start_column},{end_column})")
     return inputset, missing_blocks
 
@@ -103,9 +114,22 @@ def solve_submsa(path_msa, start_column, end_column,
                  obj_function, penalization, min_len, min_coverage, 
                  time_limit, threads_ilp=8,
                  use_wildpbwt: bool = True, bin_wildpbwt: Optional[str] = None, 
-                 standard_decomposition: bool = False, blocks_msa: Optional[list] = None, 
+                 standard_decomposition: bool = False, blocks_msa: Optional[BlockIndex] = None, 
                  min_nrows_to_fix_block: int = 0, min_ncols_to_fix_block: int = 0,
+                 msa: Optional[MsaContext] = None, msa_index: Optional[FastaIndex] = None,
+                 collapse_haplotypes: bool = False, pbwt_engine: str = "wild-pbwt", pbwt_pool: Optional[WildPbwtPool] = None,
+                 global_blocks: Optional[GlobalMaximalBlocks] = None, suffix_engine: str = "suffix-tree",
+                 input_cache: Optional[InputSetCache] = None, decomposition_processes: int = 1,
+                 prune_dominated: bool = False,
                  **kwargs ):
+    """'msa' is the full MSA, if not provided only the columns [start_column, end_column]
+    are read from 'path_msa' (using 'msa_index' if given).
+    'blocks_msa' is the index of the input set of the entire MSA, used for alpha consistent blocks.
+    'global_blocks' are the maximal blocks of the entire MSA, clipped to the subMSA (not used with collapsed haplotypes).
+    If 'collapse_haplotypes', rows identical in the subMSA are solved as one row weighted by its multiplicity.
+    If 'input_cache' is given, the input set is loaded from it when the subMSA was already solved with the same parameters.
+    'decomposition_processes' are the processes used to decompose pairs of blocks.
+    If 'prune_dominated', blocks of the input set that are not in any optimal solution are removed before the ILP"""
     logging.info(f"Working on: {Path(path_msa).stem} | columns [{start_column},{end_column}]")
     
     logging.info(f">>>> solve_submsa standard_decomposition={standard_decomposition}")
@@ -116,12 +140,15 @@ def solve_submsa(path_msa, start_column, end_column,
         min_len=min_len,
         min_coverage=min_coverage,
         time_limit=time_limit,
-        threads_ilp=threads_ilp
+        threads_ilp=threads_ilp,
+        prune_dominated=prune_dominated,
     )
 
-    msa = load_submsa(path_msa, start_column, end_column)
-    n_cols=msa.get_alignment_length()
-    n_seqs=len(msa)
+    if msa is None:
+        msa = MsaContext.from_fasta_window(path_msa, start_column, end_column, index=msa_index)
+    submsa = msa.submsa(start_column, end_column)
+    n_cols=submsa.ncols
+    n_seqs=submsa.nrows
 
     # if only one column is involved, return the blocks with one character
     if start_column==end_column:
@@ -132,7 +159,7 @@ def solve_submsa(path_msa, start_column, end_column,
         for col in range(n_cols):
             seq_by_char = defaultdict(list)
             for row in range(n_seqs):
-                seq_by_char[msa[row,col]].append(row)
+                seq_by_char[submsa.cased_matrix[row,col]].append(row)
 
             for c, K in seq_by_char.items():
                 # ommit vertical blocks, they will be part of a maximal one
@@ -140,7 +167,7 @@ def solve_submsa(path_msa, start_column, end_column,
                     blocks_one_char.append(
                             Block(K=K, start=col+start_column, end=col+start_column)
                     )
-        opt_coverage = blocks_one_char
+        opt_coverage = BlockTable.from_blocks(blocks_one_char)
 
         for b in opt_coverage:
             logging.info(f"Optimal Coverage block {b.str()}")
@@ -148,23 +175,50 @@ def solve_submsa(path_msa, start_column, end_column,
 
     else:
         
+        # identical rows of the subMSA are replaced by one representative,
+        # blocks of the solution are expanded back to the original rows
+        haplotypes = None
+        if collapse_haplotypes and blocks_msa:
+            logging.info(f"collapse haplotypes is not used with alpha consistent blocks ({start_column},{end_column})")
+        elif collapse_haplotypes:
+            haplotypes = Haplotypes(submsa)
+            logging.info(f"collapsed {n_seqs} rows into {len(haplotypes)} haplotypes ({start_column},{end_column})")
+        ilp_msa = haplotypes.msa if haplotypes else submsa
+
         # solve subMSA with blocks computed in the entire MSA
         if blocks_msa:
             if end_column == -1: end_column = n_cols-1
             logging.info(f"end_column: {end_column}")
             logging.info(f"alpha consistent: filtering blocks for ({start_column},{end_column})")
             # we assume block_msa is the input set to solve the entire MSA
-            # filter blocks_msa based on starting and end position of the blocks
-            inputset = [b for b in blocks_msa if all([start_column <= b.start, b.end <= end_column])]
-            missing_blocks = []
+            # blocks contained in the subMSA are retrieved from the index of blocks_msa
+            inputset = blocks_msa.contained(start_column, end_column)
+            missing_blocks = BlockTable.empty()
         else:
-            logging.info(f"computing blocks for ({start_column},{end_column})")
-            inputset, missing_blocks = generate_input_set(
-                path_msa, start_column, end_column, bin_wildpbwt, use_wildpbwt, standard_decomposition, min_nrows_to_fix_block, min_ncols_to_fix_block
-                )    
+            cached, cache_key = None, None
+            if input_cache:
+                cache_key = input_cache.key(
+                    ilp_msa.submsa(start_column, end_column), pbwt_engine if use_wildpbwt else suffix_engine,
+                    standard_decomposition, min_nrows_to_fix_block, min_ncols_to_fix_block, haplotypes=haplotypes,
+                    )
+                cached = input_cache.get(cache_key, submsa.start_column)
+
+            if cached:
+                logging.info(f"input set from cache for ({start_column},{end_column})")
+                inputset, missing_blocks = cached
+            else:
+                logging.info(f"computing blocks for ({start_column},{end_column})")
+                inputset, missing_blocks = generate_input_set(
+                    ilp_msa, start_column, end_column, bin_wildpbwt, use_wildpbwt, standard_decomposition, min_nrows_to_fix_block, min_ncols_to_fix_block,
+                    haplotypes=haplotypes, pbwt_engine=pbwt_engine, pbwt_pool=pbwt_pool,
+                    global_blocks=None if haplotypes else global_blocks, suffix_engine=suffix_engine,
+                    decomposition_processes=decomposition_processes,
+                    )
+                if input_cache:
+                    input_cache.put(cache_key, submsa.start_column, inputset, missing_blocks)
         
         logging.info(f"blocks in input set {len(inputset)} ({start_column},{end_column})")        
-        logging.info(f"vertical blocks in input set {len([b for b in inputset if len(b[0])==n_seqs])} ({start_column},{end_column})")        
+        logging.info(f"vertical blocks in input set {int((inputset.nrows()==n_seqs).sum())} ({start_column},{end_column})")        
         
         for b in inputset:
             logging.debug(f"block in inputset: {b}")
@@ -172,17 +226,24 @@ def solve_submsa(path_msa, start_column, end_column,
         # 3. solve the ILP / output ILP model
         # find optimal coverage of the MSA by blocks
         logging.info("Starting optimization")
-        opt = Optimization(blocks=inputset, path_msa=path_msa, start_column=start_column, end_column=end_column,
-                        log_level=args.log_level, path_save_ilp=path_save_ilp, **kwargs_opt)
+        opt = Optimization(blocks=inputset, msa=ilp_msa, start_column=start_column, end_column=end_column,
+                        log_level=args.log_level, path_save_ilp=path_save_ilp, 
+                        weights=haplotypes.weights if haplotypes else None, **kwargs_opt)
         opt_coverage = opt(solve_ilp=solve_ilp)
+        if prune_dominated:
+            logging.info(f"blocks removed from the ILP by pruning {opt.n_pruned} ({start_column},{end_column})")
+
+        if haplotypes:
+            opt_coverage = BlockTable.from_blocks(Block(K=haplotypes.expand(b.K), start=b.start, end=b.end) for b in opt_coverage)
+            missing_blocks = BlockTable.from_blocks(Block(K=haplotypes.expand(b.K), start=b.start, end=b.end) for b in missing_blocks)
 
         for b in opt_coverage:
             logging.info(f"Optimal Coverage block {b.str()}")
         logging.info(f"Number of blocks optimal solution {len(opt_coverage)} ({start_column},{end_column})")
 
-        logging.info(f"positions covered by opt solution {sum([block.ncells() for block in opt_coverage])}")
-        logging.info(f"positions covered by missing blocks {sum([block.ncells() for block in missing_blocks])}")
-        opt_coverage.extend(missing_blocks)
+        logging.info(f"positions covered by opt solution {int(opt_coverage.ncells().sum())}")
+        logging.info(f"positions covered by missing blocks {int(missing_blocks.ncells().sum())}")
+        opt_coverage = BlockTable.concatenate([opt_coverage, missing_blocks])
         logging.info(f"Number of blocks optimal solution plus missing blocks {len(opt_coverage)} ({start_column},{end_column})")
         for b in missing_blocks:
             logging.info(f"Optimal Coverage block (missing_block) {b.str()}")
@@ -191,12 +252,11 @@ def solve_submsa(path_msa, start_column, end_column,
     # logging.info(f"positions covered by opt solution {sum([block.ncells() for block in opt_coverage])}")
 
     if path_opt_solution:
-        full_msa = load_submsa(path_msa) # to obtain labels from blocks
         Path(path_opt_solution).parent.mkdir(exist_ok=True, parents=True)
         with open(path_opt_solution, "w") as fp:    
-            blocks = [astuple(block) for block in opt_coverage]
+            blocks = [tuple(block) for block in opt_coverage]
             # blocks = [[ [int(s) for s in b[0]],int(b[1]), int(b[2]),b[3]] for b in blocks]
-            blocks = [[ [int(s) for s in b[0]],int(b[1]), int(b[2]), label_from_block(b, full_msa)] for b in blocks] 
+            blocks = [[ [int(s) for s in b[0]],int(b[1]), int(b[2]), label_from_block(b, msa)] for b in blocks] 
             json.dump(blocks, fp)
 
     
@@ -213,6 +273,9 @@ if __name__=="__main__":
     parser.add_argument("-ec","--end-column", help="Last column in the MSA to consider. Default=-1", type=int, default=-1, dest ="end_column")
     parser.add_argument("-pbwt","--use-wildpbwt", help="Compute maximal blocks with WildPBWT, otherwise use Suffix Tree. Default True",  default=True, type=boolean_string,  dest="use_wildpbwt")
     parser.add_argument("--bin-wildpbwt", help="path to bin/wild-pbwt", dest="bin_wildpbwt", default="Wild-pBWT/bin/wild-pbwt")
+    parser.add_argument("--wildpbwt-stdin", help="write the panel to the standard input of wild-pbwt processes spawned in advance (one per worker) instead of a temporary file. Not checked against all versions of wild-pbwt. Default False", type=boolean_string, default=False, dest="wildpbwt_stdin")
+    parser.add_argument("--pbwt-engine", help="compute maximal blocks with the binary wild-pbwt or with the pBWT in-process (native). Default wild-pbwt", dest="pbwt_engine", choices=list(PBWT_ENGINES), default="wild-pbwt")
+    parser.add_argument("--suffix-engine", help="compute maximal blocks with a suffix tree or a suffix array when --use-wildpbwt False. Default suffix-tree", dest="suffix_engine", choices=list(SUFFIX_ENGINES), default="suffix-tree")
     parser.add_argument("-sd","--standard-decomposition", default=True, type=boolean_string, dest="standard_decomposition")
     # ILP
     parser.add_argument("--obj-function", help="objective function", dest="obj_function", choices=["nodes","strings","weighted","depth","depth_and_len"])
@@ -221,6 +284,7 @@ if __name__=="__main__":
     parser.add_argument("--min-coverage", help="minimum percentage of sequence when using 'depth' as obj_function to be penalized", dest="min_coverage", type=float)
     parser.add_argument("--time-limit", help="time limit in minutes to run the ILP, after this the best solution so far will be returned", dest="time_limit", type=int, default=180)
     parser.add_argument("--threads-ilp", help="threads used by gurobi to solve an ILPi", dest="threads_ilp", type=int, default=4)
+    parser.add_argument("--prune-dominated", help="remove blocks of the input set that are not in any optimal solution (forced or dominated blocks) before building the ILP. Default False", type=boolean_string, default=False, dest="prune_dominated")
 
     parser.add_argument("--min-rows-fixblock", help="minimum number of rows to fix a maximal block in the solution", dest="min_nrows_to_fix_block", type=int, default=0)
     parser.add_argument("--min-columns-fixblock", help="minimum number of columns to fix a maximal block in the solution", dest="min_ncols_to_fix_block", type=int, default=0)
@@ -232,8 +296,15 @@ if __name__=="__main__":
     
     parser.add_argument("--submsa-index", help="file with start-end positions of vertical blocks in the MSA", dest="submsa_index")
     parser.add_argument("--workers", help="Workers for ThreadPoolExecutor to solve subMSAs", dest="workers", type=int, default=16)
+    parser.add_argument("--decomposition-processes", help="processes to decompose pairs of blocks of each subMSA, the output is the same as with 1 process. Default 1", dest="decomposition_processes", type=int, default=1)
 
     parser.add_argument("--alpha-consistent", type=boolean_string, default=True, dest="alpha_consistent")
+    parser.add_argument("--msa-cache-dir", help="directory to cache the encoded MSA, shared by all stages of the pipeline", dest="msa_cache_dir", default=None)
+    parser.add_argument("--input-set-cache-dir", help="directory to cache the input set of each subMSA, shared by runs with different objective functions. Ignored if --alpha-consistent True", dest="input_set_cache_dir", default=None)
+    parser.add_argument("--input-set-cache-size", help="maximum size (MB) of the input set cache, least recently used input sets are removed. Default 2048", dest="input_set_cache_size", type=int, default=2048)
+    parser.add_argument("--collapse-haplotypes", help="solve identical rows of each subMSA as one row weighted by its multiplicity. Ignored if --alpha-consistent True", type=boolean_string, default=False, dest="collapse_haplotypes")
+    parser.add_argument("--global-maximal-blocks", help="compute maximal blocks once for the entire MSA and clip them to each subMSA. Ignored if --alpha-consistent True", type=boolean_string, default=False, dest="global_maximal_blocks")
+    parser.add_argument("--window-reader", help="read only the columns of each subMSA from the fasta file instead of loading the entire MSA. Ignored if --alpha-consistent True", type=boolean_string, default=False, dest="window_reader")
     args = parser.parse_args()
 
     
@@ -245,11 +316,30 @@ if __name__=="__main__":
     logging.info(f"alpha_consistent {args.alpha_consistent} {type(args.alpha_consistent)}")
     logging.info(f"standard_decomposition {args.standard_decomposition} {type(args.alpha_consistent)}")
     logging.info(f"standard_decomposition {args.standard_decomposition} {type(args.alpha_consistent)}")
-    logging.info(f"pBWT {args.use_wildpbwt}")
+    logging.info(f"pBWT {args.use_wildpbwt} ({args.pbwt_engine if args.use_wildpbwt else args.suffix_engine})")
 
     OptArgs=namedtuple("OptArgs",["obj_function", "penalization", "min_len", "min_coverage", "time_limit"])
     ArgsPool=namedtuple("Args",["start_column", "end_column", "path_save_ilp", "path_opt_solution"])
 
+    # the MSA is loaded once and shared by all subMSAs,
+    # unless each subMSA reads its own columns (the entire MSA is needed for alpha consistent blocks)
+    msa, msa_index = None, None
+    if args.window_reader and not args.alpha_consistent and not args.global_maximal_blocks:
+        logging.info("window reader: indexing the MSA")
+        msa_index = FastaIndex.from_fasta(args.path_msa)
+    else:
+        msa = MsaContext.load(args.path_msa, cache_dir=args.msa_cache_dir)
+
+    # processes of wild-pbwt are spawned in advance, one per worker, the panel is written to their standard input
+    pbwt_pool = None
+    if args.use_wildpbwt and args.pbwt_engine == "wild-pbwt" and args.wildpbwt_stdin:
+        pbwt_pool = WildPbwtPool(args.bin_wildpbwt, n_processes=max(args.workers, 1))
+
+    # input sets of subMSAs are shared with other runs through a cache in disk
+    input_cache = None
+    if args.input_set_cache_dir and not args.alpha_consistent:
+        input_cache = InputSetCache(args.input_set_cache_dir, max_size=args.input_set_cache_size << 20)
+
     opt_args=OptArgs(args.obj_function, args.penalization, args.min_len, args.min_coverage, args.time_limit)
     submsa = partial(solve_submsa, path_msa=args.path_msa, solve_ilp=args.solve_ilp, 
                          obj_function=args.obj_function, penalization=args.penalization,
@@ -257,24 +347,40 @@ if __name__=="__main__":
                          use_wildpbwt=args.use_wildpbwt, bin_wildpbwt=args.bin_wildpbwt,
                          threads_ilp=args.threads_ilp, 
                          standard_decomposition=args.standard_decomposition,
-                         min_nrows_to_fix_block=args.min_nrows_to_fix_block, min_ncols_to_fix_block=args.min_ncols_to_fix_block
+                         min_nrows_to_fix_block=args.min_nrows_to_fix_block, min_ncols_to_fix_block=args.min_ncols_to_fix_block,
+                         msa=msa, msa_index=msa_index, collapse_haplotypes=args.collapse_haplotypes,
+                         pbwt_engine=args.pbwt_engine, pbwt_pool=pbwt_pool, suffix_engine=args.suffix_engine,
+                         input_cache=input_cache, decomposition_processes=args.decomposition_processes,
+                         prune_dominated=args.prune_dominated,
                          )
 
+    # maximal blocks of each subMSA are clipped from the maximal blocks of the entire MSA
+    global_blocks = None
+    if args.global_maximal_blocks and not args.alpha_consistent:
+        logging.info("global maximal blocks: Computing maximal blocks for the entire MSA")
+        global_blocks = GlobalMaximalBlocks(msa, compute_maximal_blocks(
+            msa.submsa(0, -1), 0, -1, args.bin_wildpbwt, args.use_wildpbwt,
+            pbwt_engine=args.pbwt_engine, pbwt_pool=pbwt_pool, suffix_engine=args.suffix_engine,
+            ))
+
     # compute input set of the entire MSA if alpha_consistent is set as true
     blocks_msa = None
     if args.alpha_consistent:
         logging.info("alpha consistent: Computing blocks for the entire MSA")
         blocks_msa, missing_blocks = generate_input_set(
-            path_msa=args.path_msa, 
+            msa=msa, 
             start_column=0, 
             end_column=-1, 
             bin_wildpbwt=args.bin_wildpbwt, 
             use_wildpbwt=args.use_wildpbwt, 
             standard_decomposition=args.standard_decomposition,
-            min_nrows_to_fix_block=args.min_nrows_to_fix_block, min_ncols_to_fix_block=args.min_ncols_to_fix_block
+            min_nrows_to_fix_block=args.min_nrows_to_fix_block, min_ncols_to_fix_block=args.min_ncols_to_fix_block,
+            pbwt_engine=args.pbwt_engine, pbwt_pool=pbwt_pool, suffix_engine=args.suffix_engine,
+            decomposition_processes=args.decomposition_processes,
             )
-        blocks_msa.extend(missing_blocks)
-        missing_blocks=[]
+        # index shared (read-only) by all subMSAs
+        blocks_msa = BlockIndex(BlockTable.concatenate([blocks_msa, missing_blocks]))
+        missing_blocks = BlockTable.empty()
 
     # If index with start-end pairs in between vertical blocks is given, run in parallel all subMSAs 
     if args.submsa_index:
@@ -298,6 +404,7 @@ if __name__=="__main__":
                     path_save_ilp=None, #argspool.path_save_ilp, 
                     path_opt_solution=argspool.path_opt_solution,
                     blocks_msa=blocks_msa,
+                    global_blocks=global_blocks,
                     )
             
             with ThreadPoolExecutor(max_workers=args.workers) as pool:
@@ -340,7 +447,17 @@ if __name__=="__main__":
                     standard_decomposition=args.standard_decomposition,
                     blocks_msa=blocks_msa,
                     min_nrows_to_fix_block=args.min_nrows_to_fix_block,
-                    min_ncols_to_fix_block=args.min_ncols_to_fix_block
+                    min_ncols_to_fix_block=args.min_ncols_to_fix_block,
+                    msa=msa,
+                    msa_index=msa_index,
+                    collapse_haplotypes=args.collapse_haplotypes,
+                    pbwt_engine=args.pbwt_engine,
+                    pbwt_pool=pbwt_pool,
+                    global_blocks=global_blocks,
+                    suffix_engine=args.suffix_engine,
+                    input_cache=input_cache,
+                    decomposition_processes=args.decomposition_processes,
+                    prune_dominated=args.prune_dominated,
                 )
 
     else:
@@ -363,5 +480,18 @@ if __name__=="__main__":
             standard_decomposition=args.standard_decomposition,
             blocks_msa=blocks_msa,
             min_nrows_to_fix_block=args.min_nrows_to_fix_block,
-            min_ncols_to_fix_block=args.min_ncols_to_fix_block
-        )
\ No newline at end of file
+            min_ncols_to_fix_block=args.min_ncols_to_fix_block,
+            msa=msa,
+            msa_index=msa_index,
+            collapse_haplotypes=args.collapse_haplotypes,
+            pbwt_engine=args.pbwt_engine,
+            pbwt_pool=pbwt_pool,
+            global_blocks=global_blocks,
+            suffix_engine=args.suffix_engine,
+            input_cache=input_cache,
+            decomposition_processes=args.decomposition_processes,
+            prune_dominated=args.prune_dominated,
+        )
+
+    if pbwt_pool:
+        pbwt_pool.close()
@@ -1,9 +1,7 @@
 import numpy as np
 from collections import defaultdict
-from dataclasses import astuple
 from typing import Union, Optional
 from pathlib import Path
-from Bio import AlignIO
 
 # ------
 # FIXME:  better way to import this?
@@ -11,8 +9,9 @@ import sys
 PATH=Path(__file__).parent.parent.parent
 sys.path.append(str(PATH))
 
-from src.blocks import Block # FIXME: Block
+from src.blocks import Block, BlockTable # FIXME: Block
 from src.blocks.block_decomposer import Decomposer
+from src.msa.msa_context import MsaContext
 # ------
 
 import logging
@@ -28,8 +27,10 @@ class InputBlockSet:
     def __init__(self, standard_decomposition,
                  min_nrows_to_fix_block: Union[int, float] = 0, min_ncols_to_fix_block: Union[int,float] = 0,
                  nrows: Optional[int] = None, ncols: Optional[int] = None,
+                 decomposition_processes: int = 1,
                  ):
         self.standard_decomposition=standard_decomposition 
+        self.decomposition_processes=decomposition_processes # processes to decompose pairs of blocks
         logging.info(f">>>> InputBlockSet standard_decomposition={standard_decomposition}")
         
         # criteria to fix some maximal blocks
@@ -48,8 +49,10 @@ class InputBlockSet:
         self.min_nrows_to_fix_block=min_nrows_to_fix_block
         self.min_ncols_to_fix_block=min_ncols_to_fix_block
 
-    def __call__(self, path_msa: Union[str,Path], maximal_blocks: list[Block],
-                 start_column: int, end_column: int) -> list[Block]:
+    def __call__(self, msa: Union[str,Path,MsaContext], maximal_blocks: Union[list, BlockTable],
+                 start_column: int, end_column: int) -> tuple[BlockTable, BlockTable]:
+        """'msa' is the subMSA from start_column to end_column, or the path to the MSA.
+        Return the input set of the ILP and the missing blocks as BlockTables"""
         
         self.start_column = start_column
         self.end_column = end_column
@@ -57,9 +60,11 @@ class InputBlockSet:
         # parse maximal blocks as Block objects
         maximal_blocks = [Block(*b[:3]) for b in maximal_blocks]
         # load MSA
-        self.msa = self.load_submsa(path_msa, start_column, end_column)
-        n_seqs = len(self.msa) 
-        n_cols = self.msa.get_alignment_length()
+        if type(msa) in (str,Path):
+            msa = MsaContext.from_fasta(msa).submsa(start_column, end_column)
+        self.msa = msa
+        n_seqs = self.msa.nrows
+        n_cols = self.msa.ncols
         logging.info("subMSA loaded, nrows:(%s), ncols:(%s)" % (n_seqs, n_cols))
         
         # blocks not covered by maximal blocks
@@ -77,7 +82,8 @@ class InputBlockSet:
         decomposer = Decomposer(
                                 standard_decomposition=self.standard_decomposition,        #  if False, row maximal decomposition is used
                                 min_nrows_to_fix_block=self.min_nrows_to_fix_block,        #  minimum number of rows to fix a maximal block
-                                min_ncols_to_fix_block=self.min_ncols_to_fix_block         #  minimum number of columns to fix a maximal block
+                                min_ncols_to_fix_block=self.min_ncols_to_fix_block,        #  minimum number of columns to fix a maximal block
+                                n_processes=self.decomposition_processes,                  #  pool of processes to decompose pairs of blocks
                                 ) 
         decomposed_blocks, fixed_blocks = decomposer(
                                                     list_blocks=maximal_blocks,            # NOTE: decomposed_blocks contains the maximal blocks, check Decomposer.decomposition_from_inter_blocks()
@@ -108,14 +114,13 @@ class InputBlockSet:
 
         # Input set: input blocks:decomposition of blocks  of one position in the MSA)
         # to avoid having duplicated one_char blocks
-        decomposed_blocks=set(astuple(b) for b in decomposed_blocks)
+        decomposed_blocks=set(decomposed_blocks)
         for enum, block in enumerate(blocks_one_char):
             logging.debug(f"Block one-char #{enum}: {block}")
-            decomposed_blocks.add(astuple(block))
-        decomposed_blocks = [Block(*b) for b in decomposed_blocks]
-        input_set_ilp = decomposed_blocks
+            decomposed_blocks.add(block)
+        input_set_ilp = BlockTable.from_blocks(decomposed_blocks, msa=self.msa)
         
-        return input_set_ilp , missing_blocks
+        return input_set_ilp , BlockTable.from_blocks(missing_blocks, msa=self.msa)
     
     def glue_vertical_blocks(self,list_blocks,):
         "Glue blocks of length 1 that shares column"
@@ -126,7 +131,7 @@ class InputBlockSet:
             if block.len() == 1: # only one character blocks
                 # print(block, block.K[0], block.start)
                 # print(self.msa)
-                label = self.msa[int(block.K[0])].seq[int(block.start) - self.start_column]
+                label = self.msa.label(block.K[0], block.start, block.start)
                 blocks_by_start[(block.start, label)].extend(list(block.K))
             else: 
                 new_blocks.append(block)
@@ -138,64 +143,37 @@ class InputBlockSet:
         return new_blocks
 
     @staticmethod
-    def get_coverage_panel(n_seqs, n_cols, blocks, start_column): #FIXME: memory consuming?
+    def get_coverage_panel(n_seqs, n_cols, blocks, start_column):
         """returns a matrix of size equal to msa (n_seq x n_cols) with 
-        the number of blocks in the list_blocks that covers each position"""
-
-        coverage_panel = np.zeros((n_seqs, n_cols))
-        for block in blocks:
-            for r in block.K:
-                for c in range(block.start-start_column,block.end+1-start_column):
-                    coverage_panel[r,c] += 1
-        return coverage_panel
-
-    def get_missing_blocks(self, coverage_panel, msa, start_column): 
+        the number of blocks in the list_blocks that covers each position (uint16, saturated)"""
+        blocks = BlockTable.from_blocks(blocks)
+        # difference array by row: +1 at the start of each row of a block, -1 after its end
+        rows = blocks.rows.astype(np.int64)
+        block_of_row = np.repeat(np.arange(len(blocks)), blocks.nrows())
+        diff = np.zeros((n_seqs, n_cols + 1), dtype=np.int32)
+        np.add.at(diff, (rows, blocks.starts[block_of_row].astype(np.int64) - start_column), 1)
+        np.add.at(diff, (rows, blocks.ends[block_of_row].astype(np.int64) + 1 - start_column), -1)
+        # accumulated and saturated in place (int32), the default accumulator would be an int64 copy of the panel
+        coverage_panel = np.cumsum(diff, axis=1, out=diff)[:, :n_cols]
+        np.minimum(coverage_panel, np.iinfo(np.uint16).max, out=coverage_panel)
+        return coverage_panel.astype(np.uint16)
+
+    def get_missing_blocks(self, coverage_panel, msa, start_column) -> BlockTable: 
         """return the missing blocks to cover the MSA
         all consecutives one character not covered positions are
-        clustered in one block
+        clustered in one block (one row), sorted by row and start
         """
-        rows, cols=np.where(coverage_panel == 0)
-        missing_blocks = [(r,c+start_column) for r,c in zip(rows,cols)]
-
-        missing_blocks = sorted(missing_blocks, key= lambda d: (d[0],d[1]))
-        idx_missing_blocks_by_seq = defaultdict(list)
-        for row,col in missing_blocks: 
-            idx_missing_blocks_by_seq[row].append(col)
-
-        # now split each row into separate sublist of (row,col)
-        missing_blocks=[]
-        for row, cols in idx_missing_blocks_by_seq.items():
-            consecutive_pos = self.get_list_consecutive_pos(cols)
-            for pos in consecutive_pos: 
-                # start_submsa = pos[0] - start_column
-                # end_submsa = pos[-1] - start_column
-                # # label = str(msa[int(row)].seq[start_submsa:end_submsa+1])
-                missing_blocks.append(
-                    Block(K=(row,), start=pos[0],end=pos[-1])
-                )
-
-        return missing_blocks
-
-    @staticmethod
-    def get_list_consecutive_pos(positions: list[int]):
-        "given a list with positions, split it in sublists of consecutive numbers"
-        sublists = []
-
-        # Set up current list with first element of input
-        curr = [positions[0]]
-
-        # For each remaining element:
-        for x in positions[1:]:
-            # If the next element is not 1 greater than the last seen element
-            if x - 1 != curr[-1]:
-                # Append the list to the return variable and start a new list
-                sublists.append(curr)
-                curr = [x]
-            # Otherwise, append the element to the current list.
-            else:
-                curr.append(x)
-        sublists.append(curr)
-        return sublists
+        # runs of not covered positions in each row: +1 at their start, -1 after their end
+        not_covered = np.zeros((coverage_panel.shape[0], coverage_panel.shape[1] + 2), dtype=np.int8)
+        not_covered[:, 1:-1] = coverage_panel == 0
+        steps = np.diff(not_covered, axis=1)
+        rows, starts = np.nonzero(steps == 1)
+        _, ends = np.nonzero(steps == -1)
+        
+        return BlockTable(
+            rows=rows, offsets=np.arange(len(rows) + 1), 
+            starts=starts + start_column, ends=ends - 1 + start_column,
+        )
 
     def get_blocks_one_char(self, msa, start_column, ommit_blocks):
         """
@@ -214,16 +192,16 @@ class InputBlockSet:
         #     logging.info(f"Ommit-blocks (row,col) {row_col}")
 
         blocks_one_char = []
-        n_cols=msa.get_alignment_length()
+        n_cols=msa.ncols
         logging.info(f"number of columns MSA one-char blocks {n_cols}")
-        n_seqs=len(msa)
+        n_seqs=msa.nrows
 
         for col in range(n_cols):
             seq_by_char = defaultdict(list)
             for row in range(n_seqs):
                 
                 if (row,col+start_column) not in pos_ommit_blocks: 
-                    seq_by_char[msa[row,col]].append(row)
+                    seq_by_char[msa.cased_matrix[row,col]].append(row)
 
             for c, K in seq_by_char.items():
                 # ommit vertical blocks, they will be part of a maximal one
@@ -235,20 +213,3 @@ class InputBlockSet:
         logging.info(f"number of blocks one-char {n_blocks_one_char}")
         
         return blocks_one_char
-
-    @staticmethod
-    def load_submsa(filename, start_column=0, end_column=-1):
-        "Return 0-indexed MSA from start_column to end_column (both included)"
-        # load MSA
-        msa = AlignIO.read(filename, "fasta")
-        
-        # filter sub-MSA if start/end columns are given
-        if start_column>0 or end_column!=-1:
-            # get last column
-            n_cols = msa.get_alignment_length()
-            assert start_column < n_cols and end_column < n_cols, f"start_column={start_column}, end_column={end_column}. Must be < {n_cols} (number of columns in the MSA)"
-            if end_column == -1:
-                msa = msa[:, start_column:] # end_column included
-            else:
-                msa = msa[:, start_column:end_column+1] # end_column included
-        return msa
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+On-disk cache of input sets of subMSAs.
+
+The input set (and missing blocks) of a subMSA depends only on its content, the engine used to
+compute maximal blocks, the type of decomposition and the thresholds to fix blocks, not on the
+objective function. Runs with different objective functions, penalizations, etc. share the
+input sets through this cache.
+
+Each entry is a compressed .npz file named by a hash of the key, with the arrays of the BlockTables
+(rows of all blocks, offsets of the rows of each block, starts and ends) and columns relative to
+the first column of the subMSA (so identical subMSAs in different columns share the entry).
+Least recently used entries are removed when the total size of the cache exceeds its maximum.
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Union, Optional
+
+# ------
+# FIXME:  better way to import this?
+import sys
+PATH=Path(__file__).parent.parent.parent
+sys.path.append(str(PATH))
+
+from src.blocks import BlockTable
+# ------
+
+import logging
+
+VERSION = 1 # change it if the input set for the same key changes
+
+
+class InputSetCache:
+    """Save/load the input set and missing blocks of subMSAs in 'cache_dir', one <hash>.npz file per key.
+    The total size of the cache is kept under 'max_size' bytes, removing the least recently used files"""
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: int = 2 << 30):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+
+    def key(self, submsa, engine: str, standard_decomposition: bool,
+            min_nrows_to_fix_block, min_ncols_to_fix_block, haplotypes=None) -> str:
+        "hash of the content of the subMSA and the parameters used to compute its input set"
+        h = hashlib.blake2b(digest_size=16)
+        # packed bytes of the subMSA, nibbles outside its columns set to 0
+        window = np.ascontiguousarray(submsa.packed.window())
+        h.update(repr((VERSION, (submsa.nrows, submsa.ncols), engine, bool(standard_decomposition),
+                       min_nrows_to_fix_block, min_ncols_to_fix_block)).encode())
+        h.update(window.tobytes())
+        lower = submsa.packed.lowercase()
+        if lower is not None:
+            h.update(np.packbits(lower, axis=1).tobytes())
+        if haplotypes:
+            # rows representing several rows are added as maximal blocks
+            h.update(bytes(weight > 1 for weight in haplotypes.weights))
+        return h.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(f"{key}.npz")
+
+    def get(self, key: str, start_column: int) -> Optional[tuple[BlockTable, BlockTable]]:
+        "Return (input set, missing blocks) with columns starting at 'start_column', or None if not in the cache"
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+            # access time for the LRU eviction
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        inputset, missing_blocks = (
+            BlockTable(arrays[f"{name}_rows"], arrays[f"{name}_offsets"],
+                       arrays[f"{name}_starts"] + start_column, arrays[f"{name}_ends"] + start_column)
+            for name in ("inputset", "missing")
+        )
+        logging.info(f"input set loaded from cache {path}")
+        return inputset, missing_blocks
+
+    def put(self, key: str, start_column: int, inputset, missing_blocks):
+        "Save the input set and missing blocks (BlockTable or list of blocks) of a subMSA starting at 'start_column'"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for name, blocks in (("inputset", inputset), ("missing", missing_blocks)):
+            table = BlockTable.from_blocks(blocks)
+            arrays.update({
+                f"{name}_rows": table.rows, f"{name}_offsets": table.offsets,
+                f"{name}_starts": table.starts - start_column, f"{name}_ends": table.ends - start_column,
+            })
+
+        # written to a temporary file and renamed, so concurrent readers never see a partial file
+        path = self.path(key)
+        fd, path_tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.savez_compressed(fp, **arrays)
+            os.replace(path_tmp, path)
+        except BaseException:
+            os.remove(path_tmp)
+            raise
+        logging.info(f"input set saved in cache {path}")
+        self.evict()
+
+    def evict(self):
+        "Remove the least recently used entries until the total size is at most max_size"
+        entries = []
+        for path in self.cache_dir.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            logging.info(f"input set removed from cache {path}")
@@ -2,4 +2,9 @@ from .nodes import loss as loss_nodes
 from .strings import loss as loss_strings
 from .weighted import loss as loss_weighted
 from .depth import loss as loss_depth
-from .depth_and_len import loss as loss_depth_and_len
\ No newline at end of file
+from .depth_and_len import loss as loss_depth_and_len
+from .nodes import costs as costs_nodes
+from .strings import costs as costs_strings
+from .weighted import costs as costs_weighted
+from .depth import costs as costs_depth
+from .depth_and_len import costs as costs_depth_and_len
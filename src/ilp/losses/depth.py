@@ -1,14 +1,20 @@
 import gurobipy as gp
 from gurobipy import GRB
 
-def loss(model, vars, blocks, c_variables, penalization, min_coverage, n_seqs):
+def costs(blocks, penalization, min_coverage, n_seqs, weights=None):
+    "cost of each block in the objective function: blocks covering few sequences are penalized"
+    # 'weights' is the number of sequences represented by each row (collapsed haplotypes)
+    depth = (lambda K: sum(weights[r] for r in K)) if weights else len
 
     MIN_COVERAGE= min_coverage # penalize blocks covering less than MIN_COVERAGE % of the sequences
     PENALIZATION = penalization # costly than others
+    return [1 if depth(block.K)/n_seqs > MIN_COVERAGE  else PENALIZATION for block in blocks]
+
+def loss(model, vars, blocks, c_variables, penalization, min_coverage, n_seqs, weights=None):
     model.setObjective(
         gp.quicksum(
-            (1 if len(blocks[idx].K)/n_seqs > MIN_COVERAGE  else PENALIZATION)*vars[idx] 
-            for idx in c_variables
+            cost*vars[idx] 
+            for idx, cost in zip(c_variables, costs(blocks, penalization, min_coverage, n_seqs, weights))
         )
     )
     return model
\ No newline at end of file
@@ -1,12 +1,18 @@
 import gurobipy as gp
 from gurobipy import GRB
 
-def loss(model, vars, blocks, c_variables, start_column, msa):
+def costs(blocks, msa, weights=None):
+    "cost of each block in the objective function"
+    # 'weights' is the number of sequences represented by each row (collapsed haplotypes)
+    depth = (lambda K: sum(weights[r] for r in K)) if weights else len
     # Given a block l=(K,b,e), the cost is w(l) = f(l)/|K|, where f(l)= (b-e+1) - #indels
+    return [len(msa.label(block.K[0], block.start, block.end).replace("-","")) / depth(block.K) for block in blocks]
+
+def loss(model, vars, blocks, c_variables, msa, weights=None):
     model.setObjective(
         gp.quicksum(
-            len(msa[int(blocks[idx].K[0]), int(blocks[idx].start - start_column):int(blocks[idx].end + 1 - start_column)].seq.replace("-","")) / len(blocks[idx].K) *vars[idx] \
-            for idx in c_variables
+            cost *vars[idx] \
+            for idx, cost in zip(c_variables, costs(blocks, msa, weights))
         )
     )
     return model
\ No newline at end of file
@@ -6,14 +6,18 @@ logging.basicConfig(level=logging.DEBUG,
                     format='[Solve SubMSA] %(asctime)s.%(msecs)03d | %(message)s',
                     datefmt='%Y-%m-%d@%H:%M:%S')
 
-def loss(model, vars, blocks, c_variables, msa, start_column):
+def costs(blocks, msa):
+    "cost of each block in the objective function: length of its string (no indels)"
+    return [len(msa.label(block.K[0], block.start, block.end).replace("-","")) for block in blocks]
+
+def loss(model, vars, blocks, c_variables, msa):
     # for block in blocks: 
     #     logging.info(f"{block.str()}")
 
     model.setObjective(
         gp.quicksum(
-            len(msa[int(blocks[idx].K[0]), int(blocks[idx].start - start_column):int(blocks[idx].end + 1 - start_column)].seq.replace("-","")) * vars[idx]
-            for idx in c_variables
+            cost * vars[idx]
+            for idx, cost in zip(c_variables, costs(blocks, msa))
         ),
         GRB.MINIMIZE
     )
@@ -1,14 +1,20 @@
 import gurobipy as gp
 from gurobipy import GRB
 
-def loss(model, vars, blocks, c_variables, penalization, min_len, msa, start_column):
+def costs(blocks, penalization, min_len, msa):
+    "cost of each block in the objective function: shorter blocks are penalized"
     PENALIZATION = penalization
     MIN_LEN = min_len
-    
+    return [
+        PENALIZATION if len(msa.label(block.K[0], block.start, block.end).replace("-","")) <= MIN_LEN else 1
+        for block in blocks
+    ]
+
+def loss(model, vars, blocks, c_variables, penalization, min_len, msa):
     model.setObjective(
                 gp.quicksum(
-                    (PENALIZATION if len(msa[int(blocks[idx].K[0]), int(blocks[idx].start - start_column):int(blocks[idx].end + 1 - start_column)].seq.replace("-","")) <= MIN_LEN else 1)*vars[idx]
-                    for idx in c_variables
+                    cost*vars[idx]
+                    for idx, cost in zip(c_variables, costs(blocks, penalization, min_len, msa))
                 ),
                 GRB.MINIMIZE
     )
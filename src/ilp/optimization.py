@@ -6,9 +6,11 @@ import os
 import sys
 from sys import getsizeof, stderr
 from collections import defaultdict
-from blocks import Block
+import numpy as np
+from blocks import Block, BlockTable
 from pathlib import Path
-from Bio import AlignIO
+from typing import Optional
+from msa import MsaContext
 from gurobipy import GRB, LinExpr
 import gurobipy as gp
 from .losses import (
@@ -17,50 +19,25 @@ from .losses import (
     loss_weighted,
     loss_depth,
     loss_depth_and_len,
+    costs_nodes,
+    costs_strings,
+    costs_weighted,
+    costs_depth,
+    costs_depth_and_len,
 )
+from .pruning import prune_input_set
 
 import logging
 
 
-def load_submsa(filename, start_column=0, end_column=-1):
-    "Return 0-indexed MSA from start_column to end_column (both included)"
-    # load MSA
-    msa = AlignIO.read(filename, "fasta")
-    
-    # filter sub-MSA if start/end columns are given
-    if start_column>0 or end_column!=-1:
-        # get last column
-        n_cols = msa.get_alignment_length()
-        assert start_column < n_cols and end_column < n_cols, f"start_column={start_column}, end_column={end_column}. Must be < {n_cols} (number of columns in the MSA)"
-        if end_column == -1:
-            msa = msa[:, start_column:] # end_column included
-        else:
-            msa = msa[:, start_column:end_column+1] # end_column included
-    return msa
-
-# def load_submsa(filename, start_column=0, end_column=-1):
-#     "Return MSA from start_column to end_column (both included)"
-#     # load MSA
-#     msa = AlignIO.read(filename, "fasta")
-    
-#     # filter sub-MSA if start/end columns are given
-#     if start_column>0 or end_column!=-1:
-#         # get last column
-#         # n_seqs = len(align)
-#         n_cols = msa.get_alignment_length()
-#         assert start_column < n_cols and end_column < n_cols, f"start_column={start_column}, end_column={end_column}. Must be < {n_cols} (number of columns in the MSA)"
-#         msa = msa[:, start_column:end_column+1] # end_column included
-#     # logging.info(f"msa ({start_column}, {end_column}): {msa}")
-#     return msa
-
 class Optimization:
     "Generates/solves ILP model for a subMSA, from column start_column to end_column"
-    def __init__(self, blocks: list, path_msa: str, 
+    def __init__(self, blocks: BlockTable, msa: MsaContext, 
                  start_column: int, end_column: int,
-                 path_save_ilp: str, log_level=logging.INFO, **kwargs):
+                 path_save_ilp: str, log_level=logging.INFO,
+                 weights: Optional[list[int]] = None, **kwargs):
         
-        self.input_blocks=blocks
-        self.path_msa=path_msa
+        self.input_blocks=BlockTable.from_blocks(blocks)
         self.start_column=start_column
         self.end_column=end_column
         self.path_save_ilp = path_save_ilp
@@ -73,10 +50,12 @@ class Optimization:
         # K is a tuple of rows,
         # i and j are the first and last column
         # label is the string of the block
-        msa = load_submsa(path_msa, start_column=start_column, end_column=end_column)
+        # msa is the subMSA from start_column to end_column
         self.msa = msa
-        self.n_seqs = len(msa)
-        self.n_cols = msa.get_alignment_length()
+        self.n_seqs = msa.nrows
+        self.n_cols = msa.ncols
+        # number of sequences represented by each row, if identical rows were collapsed
+        self.weights = weights
         
         # ILP params       
         self.obj_function = kwargs.get("obj_function", "nodes")
@@ -85,6 +64,9 @@ class Optimization:
         self.min_coverage = kwargs.get("min_coverage", 1)
         self.time_limit = kwargs.get("time_limit", 360)
         self.threads_ilp = kwargs.get("threads_ilp", 4)
+        # remove blocks of the input set that are not in any optimal solution before building the model
+        self.prune_dominated = kwargs.get("prune_dominated", False)
+        self.n_pruned = 0
         
     def __call__(self, solve_ilp: bool = False):
         """Generates the ILP model, and solves it if return_model is False
@@ -94,8 +76,15 @@ class Optimization:
             solve_ilp (bool, optional): try to find ptimal solution if True, otherwise just save the ILP formulation. Defaults to False.
 
         Returns: 
-            list with blocks in the optimal solution
+            BlockTable with blocks in the optimal solution
         """        
+        if self.prune_dominated:
+            logging.info(f"pruning input set ({self.start_column},{self.end_column})")
+            keep = prune_input_set(self.input_blocks, self.costs())
+            self.n_pruned = len(self.input_blocks) - len(keep)
+            self.input_blocks = self.input_blocks.take(keep)
+            logging.info(f"Number of blocks removed by pruning {self.n_pruned} ({self.start_column},{self.end_column})")
+
         n_blocks = len(self.input_blocks)
         logging.info(f"Number of blocks ilp {n_blocks} ({self.start_column},{self.end_column})")
         for idx, block in enumerate(self.input_blocks):
@@ -117,8 +106,7 @@ class Optimization:
         n_cvars = len(c_variables)
         logging.info(f"Number of C variables {n_cvars} ({self.start_column},{self.end_column})")
         logging.info(f"MSA: {self.n_seqs} x {self.n_cols} ({self.start_column},{self.end_column})")
-        for idx in c_variables:
-            block = self.input_blocks[idx]
+        for idx, block in enumerate(self.input_blocks):
             logging.debug("block: %s / %s" % (idx, n_cvars))
             logging.debug("Adding %s %s %s" %
                           (block.start, block.end, block.K))
@@ -156,9 +144,9 @@ class Optimization:
         logging.info(f"added C variables to the model ({self.start_column},{self.end_column})")
         logging.info(f"Size bytes of C variables {sys.getsizeof(C)} ({self.start_column},{self.end_column})")        
 
-        for block in c_variables:
+        for idx, block in enumerate(self.input_blocks):
             logging.debug(
-                "variable:C(%s) = %s" % (block, self.input_blocks[block]))
+                "variable:C(%s) = %s" % (idx, block))
 
         # logging.info(f"adding U variables to the model ({self.start_column},{self.end_column})")
         # FIXME: exclude positions covered by missing blocks
@@ -209,26 +197,27 @@ class Optimization:
 
         elif self.obj_function == "strings":
             # # minimize the total length of the graph (number of characters)
-            model = loss_strings(model, vars=C, blocks=self.input_blocks, c_variables=c_variables, msa=self.msa, start_column=self.start_column)
+            model = loss_strings(model, vars=C, blocks=self.input_blocks, c_variables=c_variables, msa=self.msa)
 
         elif self.obj_function == "weighted":
             # # minimize the number of blocks penalizing shorter blocks
             model = loss_weighted(model, vars=C, blocks=self.input_blocks, c_variables=c_variables, 
-                                  penalization=self.penalization, min_len=self.min_len, msa=self.msa, start_column=self.start_column)
+                                  penalization=self.penalization, min_len=self.min_len, msa=self.msa)
             logging.info(f"penalization: {self.penalization}")
             logging.info(f"minimum length: {self.min_len}")
 
         elif self.obj_function == "depth":
             # # minimize the number blocks covering less than k sequences
             model = loss_depth(model, vars=C, blocks=self.input_blocks, c_variables=c_variables, 
-                                  penalization=self.penalization, min_coverage=self.min_coverage, n_seqs=self.n_seqs)
+                                  penalization=self.penalization, min_coverage=self.min_coverage, 
+                                  n_seqs=sum(self.weights) if self.weights else self.n_seqs, weights=self.weights)
             logging.info(f"penalization: {self.penalization}")
             logging.info(f"minimum coverage: {self.min_coverage}")
 
         elif self.obj_function == "depth_and_len":
             # # minimize the number of blocks with a weighted cost between node depth and len of the string (no indels) spelt by the block
             model = loss_depth_and_len(model, vars=C, blocks=self.input_blocks, c_variables=c_variables,
-                                       start_column=self.start_column, msa=self.msa)
+                                       msa=self.msa, weights=self.weights)
             
         logging.info(f"setted objective function ({self.start_column},{self.end_column})")
         #  ------------------------
@@ -245,12 +234,13 @@ class Optimization:
                 raise ("No solution")
 
             # filter optimal coverage of blocks for the MSA
-            optimal_coverage = []
+            selected = []
             for k, v in solution_C.items():
 
                 if v > 0:
                     logging.debug(f"Optimal Solution: {k}, {self.input_blocks[k]}")
-                    optimal_coverage.append(self.input_blocks[k])
+                    selected.append(k)
+            optimal_coverage = self.input_blocks.take(np.array(selected, dtype=np.int64))
             
         if self.path_save_ilp:
             logging.info("saving ILP model")
@@ -260,5 +250,19 @@ class Optimization:
         if solve_ilp:
             return optimal_coverage
         else:
-            return []
-        
\ No newline at end of file
+            return BlockTable.empty()
+        
+
+    def costs(self) -> list:
+        "cost of each block of the input set in the objective function"
+        if self.obj_function == "nodes":
+            return costs_nodes(self.input_blocks)
+        elif self.obj_function == "strings":
+            return costs_strings(self.input_blocks, msa=self.msa)
+        elif self.obj_function == "weighted":
+            return costs_weighted(self.input_blocks, penalization=self.penalization, min_len=self.min_len, msa=self.msa)
+        elif self.obj_function == "depth":
+            return costs_depth(self.input_blocks, penalization=self.penalization, min_coverage=self.min_coverage,
+                               n_seqs=sum(self.weights) if self.weights else self.n_seqs, weights=self.weights)
+        elif self.obj_function == "depth_and_len":
+            return costs_depth_and_len(self.input_blocks, msa=self.msa, weights=self.weights)
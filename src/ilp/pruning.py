@@ -0,0 +1,201 @@
+"""
+Pruning of the input set of the ILP, before building the model.
+
+The ILP selects blocks covering exactly once each position of the subMSA covered by at least one block.
+Blocks that are in no optimal solution are removed, so the pruned ILP has the same optimal solutions
+(and optimal value) as the original one:
+
+- forced blocks (any objective function): a position covered by only one block forces that block
+  in every solution, then any other block sharing a position with it is in no solution. Removing blocks
+  can force other blocks, this is repeated until no block is removed. Nothing is removed if the ILP
+  has no solution (two forced blocks share a position, or a position would be left without blocks).
+- dominated blocks (depends on the costs of the objective function): a block b is dominated if its positions
+  are exactly the ones of two other blocks, with the same rows and consecutive columns (b split by columns)
+  or with the same columns and disjoint rows (b split by rows), whose total cost is strictly lower than
+  the cost of b. Replacing b by both blocks in a solution gives another solution with a lower cost.
+"""
+import numpy as np
+from blocks import BlockTable
+from blocks.row_sets import row_words
+
+import logging
+
+CHUNK_SIZE = 1 << 20 # pairs of blocks tested at once by the dominance rules
+TOLERANCE = 1e-9 # relative, costs of a split must be lower than the cost of the block by more than this
+
+
+def _expand(first: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    "concatenation of the ranges [first, first + length)"
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(first - offsets, lengths) + np.arange(int(lengths.sum()))
+
+
+def _keys(*columns) -> np.ndarray:
+    "hash (uint64) of each position of the columns (arrays of the same length)"
+    h = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        x = np.asarray(column).astype(np.uint64)
+        x = (x ^ (x >> np.uint64(31))) * np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ x ^ (h >> np.uint64(29))) * np.uint64(0xBF58476D1CE4E5B9)
+    return h
+
+
+def forced_blocks(blocks: BlockTable) -> np.ndarray:
+    "mask of the blocks sharing a position with a block forced in every solution"
+    n_blocks = len(blocks)
+    removed = np.zeros(n_blocks, dtype=bool)
+    if n_blocks == 0:
+        return removed
+    first_column = int(blocks.starts.min())
+    n_rows, n_cols = int(blocks.rows.max()) + 1, int(blocks.ends.max()) - first_column + 1
+
+    # each block covers the columns [start, end] of each of its rows (entries),
+    # values by position are added with a difference array by row
+    entry_block = np.repeat(np.arange(n_blocks), blocks.nrows())
+    entry_start = blocks.rows.astype(np.int64) * (n_cols + 1) + (blocks.starts[entry_block] - first_column)
+    entry_end = entry_start + (blocks.ends[entry_block] - blocks.starts[entry_block]) + 1
+
+    def by_position(entries, weights):
+        "sum of the weights of the entries covering each position"
+        diff = np.bincount(entry_start[entries], weights, minlength=n_rows * (n_cols + 1))
+        diff -= np.bincount(entry_end[entries], weights, minlength=n_rows * (n_cols + 1))
+        return np.cumsum(diff.reshape(n_rows, n_cols + 1), axis=1).ravel()
+
+    def any_position(mask, entries):
+        "entries covering at least one position where 'mask' is True"
+        cumulative = np.concatenate(([0], np.cumsum(mask)))
+        return cumulative[entry_end[entries]] > cumulative[entry_start[entries]]
+
+    # number of blocks covering each position, and the sum of their ids: the block covering a position covered once
+    active = np.flatnonzero(np.ones(len(entry_block), dtype=bool))
+    coverage = np.rint(by_position(active, None)).astype(np.int64)
+    id_sum = np.rint(by_position(active, entry_block.astype(np.float64))).astype(np.int64)
+
+    forced = np.zeros(n_blocks, dtype=bool)
+    while True:
+        new_forced = np.unique(id_sum[coverage == 1])
+        new_forced = new_forced[~forced[new_forced]]
+        if len(new_forced) == 0:
+            break
+        forced[new_forced] = True
+
+        # blocks sharing a position with a forced block (two forced blocks sharing a position: no solution)
+        forced_coverage = by_position(active[forced[entry_block[active]]], None)
+        if forced_coverage.max() > 1.5:
+            return np.zeros(n_blocks, dtype=bool)
+        conflict = any_position(forced_coverage > 0.5, active) & ~forced[entry_block[active]]
+        removed[entry_block[active[conflict]]] = True
+
+        # positions of the removed blocks are not covered by them anymore
+        drop = active[removed[entry_block[active]]]
+        coverage -= np.rint(by_position(drop, None)).astype(np.int64)
+        id_sum -= np.rint(by_position(drop, entry_block[drop].astype(np.float64))).astype(np.int64)
+        if any_position(coverage == 0, drop).any():
+            return np.zeros(n_blocks, dtype=bool)
+        active = active[~removed[entry_block[active]]]
+
+    return removed
+
+
+def _dominated_by_splits(blocks: BlockTable, costs: np.ndarray, words: np.ndarray,
+                         block: np.ndarray, piece: np.ndarray, other_keys: np.ndarray, other_words: np.ndarray,
+                         other_starts: np.ndarray, other_ends: np.ndarray,
+                         sorted_keys: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """blocks 'block' split in 'piece' plus another block (given by its key, rows, start and end)
+    of the input set with a total cost strictly lower. Return the positions of the dominated blocks"""
+    found = np.searchsorted(sorted_keys, other_keys)
+    found = np.minimum(found, len(sorted_keys) - 1)
+    other = order[found]
+    # keys can collide, the other block must be exactly the one expected
+    exists = ((sorted_keys[found] == other_keys) & (blocks.starts[other] == other_starts) & (blocks.ends[other] == other_ends)
+              & (words[other] == other_words).all(axis=1))
+    cost_split = costs[piece] + costs[other]
+    cheaper = cost_split < costs[block] - TOLERANCE * np.maximum(1, np.abs(costs[block]))
+    return block[exists & cheaper]
+
+
+def dominated_blocks(blocks: BlockTable, costs: np.ndarray, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    "mask of the blocks with a split in two blocks of the input set with a lower cost"
+    n_blocks = len(blocks)
+    dominated = np.zeros(n_blocks, dtype=bool)
+    costs = np.asarray(costs, dtype=np.float64)
+    # a split costs at least twice the minimum cost
+    if n_blocks < 3 or 2 * costs.min() >= costs.max():
+        return dominated
+    words = row_words(blocks)
+    hashes = blocks.hashes() # the hash of the rows of a block is the sum of the hashes of its rows
+    starts, ends, nrows = blocks.starts.astype(np.int64), blocks.ends.astype(np.int64), blocks.nrows()
+    all_blocks = np.arange(n_blocks)
+
+    # blocks by (rows, start, end)
+    block_keys = _keys(hashes, starts, ends)
+    order = np.argsort(block_keys, kind="stable")
+    sorted_keys = block_keys[order]
+
+    # split by columns: b = (K,start,end) is (K,start,m) + (K,m+1,end), left pieces are found by (rows, start)
+    left_keys = _keys(hashes, starts)
+    left_order = np.argsort(left_keys, kind="stable")
+    sorted_left = left_keys[left_order]
+    first = np.searchsorted(sorted_left, left_keys, side="left")
+    lengths = np.searchsorted(sorted_left, left_keys, side="right") - first
+    # split by rows: b = (K,start,end) is (K1,start,end) + (K-K1,start,end), the piece K1 includes the first row of K,
+    # pieces are found by (row, start, end)
+    block_of_row = np.repeat(all_blocks, nrows)
+    row_keys = _keys(blocks.rows, starts[block_of_row], ends[block_of_row])
+    row_order = np.argsort(row_keys, kind="stable")
+    sorted_rows = row_keys[row_order]
+    first_row_keys = row_keys[blocks.offsets[:-1][nrows > 0]]
+    with_rows = all_blocks[nrows > 0]
+    row_first = np.searchsorted(sorted_rows, first_row_keys, side="left")
+    row_lengths = np.searchsorted(sorted_rows, first_row_keys, side="right") - row_first
+
+    for candidates, first, lengths, pieces_order, by_columns in [
+        (all_blocks, first, lengths, left_order, True),
+        (with_rows, row_first, row_lengths, block_of_row[row_order], False),
+        ]:
+        # pairs (block, piece), by chunks
+        cumulative = np.concatenate(([0], np.cumsum(lengths)))
+        start_block = 0
+        while start_block < len(candidates):
+            end_block = max(np.searchsorted(cumulative, cumulative[start_block] + chunk_size, side="right") - 1, start_block + 1)
+            block = np.repeat(candidates[start_block:end_block], lengths[start_block:end_block])
+            piece = pieces_order[_expand(first[start_block:end_block], lengths[start_block:end_block])]
+            start_block = end_block
+
+            if by_columns:
+                # same rows and start, the piece ends before the block
+                keep = (ends[piece] < ends[block]) & (costs[piece] < costs[block])
+                block, piece = block[keep], piece[keep]
+                keep = (words[piece] == words[block]).all(axis=1)
+                block, piece = block[keep], piece[keep]
+                other_words, other_starts, other_ends = words[block], ends[piece] + 1, ends[block]
+                other_hashes = hashes[block]
+            else:
+                # same columns, the rows of the piece are a proper subset of the rows of the block
+                keep = ((starts[piece] == starts[block]) & (ends[piece] == ends[block]) & (nrows[piece] < nrows[block])
+                        & (costs[piece] < costs[block]))
+                block, piece = block[keep], piece[keep]
+                keep = ((words[piece] & ~words[block]) == 0).all(axis=1)
+                block, piece = block[keep], piece[keep]
+                other_words, other_starts, other_ends = words[block] & ~words[piece], starts[block], ends[block]
+                other_hashes = hashes[block] - hashes[piece]
+
+            other_keys = _keys(other_hashes, other_starts, other_ends)
+            dominated[_dominated_by_splits(blocks, costs, words, block, piece, other_keys, other_words,
+                                           other_starts, other_ends, sorted_keys, order)] = True
+    return dominated
+
+
+def prune_input_set(blocks: BlockTable, costs: np.ndarray) -> np.ndarray:
+    """Positions of the blocks in the input set of the ILP that can be in an optimal solution,
+    given the cost of each block in the objective function"""
+    blocks = BlockTable.from_blocks(blocks)
+    costs = np.asarray(costs, dtype=np.float64)
+    removed = forced_blocks(blocks)
+    logging.info(f"Number of blocks removed by forced blocks {int(removed.sum())}")
+
+    # dominance among the remaining blocks
+    remaining = np.flatnonzero(~removed)
+    dominated = dominated_blocks(blocks.take(remaining), costs[remaining])
+    logging.info(f"Number of blocks removed by dominated blocks {int(dominated.sum())}")
+    return remaining[~dominated]
@@ -1,9 +1,10 @@
 """Parse solution of the ILP formulation as a variation graph"""
 
 from dataclasses import astuple 
-from Bio import AlignIO
 from collections import defaultdict, namedtuple
 from pathlib import Path
+from typing import Union
+from msa import MsaContext
 
 import logging
 logging.basicConfig(level=logging.INFO,
@@ -11,21 +12,23 @@ logging.basicConfig(level=logging.INFO,
                     datefmt='%Y-%m-%d@%H:%M:%S')
 class asGFA:
 
-    def __call__(self, optimal_coverage, path_gfa, path_msa, header="VN:Z:1.0"):
+    def __call__(self, optimal_coverage, path_gfa, msa: Union[str, Path, MsaContext], header="VN:Z:1.0"):
         
-        list_nodes, list_edges = self.create_graph(optimal_coverage, path_msa)
+        list_nodes, list_edges = self.create_graph(optimal_coverage, msa)
         list_nodes = sorted(list_nodes, key=lambda node: node[1]) # sort nodes by starting position
         self.parse(list_nodes, list_edges, path_gfa, header)
 
-    def create_graph(self, optimal_coverage, path_msa):
+    def create_graph(self, optimal_coverage, msa):
         list_nodes = []
         list_edges = []
 
-        self.msa, n_seqs, n_cols= self.load_msa(path_msa)
+        if type(msa) in (str, Path):
+            msa, n_seqs, n_cols = self.load_msa(msa)
+        self.msa = msa
         
         self.idx2seqid = dict()
-        for idx, record in enumerate(self.msa): 
-            self.idx2seqid[idx] = record.id 
+        for idx, seqid in enumerate(self.msa.ids): 
+            self.idx2seqid[idx] = seqid
 
         sorted_solution = sorted(optimal_coverage, key=lambda block: block.start )
         for pos1, block1 in enumerate(sorted_solution[:-1]):
@@ -50,7 +53,7 @@ class asGFA:
         logging.debug("Number of nodes: %s", len(list_nodes))
     
         list_nodes = [(node.K,node.i,node.j,
-                                str(self.msa[int(node.K[0]),int(node.i):int(node.j)+1].seq) ) for node in list_nodes]
+                                self.msa.label(node.K[0], node.i, node.j) ) for node in list_nodes]
         nodes = [ self.block_to_node(b) for b in optimal_coverage]
         list_nodes.extend(nodes)
         list_nodes = nodes
@@ -135,16 +138,16 @@ class asGFA:
     def load_msa(self, path_msa):
         "return alignment, number of sequences and columns"
         # load MSA
-        align = AlignIO.read(path_msa, "fasta")
-        n_cols = align.get_alignment_length()
-        n_seqs = len(align)
+        align = MsaContext.from_fasta(path_msa)
+        n_cols = align.ncols
+        n_seqs = align.nrows
 
         return align, n_seqs, n_cols
 
     
     def block_to_node(self, block):
         Node = namedtuple("Node",["K","i","j","label"])
-        return Node(block.K, block.start, block.end,self.msa[block.K[0],block.start:block.end+1].seq) 
+        return Node(block.K, block.start, block.end,self.msa.label(block.K[0], block.start, block.end)) 
     def nodes_edges_from_blocks(self, block1, block2):
         Node = namedtuple("Node",["K","i","j","label"]) # is a block
         Edge = namedtuple("Edge",["node1","node2","seqs"])
@@ -161,8 +164,8 @@ class asGFA:
         if b1.end == b2.start-1 and len(K)>0:
             logging.info("blocks are consecutives")
             logging.info(f"{b1}, {b2}")
-            b1_label = self.msa[b1.K[0]].seq[b1.start:b1.end+1]
-            b2_label = self.msa[b2.K[0]].seq[b2.start:b2.end+1]
+            b1_label = self.msa.label(b1.K[0], b1.start, b1.end)
+            b2_label = self.msa.label(b2.K[0], b2.start, b2.end)
 
             # print("Condicion- consecutive blocks")
             node1 = Node(b1.K, b1.start, b1.end, b1_label)
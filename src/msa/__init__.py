@@ -1 +1,5 @@
-from .analyzer_msa import AnalyzerMSA
\ No newline at end of file
+from .analyzer_msa import AnalyzerMSA
+from .msa_context import MsaContext
+from .fasta_index import FastaIndex
+from .packed_msa import PackedMsa
+from .haplotypes import Haplotypes
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+Encoding of the characters of the MSA as integers (one byte per cell)
+
+Codes are not case sensitive ('a' and 'A' have the same code), the case of the
+characters is kept apart as a mask of lowercase cells, so labels spell the input.
+"""
+import numpy as np
+from typing import Union, Optional
+
+# the first 6 characters match the alphabet used by wild-pBWT {"-":0,"A":1,"C":2,"G":3,"T":4,"N":5}
+# followed by IUPAC codes, 16 symbols in total
+ALPHABET = "-ACGTNRYSWKMBDHV"
+INVALID_CODE = 255
+
+# encode ASCII characters (not case sensitive) as integers in [0, len(ALPHABET))
+ENCODE = np.full(256, INVALID_CODE, dtype=np.uint8)
+for code, char in enumerate(ALPHABET):
+    ENCODE[ord(char)] = code
+    ENCODE[ord(char.lower())] = code
+
+# same encoding as a translation table for bytes.translate()
+TRANSLATION_TABLE = ENCODE.tobytes()
+
+# 1 for the lowercase characters of the alphabet, as a translation table for bytes.translate()
+LOWERCASE = np.zeros(256, dtype=np.uint8)
+for char in ALPHABET.lower():
+    if char.islower():
+        LOWERCASE[ord(char)] = 1
+LOWERCASE_TABLE = LOWERCASE.tobytes()
+
+# decode integers to ASCII characters, codes + len(ALPHABET) are decoded as lowercase characters
+DECODE = np.frombuffer((ALPHABET + ALPHABET.lower()).encode("ascii"), dtype=np.uint8)
+
+
+def encode_seq(seq: Union[str, bytes]) -> np.ndarray:
+    "Return a sequence as an array of encoded characters (the case is lost, see `lowercase_seq`)"
+    if isinstance(seq, str):
+        seq = seq.encode("ascii")
+    row = ENCODE[np.frombuffer(seq, dtype=np.uint8)]
+    if (row == INVALID_CODE).any():
+        char = chr(seq[int(np.argmax(row == INVALID_CODE))])
+        raise ValueError(f"character '{char}' is not in the alphabet {ALPHABET}")
+    return row
+
+
+def lowercase_seq(seq: Union[str, bytes]) -> np.ndarray:
+    "Return a boolean array, True for the lowercase characters of a sequence"
+    if isinstance(seq, str):
+        seq = seq.encode("ascii")
+    return LOWERCASE[np.frombuffer(seq, dtype=np.uint8)].astype(bool)
+
+
+def decode_seq(row: np.ndarray, lower: Optional[np.ndarray] = None) -> str:
+    "Return the string spelled by an array of encoded characters, 'lower' is the mask of lowercase characters"
+    if lower is not None:
+        row = row + lower.astype(np.uint8) * len(ALPHABET)
+    return DECODE[row].tobytes().decode("ascii")
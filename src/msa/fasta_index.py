@@ -0,0 +1,127 @@
+"""
+Random-access reader of columns of an aligned fasta file.
+
+Similar to a faidx index (.fai), for each sequence we store the byte offset of its first
+character and the width of its lines, so the byte range of any column can be computed directly.
+Only the bytes of the requested window [start_column, end_column] of each row are read (mmap),
+the rest of the file is never touched.
+"""
+import mmap
+import numpy as np
+from pathlib import Path
+from typing import Union, NamedTuple, Optional
+
+from .alphabet import ALPHABET, INVALID_CODE, TRANSLATION_TABLE, LOWERCASE_TABLE
+from .fasta_reader import WHITESPACES
+
+
+class FaidxRecord(NamedTuple):
+    "One line of a .fai file"
+    name: str
+    length: int     # number of characters of the sequence
+    offset: int     # byte offset of the first character of the sequence
+    linebases: int  # characters per line
+    linewidth: int  # bytes per line, including the end of line
+
+    def byte_offset(self, column: int) -> int:
+        "byte offset of a column of the sequence"
+        return self.offset + (column // self.linebases) * self.linewidth + column % self.linebases
+
+
+class FastaIndex:
+    "Index of an aligned fasta file, with the same content as a .fai file"
+
+    def __init__(self, path_msa: Union[str, Path], records: list[FaidxRecord]):
+        self.path_msa = path_msa
+        self.records = records
+        if not records:
+            raise ValueError(f"No records found in {path_msa}")
+        self.ncols = records[0].length
+        for record in records:
+            if record.length != self.ncols:
+                raise ValueError(f"Sequences must all be the same length, '{record.name}' has length {record.length} (expected {self.ncols})")
+
+    @property
+    def ids(self) -> list[str]:
+        return [record.name for record in self.records]
+
+    @property
+    def nrows(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_fasta(cls, path_msa: Union[str, Path]) -> "FastaIndex":
+        "Build the index with one pass over the fasta file. All lines of a sequence but the last must have the same width"
+        records = []
+
+        def add_record():
+            # all lines but the last one must have the same width
+            if any(width != widths[0] for width in widths[:-1]) or (len(widths) > 1 and bases[-1] > bases[0]):
+                raise ValueError(f"Different line length in sequence '{name}', it cannot be indexed")
+            linebases, linewidth = (bases[0], widths[0]) if bases else (0, 0)
+            records.append(FaidxRecord(name, sum(bases), offset, linebases, linewidth))
+
+        name = None
+        pos = 0
+        with open(path_msa, "rb") as fp:
+            for line in fp:
+                if line.startswith(b">"):
+                    if name is not None:
+                        add_record()
+                    header = line[1:].split(None, 1)
+                    name = header[0].decode() if header else ""
+                    offset, bases, widths = pos + len(line), [], []
+                else:
+                    nbases = len(line.rstrip(b"\r\n"))
+                    if nbases > 0:
+                        if name is None:
+                            raise ValueError(f"{path_msa} is not in fasta format, it must start with '>'")
+                        bases.append(nbases)
+                        widths.append(len(line))
+                pos += len(line)
+        if name is not None:
+            add_record()
+
+        return cls(path_msa, records)
+
+    @classmethod
+    def load(cls, path_msa: Union[str, Path], path_index: Union[str, Path]) -> "FastaIndex":
+        "Load the index from a .fai file"
+        with open(path_index) as fp:
+            records = [FaidxRecord(name, *map(int, fields))
+                       for name, *fields in (line.rstrip("\n").split("\t")[:5] for line in fp if line.strip())]
+        return cls(path_msa, records)
+
+    def save(self, path_index: Union[str, Path]):
+        "Save the index as a .fai file"
+        with open(path_index, "w") as fp:
+            for record in self.records:
+                fp.write("\t".join(map(str, record)) + "\n")
+
+    def read_window(self, start_column: int = 0, end_column: int = -1) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return the encoded columns from start_column to end_column (both included) of all the sequences,
+        and the boolean mask of lowercase cells (None if there are none)"""
+        if end_column == -1:
+            end_column = self.ncols - 1
+        assert 0 <= start_column <= end_column < self.ncols, f"start_column={start_column}, end_column={end_column}. Must be in [0,{self.ncols - 1}]"
+
+        ncols = end_column - start_column + 1
+        matrix = np.empty((self.nrows, ncols), dtype=np.uint8)
+        lower = None
+        with open(self.path_msa, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for row, record in enumerate(self.records):
+                window = mm[record.byte_offset(start_column):record.byte_offset(end_column) + 1].translate(None, WHITESPACES)
+                seq = window.translate(TRANSLATION_TABLE)
+                if len(seq) != ncols:
+                    raise ValueError(f"{self.path_msa} was modified after building the index")
+                if INVALID_CODE in seq:
+                    char = chr(window[seq.index(INVALID_CODE)])
+                    raise ValueError(f"character '{char}' in '{record.name}' is not in the alphabet {ALPHABET}")
+                matrix[row] = np.frombuffer(seq, dtype=np.uint8)
+                lower_row = window.translate(LOWERCASE_TABLE)
+                if 1 in lower_row:
+                    if lower is None:
+                        lower = np.zeros((self.nrows, ncols), dtype=bool)
+                    lower[row] = np.frombuffer(lower_row, dtype=bool)
+
+        return matrix, lower
@@ -0,0 +1,127 @@
+"""
+Streaming reader of aligned fasta files.
+
+Each row is encoded (one byte per character) into a buffer of the length of the alignment,
+and packed (4 bits per character) into a preallocated PackedMsa once the sequence is complete.
+Lowercase characters are kept in a bit mask, allocated only if there are any.
+No SeqRecord/Seq objects are created, peak memory is about half a byte per cell of the MSA.
+The file is read twice with a large buffer: the first pass counts the sequences and
+the length of the first one (to allocate the packed MSA), the second pass fills it.
+"""
+import numpy as np
+from pathlib import Path
+from typing import Union
+
+from .alphabet import ALPHABET, INVALID_CODE, TRANSLATION_TABLE, LOWERCASE_TABLE
+from .packed_msa import PackedMsa, pack, pack_lower
+
+BUFFER_SIZE = 1 << 24  # bytes read at once from the fasta file
+WHITESPACES = b" \t\r\n"
+
+
+def msa_shape(path_msa: Union[str, Path]) -> tuple[int, int]:
+    "Return number of sequences and number of columns (length of the first sequence) of an aligned fasta file"
+    nrows, ncols = 0, 0
+    with open(path_msa, "rb", buffering=BUFFER_SIZE) as fp:
+        # length of the first sequence
+        for line in fp:
+            if line.startswith(b">"):
+                nrows += 1
+                if nrows > 1:
+                    break
+            elif nrows == 1:
+                ncols += len(line.translate(None, WHITESPACES))
+
+        # count the rest of the headers in chunks
+        last_char = b"\n"
+        for chunk in iter(lambda: fp.read(BUFFER_SIZE), b""):
+            nrows += chunk.count(b"\n>") + (last_char == b"\n" and chunk.startswith(b">"))
+            last_char = chunk[-1:]
+
+    return nrows, ncols
+
+
+class _PackedWriter:
+    "Fill the rows of the packed MSA with the sequences of the fasta file, given as blocks of complete lines"
+
+    def __init__(self, path_msa: Union[str, Path], nrows: int, ncols: int):
+        self.path_msa = path_msa
+        self.ncols = ncols
+        self.packed = np.empty((nrows, (ncols + 1) // 2), dtype=np.uint8)
+        self.seq = np.empty((1, ncols), dtype=np.uint8)  # encoded characters of the current row
+        self.seq_lower = np.zeros((1, ncols), dtype=bool)  # lowercase characters of the current row
+        self.has_lower = False                             # the current row has lowercase characters
+        self.lower = None                                  # bit mask of lowercase cells, allocated for the first one
+        self.ids = []
+        self.row, self.col = -1, ncols
+
+    def end_row(self):
+        "the previous sequence must fill all the columns, then it is packed"
+        if self.row < 0:
+            return
+        if self.col != self.ncols:
+            raise ValueError(f"Sequences must all be the same length, '{self.ids[self.row]}' has length {self.col} (expected {self.ncols})")
+        self.packed[self.row] = pack(self.seq)[0]
+        if self.has_lower:
+            if self.lower is None:
+                self.lower = np.zeros((len(self.packed), (self.ncols + 7) // 8), dtype=np.uint8)
+            self.lower[self.row] = pack_lower(self.seq_lower)[0]
+            self.seq_lower[:] = False
+            self.has_lower = False
+
+    def __call__(self, lines: bytes):
+        pos, n = 0, len(lines)
+        while pos < n:
+            if lines[pos] == ord(">"):
+                # new sequence
+                self.end_row()
+                end = lines.find(b"\n", pos)
+                end = n if end == -1 else end
+                header = lines[pos + 1:end].split(None, 1)
+                self.ids.append(header[0].decode() if header else "")
+                self.row, self.col = self.row + 1, 0
+                pos = end + 1
+                continue
+
+            # all the lines of the current sequence until the next header, at once
+            end = lines.find(b"\n>", pos)
+            end = n if end == -1 else end + 1
+            chars = lines[pos:end].translate(None, WHITESPACES)
+            seq = chars.translate(TRANSLATION_TABLE)
+            if seq:
+                if self.row < 0:
+                    raise ValueError(f"{self.path_msa} is not in fasta format, it must start with '>'")
+                if self.col + len(seq) > self.ncols:
+                    raise ValueError(f"Sequences must all be the same length, '{self.ids[self.row]}' is longer than {self.ncols}")
+                if INVALID_CODE in seq:
+                    char = chr(chars[seq.index(INVALID_CODE)])
+                    raise ValueError(f"character '{char}' in '{self.ids[self.row]}' is not in the alphabet {ALPHABET}")
+                self.seq[0, self.col:self.col + len(seq)] = np.frombuffer(seq, dtype=np.uint8)
+                lower = chars.translate(LOWERCASE_TABLE)
+                if 1 in lower:
+                    self.seq_lower[0, self.col:self.col + len(seq)] = np.frombuffer(lower, dtype=bool)
+                    self.has_lower = True
+                self.col += len(seq)
+            pos = end
+
+
+def read_fasta_packed(path_msa: Union[str, Path]) -> tuple[PackedMsa, list[str]]:
+    """Return the MSA packed with 4 bits per character and the ids of the rows.
+    Raise ValueError if the sequences do not have the same length or contain characters not in the alphabet"""
+    nrows, ncols = msa_shape(path_msa)
+    if nrows == 0:
+        raise ValueError(f"No records found in {path_msa}")
+
+    writer = _PackedWriter(path_msa, nrows, ncols)
+    with open(path_msa, "rb") as fp:
+        # only complete lines are parsed, the last (partial) line of a chunk is kept for the next one
+        remainder = b""
+        for chunk in iter(lambda: fp.read(BUFFER_SIZE), b""):
+            lines = remainder + chunk
+            end = lines.rfind(b"\n") + 1
+            writer(lines[:end])
+            remainder = lines[end:]
+        writer(remainder)
+    writer.end_row()
+
+    return PackedMsa(writer.packed, ncols, lower=writer.lower), writer.ids
@@ -0,0 +1,39 @@
+"""
+Collapse identical rows (haplotypes) of a (sub)MSA into one representative row.
+
+The collapsed MSA keeps the first occurrence of each distinct row, and the multiplicity
+of each representative is used as its weight, so losses depending on the number of
+sequences covered by a block (depth, depth_and_len) are computed as in the full MSA.
+Rows of blocks are expanded back to the original rows with `expand`.
+"""
+from itertools import chain
+from .msa_context import MsaContext
+
+
+class Haplotypes:
+    "Distinct rows of a (sub)MSA, identical rows are represented by their first occurrence"
+
+    def __init__(self, msa: MsaContext):
+        self.nrows = msa.nrows
+        # identical rows are found on the packed MSA
+        representatives, haplotype_of_row = msa.packed.unique_rows()
+
+        # original rows represented by each row of the collapsed MSA
+        self.rows = [[] for _ in representatives]
+        for row, hap in enumerate(haplotype_of_row.tolist()):
+            self.rows[hap].append(row)
+        self.weights = [len(rows) for rows in self.rows]
+
+        self.msa = msa.take(representatives)
+
+    def __len__(self) -> int:
+        "number of distinct rows"
+        return len(self.rows)
+
+    def weight(self, K) -> int:
+        "number of rows of the original MSA represented by the rows K of the collapsed MSA"
+        return sum(self.weights[r] for r in K)
+
+    def expand(self, K) -> list[int]:
+        "rows of the original MSA represented by the rows K of the collapsed MSA"
+        return sorted(chain.from_iterable(self.rows[r] for r in K))
@@ -0,0 +1,132 @@
+"""
+On-disk cache of encoded MSAs.
+
+The first time an MSA is loaded, the packed MSA (4 bits per character) is saved as a .npy file in the cache directory,
+together with a json file with the row ids, the size of the matrix and a hash of the content of the fasta file.
+Afterwards, the packed MSA is memory-mapped (read-only), so all stages of the pipeline (and all processes)
+share the same pages instead of parsing the fasta file again.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Union
+
+from .packed_msa import PackedMsa
+
+import logging
+
+CHUNK_SIZE = 1 << 24  # bytes read at once to compute the hash of the MSA
+FORMAT = "packed-4bit-lowercase"  # entries written with another format are ignored (and replaced)
+
+
+def hash_msa(path_msa: Union[str, Path], alphabet: str) -> str:
+    "hash of the content of the fasta file and the alphabet used to encode it"
+    h = hashlib.blake2b(digest_size=16)
+    h.update(alphabet.encode("ascii"))
+    with open(path_msa, "rb") as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(path: Path, write, mode: str = "wb"):
+    "write to a temporary file and rename it, so concurrent readers never see a partial file"
+    fd, path_tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, mode) as fp:
+            write(fp)
+        os.replace(path_tmp, path)
+    except BaseException:
+        os.remove(path_tmp)
+        raise
+
+
+class MsaCache:
+    """Save/load packed MSAs in 'cache_dir'
+    - <name>.json: source path, stat and hash of the fasta file, alphabet, format, nrows, ncols and ids of the rows
+    - <name>-<hash>.npy: packed MSA (nrows x ceil(ncols/2)) of uint8
+    - <name>-<hash>.lower.npy: bit mask of lowercase cells (nrows x ceil(ncols/8)) of uint8, only if there are any
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], alphabet: str):
+        self.cache_dir = Path(cache_dir)
+        self.alphabet = alphabet
+
+    def path_meta(self, path_msa: Union[str, Path]) -> Path:
+        return self.cache_dir.joinpath(Path(path_msa).name + ".json")
+
+    def path_matrix(self, path_msa: Union[str, Path], digest: str) -> Path:
+        return self.cache_dir.joinpath(f"{Path(path_msa).name}-{digest}.npy")
+
+    def path_lower(self, path_msa: Union[str, Path], digest: str) -> Path:
+        return self.cache_dir.joinpath(f"{Path(path_msa).name}-{digest}.lower.npy")
+
+    def get(self, path_msa: Union[str, Path]):
+        """Return (packed, ids) of the cached MSA, the packed bytes are memory-mapped.
+        Returns None if the MSA is not in the cache or the fasta file has changed"""
+        path_meta = self.path_meta(path_msa)
+        if not path_meta.is_file():
+            return None
+
+        with open(path_meta) as fp:
+            meta = json.load(fp)
+
+        if meta["alphabet"] != self.alphabet or meta.get("format") != FORMAT:
+            return None
+
+        # the hash is recomputed only if the fasta file was modified since the cache was written
+        stat = os.stat(path_msa)
+        if (meta["size"], meta["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            if stat.st_size != meta["size"] or hash_msa(path_msa, self.alphabet) != meta["hash"]:
+                return None
+            meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            _atomic_write(path_meta, lambda fp: json.dump(meta, fp), mode="w")
+
+        path_matrix = self.path_matrix(path_msa, meta["hash"])
+        if not path_matrix.is_file():
+            return None
+        packed = np.load(path_matrix, mmap_mode="r")
+        assert packed.shape == (meta["nrows"], (meta["ncols"] + 1) // 2), f"cached MSA {path_matrix} is corrupted"
+        lower = None
+        if meta["lowercase"]:
+            path_lower = self.path_lower(path_msa, meta["hash"])
+            if not path_lower.is_file():
+                return None
+            lower = np.load(path_lower, mmap_mode="r")
+            assert lower.shape == (meta["nrows"], (meta["ncols"] + 7) // 8), f"cached MSA {path_lower} is corrupted"
+        logging.info(f"MSA loaded from cache {path_matrix}")
+
+        return PackedMsa(packed, meta["ncols"], lower=lower), meta["ids"]
+
+    def put(self, path_msa: Union[str, Path], packed: PackedMsa, ids: list[str]):
+        "Save the packed MSA (all its columns, from the first byte) in the cache"
+        assert packed.first == 0 and packed.packed.shape[1] == (packed.ncols + 1) // 2, "only a full packed MSA can be cached"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        stat = os.stat(path_msa)
+        digest = hash_msa(path_msa, self.alphabet)
+        path_matrix = self.path_matrix(path_msa, digest)
+        _atomic_write(path_matrix, lambda fp: np.save(fp, packed.packed))
+        if packed.lower is not None:
+            _atomic_write(self.path_lower(path_msa, digest), lambda fp: np.save(fp, packed.lower))
+
+        meta = dict(
+            path=str(Path(path_msa).resolve()), size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+            hash=digest, alphabet=self.alphabet, format=FORMAT, nrows=packed.nrows, ncols=packed.ncols,
+            lowercase=packed.lower is not None, ids=ids,
+        )
+        # json is written last, the matrix is visible only when it is complete
+        path_meta = self.path_meta(path_msa)
+        old_digest = None
+        if path_meta.is_file():
+            with open(path_meta) as fp:
+                old_digest = json.load(fp).get("hash")
+        _atomic_write(path_meta, lambda fp: json.dump(meta, fp), mode="w")
+        logging.info(f"MSA saved in cache {path_matrix}")
+
+        # remove the matrix of a previous version of the MSA
+        if old_digest and old_digest != digest:
+            self.path_matrix(path_msa, old_digest).unlink(missing_ok=True)
+            self.path_lower(path_msa, old_digest).unlink(missing_ok=True)
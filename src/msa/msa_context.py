@@ -0,0 +1,123 @@
+"""
+MSA loaded once in memory, packed with 4 bits per cell (see PackedMsa).
+
+A subMSA is a view over a range of columns of the same packed bytes (no copies),
+columns are always referred w.r.t. the full MSA, so blocks can be used
+directly to get labels from any subMSA.
+"""
+import numpy as np
+from functools import cached_property
+from pathlib import Path
+from typing import Union, Optional
+from .alphabet import ALPHABET
+from .fasta_reader import read_fasta_packed
+from .packed_msa import PackedMsa
+from .fasta_index import FastaIndex
+from .msa_cache import MsaCache
+
+
+class MsaContext:
+    """MSA as a (n_seqs x n_cols) packed matrix of encoded characters (and mask of lowercase cells) plus the ids of the rows.
+    'start_column' is the position of the first column of the matrix w.r.t. the full MSA
+    """
+
+    def __init__(self, packed: PackedMsa, ids: list[str], start_column: int = 0):
+        self.packed = packed
+        self.ids = ids
+        self.start_column = start_column
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, ids: list[str], start_column: int = 0,
+                    lower: Optional[np.ndarray] = None) -> "MsaContext":
+        "MSA from a (n_seqs x n_cols) matrix of encoded characters and boolean mask of lowercase cells, both are packed"
+        return cls(PackedMsa.from_matrix(matrix, lower), ids, start_column)
+
+    @classmethod
+    def from_fasta(cls, path_msa: Union[str, Path]) -> "MsaContext":
+        "Load an MSA in fasta format"
+        packed, ids = read_fasta_packed(path_msa)
+        return cls(packed, ids)
+
+    @classmethod
+    def from_fasta_window(cls, path_msa: Union[str, Path], start_column: int = 0, end_column: int = -1,
+                          index: Optional[FastaIndex] = None) -> "MsaContext":
+        """Load only the columns from start_column to end_column (both included) of an MSA in fasta format.
+        The index of the fasta file is built if not provided"""
+        if index is None:
+            index = FastaIndex.from_fasta(path_msa)
+        matrix, lower = index.read_window(start_column, end_column)
+        return cls.from_matrix(matrix, index.ids, start_column=start_column, lower=lower)
+
+    @classmethod
+    def load(cls, path_msa: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None) -> "MsaContext":
+        """Load an MSA in fasta format. If 'cache_dir' is given, the packed MSA is saved there
+        the first time, and memory-mapped (read-only) the next times"""
+        if cache_dir is None:
+            return cls.from_fasta(path_msa)
+
+        cache = MsaCache(cache_dir, alphabet=ALPHABET)
+        cached = cache.get(path_msa)
+        if cached is not None:
+            return cls(*cached)
+
+        msa = cls.from_fasta(path_msa)
+        cache.put(path_msa, msa.packed, msa.ids)
+        return msa
+
+    @property
+    def nrows(self) -> int:
+        return self.packed.nrows
+
+    @property
+    def ncols(self) -> int:
+        return self.packed.ncols
+
+    @cached_property
+    def matrix(self) -> np.ndarray:
+        """(n_seqs x n_cols) matrix of encoded characters (one byte per cell, not case sensitive),
+        unpacked the first time it is used. Meant for subMSAs, use `cols` to read a window of a large MSA"""
+        return self.packed.cols()
+
+    @cached_property
+    def cased_matrix(self) -> np.ndarray:
+        """Same as `matrix`, with len(ALPHABET) added to the lowercase characters,
+        for the steps that tell 'a' from 'A' (as the characters of the input do)"""
+        return self.packed.cased_cols()
+
+    @property
+    def end_column(self) -> int:
+        "last column (included) w.r.t. the full MSA"
+        return self.start_column + self.ncols - 1
+
+    def __len__(self) -> int:
+        return self.nrows
+
+    def get_alignment_length(self) -> int:
+        return self.ncols
+
+    def submsa(self, start_column: int = 0, end_column: int = -1) -> "MsaContext":
+        "Return a view of the MSA from start_column to end_column (both included, w.r.t. the full MSA)"
+        if end_column == -1:
+            end_column = self.end_column
+        assert self.start_column <= start_column <= end_column <= self.end_column, f"start_column={start_column}, end_column={end_column}. Must be in [{self.start_column},{self.end_column}]"
+        return MsaContext(
+            packed=self.packed.view(start_column - self.start_column, end_column - self.start_column),
+            ids=self.ids,
+            start_column=start_column,
+        )
+
+    def take(self, rows: np.ndarray) -> "MsaContext":
+        "Return a copy of the (sub)MSA with only the given rows"
+        return MsaContext(self.packed.take(rows), [self.ids[row] for row in rows.tolist()], self.start_column)
+
+    def cols(self, start: int, end: int) -> np.ndarray:
+        "Return the encoded characters from column start to end (both included, w.r.t. the full MSA)"
+        return self.packed.cols(int(start) - self.start_column, int(end) - self.start_column)
+
+    def label(self, row: int, start: int, end: int) -> str:
+        "Return the string spelled by 'row' from column start to end (both included, w.r.t. the full MSA), with its case"
+        return self.packed.label(row, int(start) - self.start_column, int(end) - self.start_column)
+
+    def seq(self, row: int) -> str:
+        "Return the string of 'row' in the (sub)MSA"
+        return self.packed.label(row, 0, self.ncols - 1)
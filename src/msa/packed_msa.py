@@ -0,0 +1,183 @@
+"""
+MSA packed with 4 bits per cell (two columns per byte).
+
+The alphabet has 16 symbols, so each encoded character fits in a nibble:
+column 2i is stored in the high nibble and column 2i+1 in the low nibble of byte i.
+Codes are not case sensitive, lowercase cells are kept in a bit mask (8 columns per byte),
+which is not stored at all if the MSA has no lowercase characters.
+This is the storage of MsaContext: the MSA is packed once, subMSAs are views over
+the same bytes, and column and row operations work directly on the packed bytes.
+"""
+import numpy as np
+from typing import Optional
+from .alphabet import ALPHABET, decode_seq
+
+CHUNK_SIZE = 1 << 16  # number of packed bytes (of each row) processed at once
+
+
+def pack(matrix: np.ndarray) -> np.ndarray:
+    "Pack a (nrows x ncols) matrix of encoded characters into a (nrows x ceil(ncols/2)) matrix of bytes"
+    nrows, ncols = matrix.shape
+    packed = np.empty((nrows, (ncols + 1) // 2), dtype=np.uint8)
+    # by chunks of columns, so a memory-mapped matrix is never loaded entirely
+    for start in range(0, ncols, 2 * CHUNK_SIZE):
+        chunk = np.asarray(matrix[:, start:start + 2 * CHUNK_SIZE], dtype=np.uint8)
+        high = chunk[:, 0::2]
+        low = np.zeros_like(high)
+        low[:, :chunk.shape[1] // 2] = chunk[:, 1::2]
+        packed[:, start // 2:start // 2 + high.shape[1]] = (high << 4) | low
+    return packed
+
+
+def unpack(packed: np.ndarray, ncols: int) -> np.ndarray:
+    "Unpack a matrix of bytes into the (nrows x ncols) matrix of encoded characters"
+    matrix = np.empty((packed.shape[0], 2 * packed.shape[1]), dtype=np.uint8)
+    matrix[:, 0::2] = packed >> 4
+    matrix[:, 1::2] = packed & 0x0F
+    return matrix[:, :ncols]
+
+
+def pack_lower(lower: np.ndarray, first: int = 0) -> Optional[np.ndarray]:
+    """Pack a (nrows x ncols) boolean mask of lowercase cells with 8 columns per byte, starting at bit 'first'.
+    None if there are no lowercase cells"""
+    if not lower.any():
+        return None
+    return np.packbits(np.pad(lower, ((0, 0), (first, 0))), axis=1)
+
+
+def _mask_edges(window: np.ndarray, start: int, end: int) -> np.ndarray:
+    "set to 0 (inplace) the nibbles of the first and last bytes of the window outside columns [start, end]"
+    if start % 2 == 1:
+        window[:, 0] &= 0x0F
+    if end % 2 == 0:
+        window[:, -1] &= 0xF0
+    return window
+
+
+class PackedMsa:
+    """MSA as a matrix of packed characters, with 'ncols' columns starting at column 'first' of the packed bytes.
+    'lower' is the bit mask of lowercase cells (same columns as the packed bytes), None if there are none.
+    Columns of all methods are relative to the packed MSA (from 0 to ncols-1), views over a range
+    of columns (`view`) share the packed bytes"""
+
+    def __init__(self, packed: np.ndarray, ncols: int, first: int = 0, lower: Optional[np.ndarray] = None):
+        self.packed = packed
+        self.ncols = ncols
+        self.first = first
+        self.lower = lower
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, lower: Optional[np.ndarray] = None) -> "PackedMsa":
+        "Pack a (nrows x ncols) matrix of encoded characters and its (optional) boolean mask of lowercase cells"
+        return cls(pack(matrix), matrix.shape[1], lower=None if lower is None else pack_lower(lower))
+
+    @property
+    def nrows(self) -> int:
+        return self.packed.shape[0]
+
+    def __len__(self) -> int:
+        return self.nrows
+
+    def _range(self, start: Optional[int], end: Optional[int]) -> tuple[int, int]:
+        "columns [start, end] relative to the packed bytes"
+        start = 0 if start is None else start
+        end = self.ncols - 1 if end is None or end == -1 else end
+        assert 0 <= start <= end < self.ncols, f"start={start}, end={end}. Must be in [0,{self.ncols - 1}]"
+        return start + self.first, end + self.first
+
+    def view(self, start: int, end: int) -> "PackedMsa":
+        "Columns [start, end] (both included) sharing the packed bytes"
+        start, end = self._range(start, end)
+        return PackedMsa(self.packed, end - start + 1, start, self.lower)
+
+    def take(self, rows: np.ndarray) -> "PackedMsa":
+        "Copy of the given rows"
+        start, end = self._range(None, None)
+        lower = self.lowercase()
+        return PackedMsa(
+            self.packed[rows, start // 2:end // 2 + 1], self.ncols, start % 2,
+            None if lower is None else pack_lower(lower[rows], start % 2),
+        )
+
+    def window(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Packed bytes covering columns [start, end] (both included), nibbles of columns
+        outside the window are set to 0, so two rows are equal in the window iff their bytes are equal"""
+        start, end = self._range(start, end)
+        return _mask_edges(self.packed[:, start // 2:end // 2 + 1].copy(), start, end)
+
+    def cols(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        "Encoded characters (unpacked) from column start to end (both included)"
+        start, end = self._range(start, end)
+        window = unpack(self.packed[:, start // 2:end // 2 + 1], 2 * (end // 2 + 1 - start // 2))
+        return window[:, start % 2:start % 2 + end - start + 1]
+
+    def lowercase(self, start: Optional[int] = None, end: Optional[int] = None, rows=slice(None)) -> Optional[np.ndarray]:
+        "Boolean mask of the lowercase cells of 'rows' from column start to end (both included), None if there are none"
+        if self.lower is None:
+            return None
+        start, end = self._range(start, end)
+        bits = np.unpackbits(self.lower[rows, start // 8:end // 8 + 1], axis=-1)
+        return bits[..., start % 8:start % 8 + end - start + 1].astype(bool)
+
+    def cased_cols(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        "Encoded characters from column start to end (both included), plus len(ALPHABET) for lowercase ones, so 'a' and 'A' differ"
+        cols = self.cols(start, end)
+        lower = self.lowercase(start, end)
+        return cols if lower is None else cols + lower.astype(np.uint8) * len(ALPHABET)
+
+    def label(self, row: int, start: int, end: int) -> str:
+        "Return the string spelled by 'row' from column start to end (both included)"
+        lower = self.lowercase(start, end, rows=int(row))
+        start, end = self._range(start, end)
+        row_bytes = self.packed[int(row):int(row) + 1, start // 2:end // 2 + 1]
+        chars = unpack(row_bytes, 2 * row_bytes.shape[1])[0]
+        return decode_seq(chars[start % 2:start % 2 + end - start + 1], lower)
+
+    def unique_columns(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        "Boolean array, True for the columns in [start, end] with the same character (and case) in all the rows"
+        start, end = self._range(start, end)
+        first_byte, last_byte = start // 2, end // 2
+        unique = np.empty(2 * (last_byte - first_byte + 1), dtype=bool)
+        for chunk_start in range(first_byte, last_byte + 1, CHUNK_SIZE):
+            chunk = self.packed[:, chunk_start:min(chunk_start + CHUNK_SIZE, last_byte + 1)]
+            # bits set where a row differs from the first one
+            diff = np.bitwise_or.reduce(chunk ^ chunk[0], axis=0)
+            offset = 2 * (chunk_start - first_byte)
+            unique[offset:offset + 2 * len(diff):2] = (diff & 0xF0) == 0
+            unique[offset + 1:offset + 2 * len(diff):2] = (diff & 0x0F) == 0
+        unique = unique[start % 2:start % 2 + end - start + 1]
+
+        if self.lower is not None:
+            # same with the bits of the lowercase mask
+            first_byte, last_byte = start // 8, end // 8
+            same_case = np.empty(8 * (last_byte - first_byte + 1), dtype=bool)
+            for chunk_start in range(first_byte, last_byte + 1, CHUNK_SIZE):
+                chunk = self.lower[:, chunk_start:min(chunk_start + CHUNK_SIZE, last_byte + 1)]
+                diff = np.bitwise_or.reduce(chunk ^ chunk[0], axis=0)
+                offset = 8 * (chunk_start - first_byte)
+                same_case[offset:offset + 8 * len(diff)] = np.unpackbits(diff) == 0
+            unique &= same_case[start % 8:start % 8 + end - start + 1]
+        return unique
+
+    def unique_rows(self, start: Optional[int] = None, end: Optional[int] = None):
+        """Group identical rows (same characters and case) in columns [start, end].
+        Return the first row of each group (sorted) and, for each row, the index of its group"""
+        window = self.window(start, end)
+        lower = self.lowercase(start, end)
+        if lower is not None:
+            window = np.hstack((window, np.packbits(lower, axis=1)))
+        _, first_rows, inverse = np.unique(window, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        # groups sorted by their first row
+        order = np.argsort(first_rows, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return first_rows[order], rank[inverse]
+
+    def rows_equal(self, row1: int, row2: int, start: Optional[int] = None, end: Optional[int] = None) -> bool:
+        "True if both rows spell the same string (same case) in columns [start, end]"
+        if self.lower is not None and (self.lowercase(start, end, rows=int(row1)) != self.lowercase(start, end, rows=int(row2))).any():
+            return False
+        start, end = self._range(start, end)
+        diff = self.packed[int(row1), start // 2:end // 2 + 1] ^ self.packed[int(row2), start // 2:end // 2 + 1]
+        return not _mask_edges(diff[np.newaxis], start, end).any()
@@ -1,5 +1,4 @@
-from Bio import AlignIO
-from collections import namedtuple
+from collections import namedtuple, defaultdict
 from pathlib import Path
 
 import numpy as np 
@@ -7,53 +6,18 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from msa import MsaContext
+from blocks.maximal_blocks.greedy_vertical_blocks import compute_vertical_blocks as vertical_blocks_msa
 from plot.scan_msa import vertical_blocks as plot_vertical_blocks
 
 
 
 def load_msa(path_msa):
-    with open(path_msa) as fp:
-        msa = AlignIO.read(fp, "fasta")
-    return msa
+    return MsaContext.from_fasta(path_msa)
 
 def compute_vertical_blocks(msa, threshold_vertical_blocks=1):
     "Compute maximal blocks in a submsa"
-
-    # info subMSA
-    n_cols=msa.get_alignment_length()
-    n_seqs=len(msa)
-
-    vertical_blocks = []
-    
-    chars_block = []
-    start_col = 0
-    for col in range(n_cols):
-        chars_col = msa[:,col]
-        chars_col = list(set(chars_col))
-
-        if len(chars_col) == 1: 
-            chars_block.append(chars_col[0])
-
-        else:
-            
-            if len(chars_block)>= threshold_vertical_blocks:
-                end_col = col-1 # end column is included
-                vertical_blocks.append(
-                    (list(range(n_seqs)), start_col, end_col, "".join(chars_block))
-                )
-        
-            start_col = col+1 # update starting column for the next iteration
-            # update initial values for a new block
-            chars_block = []
-        
-    # special case for block ending in the last column
-    if len(chars_block)>= threshold_vertical_blocks:
-        end_col = col # end column is included
-        vertical_blocks.append(
-            (list(range(n_seqs)), start_col, end_col, "".join(chars_block))
-        )
-
-    return vertical_blocks
+    return vertical_blocks_msa(msa, threshold_vertical_blocks=threshold_vertical_blocks)
 
 def compute_submsas(vertical_blocks, msa):
     SM = namedtuple("SubMSA",["start","end","nrows","ncols"])
@@ -92,42 +56,98 @@ def compute_submsas(vertical_blocks, msa):
     return submsas
 
 def collect_info_breakpoints(msa, vertical_blocks):
+    """For each alpha, longest subMSA and number of subMSAs obtained by splitting the MSA with vertical blocks
+    of length at least alpha. 'alpha_breakpoints' are the values of alpha where the longest subMSA changes.
 
+    Instead of computing the subMSAs again for each alpha, vertical blocks are removed in increasing order of length
+    and the two subMSAs around each removed block are merged (linked list of the blocks sorted by position).
+    Merging never shortens a subMSA, so the longest one is a running maximum.
+    """
     ncols=msa.get_alignment_length()
     nrows=len(msa)
 
-    submsas = [1,2]
-    alpha = 1
-
     info = []
-    longest_submsa = 0
     alpha_breakpoints = []
-    while len(submsas) > 1:
-        
-        blocks_alpha = [b for b in vertical_blocks if b[2]-b[1]+1 >= alpha]
-        if len(blocks_alpha) == 0: 
+    if len(vertical_blocks) == 0:
+        info.append(
+                dict(alpha=1, longest_submsa=ncols, blocks_longest_submsa=[[range(nrows),0,ncols-1,""]], n_submsas=1)
+            )
+        alpha_breakpoints.append(1)
+        return info, alpha_breakpoints
+
+    rows_blocks = vertical_blocks[0][0]
+    blocks = sorted(vertical_blocks, key=lambda b: (b[1],b[2]))
+    n_blocks = len(blocks)
+
+    # linked list of blocks sorted by position, with auxiliar blocks at both ends (indices 0 and n_blocks+1)
+    start = [-1] + [b[1] for b in blocks] + [ncols]
+    end = [-1] + [b[2] for b in blocks] + [ncols]
+    prev_block = list(range(-1, n_blocks + 1))
+    next_block = list(range(1, n_blocks + 3))
+    
+    # the subMSA after each block is identified by the block, grouped by number of columns
+    submsas_by_ncols = defaultdict(set)
+    def is_submsa(left):
+        "subMSA between the block 'left' and the next one. At both ends, only if it has at least one column"
+        right = next_block[left]
+        return (0 < left and right <= n_blocks) or end[left] + 1 <= start[right] - 1 
+    
+    def ncols_submsa(left):
+        return start[next_block[left]] - end[left] - 1
+
+    for left in range(n_blocks + 1):
+        if is_submsa(left):
+            submsas_by_ncols[ncols_submsa(left)].add(left)
+    n_submsas = sum(len(submsas) for submsas in submsas_by_ncols.values())
+    # the merged subMSA is longer than both subMSAs, so the longest one can only increase
+    longest_submsa_alpha = max(submsas_by_ncols)
+
+    # blocks are removed when alpha is larger than their length
+    order = sorted(range(1, n_blocks + 1), key=lambda b: end[b] - start[b] + 1)
+    n_removed = 0
+
+    alpha = 1
+    longest_submsa = 0
+    blocks_longest_submsa = None
+    while True:
+        # remove blocks shorter than alpha, merging the subMSAs at both sides
+        changed = False
+        while n_removed < n_blocks and end[order[n_removed]] - start[order[n_removed]] + 1 < alpha:
+            block = order[n_removed]
+            left = prev_block[block]
+            for b in (left, block):
+                if is_submsa(b):
+                    submsas_by_ncols[ncols_submsa(b)].discard(b)
+                    n_submsas -= 1
+            next_block[left], prev_block[next_block[block]] = next_block[block], left
+            if is_submsa(left):
+                submsas_by_ncols[ncols_submsa(left)].add(left)
+                n_submsas += 1
+                longest_submsa_alpha = max(longest_submsa_alpha, ncols_submsa(left))
+            n_removed += 1
+            changed = True
+
+        if n_removed == n_blocks: 
             info.append(
                     dict(alpha=alpha, longest_submsa=ncols, blocks_longest_submsa=[[range(nrows),0,ncols-1,""]], n_submsas=1)
                 )
             alpha_breakpoints.append(alpha)
             break
-        submsas = compute_submsas(vertical_blocks=blocks_alpha, msa=msa)
 
-        # 4. get the longest subMSA
-        longest_submsa_alpha = max([submsa.ncols for submsa in submsas])
-        blocks_longest_submsa = []
-        for submsa in submsas:
-            if submsa.ncols == longest_submsa_alpha:
-                blocks_longest_submsa.append([blocks_alpha[0][0], submsa.start, submsa.end,""])
+        # get the longest subMSA
+        if changed or blocks_longest_submsa is None:
+            blocks_longest_submsa = [[rows_blocks, end[left] + 1, start[next_block[left]] - 1,""] 
+                                     for left in sorted(submsas_by_ncols[longest_submsa_alpha], key=lambda left: start[left])]
 
         if longest_submsa_alpha > longest_submsa:
             longest_submsa = longest_submsa_alpha
             alpha_breakpoints.append(alpha)
-        
 
         info.append(
-            dict(alpha=alpha, longest_submsa=longest_submsa_alpha, blocks_longest_submsa=blocks_longest_submsa, n_submsas=len(submsas))
+            dict(alpha=alpha, longest_submsa=longest_submsa_alpha, blocks_longest_submsa=blocks_longest_submsa, n_submsas=n_submsas)
         )
+        if n_submsas <= 1:
+            break
         alpha+=1
 
     return info, alpha_breakpoints
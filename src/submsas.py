@@ -2,23 +2,48 @@
 import json
 import logging
 import argparse 
+import numpy as np
 from pathlib import Path
-from Bio import AlignIO
+from msa import MsaContext
 
 
-def info_msa(filename):
-    "Return MSA from start_column to end_column (both included)"
+def info_msa(filename, cache_dir=None):
+    "Return number of rows and columns of the MSA"
     # load MSA
-    msa = AlignIO.read(filename, "fasta")
-    ncols = msa.get_alignment_length()
-    nrows = len(msa)
-    return nrows, ncols
+    msa = MsaContext.load(filename, cache_dir=cache_dir)
+    return msa.nrows, msa.ncols
 
-def split_submsa(max_positions_msa, nrows, start_column, end_column):
+# subMSAs longer than the maximum are cut at the columns crossed by the fewest blocks,
+# each cut is searched around the balanced position, with this tolerance on the predicted size of the piece
+BALANCE_TOLERANCE = 0.25
+CHUNK_POSITIONS = 1 << 22 # number of positions of the MSA processed at once to compute the crossing profile
+
+def crossing_profile(msa, start_column, end_column):
+    """Number of groups of (at least 2) rows with the same characters in columns c and c+1, for each
+    c in [start_column, end_column-1]. It is a lower bound of the number of maximal blocks crossing
+    the boundary between both columns"""
+    profile = np.zeros(end_column - start_column, dtype=np.int64)
+    chunk_cols = max(CHUNK_POSITIONS // msa.nrows, 2)
+    for chunk_start in range(start_column, end_column, chunk_cols - 1):
+        chunk_end = min(chunk_start + chunk_cols - 1, end_column)
+        cols = msa.cols(chunk_start, chunk_end).astype(np.uint16)
+        # each pair of consecutive characters as one code, rows with the same code are consecutive after sorting
+        pairs = np.sort((cols[:, :-1] << 4) | cols[:, 1:], axis=0)
+        equal_next = pairs[1:] == pairs[:-1]
+        first_in_group = equal_next.copy()
+        first_in_group[1:] &= ~equal_next[:-1]
+        profile[chunk_start - start_column:chunk_end - start_column] = first_in_group.sum(axis=0)
+    return profile
+
+def split_submsa(max_positions_msa, nrows, start_column, end_column, msa=None):
     """Divide a subMSA in smaller subMSAs based on the number of positions it can have given by
-    max_positions_msa. Returns a list with new subMSAs
+    max_positions_msa. Returns a list with new subMSAs.
+    If the MSA is given, cuts are placed where the fewest blocks are crossed, see split_submsa_by_crossings
     """
     cols_submsa = max_positions_msa // nrows
+    if msa is not None and end_column - start_column + 1 > cols_submsa > 0:
+        return split_submsa_by_crossings(msa, cols_submsa, start_column, end_column)
+
     end_submsa = 0 
     start_end = []
 
@@ -27,7 +52,7 @@ def split_submsa(max_positions_msa, nrows, start_column, end_column):
         end_submsa = start_submsa + cols_submsa - 1 
         if end_submsa > end_column:
             end_submsa = end_column
-        print(start_submsa, end_submsa)
+        logging.debug(f"{start_submsa} {end_submsa}")
         start_end.append(
             [start_submsa, end_submsa]
         )
@@ -35,6 +60,93 @@ def split_submsa(max_positions_msa, nrows, start_column, end_column):
         start_submsa = end_submsa + 1 
 
     return start_end
+
+def split_submsa_by_crossings(msa, cols_submsa, start_column, end_column):
+    """Divide a subMSA in subMSAs with at most cols_submsa columns (hard cap).
+    Pieces are expected to have (1-BALANCE_TOLERANCE)*cols_submsa columns, leaving room to move the cuts.
+    Each cut is placed at the column boundary crossed by the fewest groups of rows (crossing_profile)
+    among the positions where the predicted size of the ILP of the piece (columns + crossings) is
+    balanced w.r.t. the remaining pieces"""
+    ncols = end_column - start_column + 1
+    n_submsas = -(-ncols // max(int((1 - BALANCE_TOLERANCE) * cols_submsa), 1))
+    profile = crossing_profile(msa, start_column, end_column)
+    # predicted size of the ILP up to each column (included)
+    cumulative_size = np.cumsum(1 + np.concatenate(([0], profile)))
+
+    start_end = []
+    start = 0 # w.r.t. start_column
+    for remaining in range(n_submsas, 1, -1):
+        # last column of the piece, the remaining pieces must fit in the cap
+        lowest_end = max(start, ncols - 1 - (remaining - 1) * cols_submsa)
+        highest_end = min(start + cols_submsa - 1, ncols - remaining)
+
+        size_before = cumulative_size[start - 1] if start > 0 else 0
+        piece_size = (cumulative_size[-1] - size_before) / remaining
+        target_end = int(np.searchsorted(cumulative_size, size_before + piece_size))
+        window_start = int(np.searchsorted(cumulative_size, size_before + (1 - BALANCE_TOLERANCE) * piece_size))
+        window_end = int(np.searchsorted(cumulative_size, size_before + (1 + BALANCE_TOLERANCE) * piece_size))
+        window_start, window_end = max(window_start, lowest_end), min(window_end, highest_end)
+        if window_start > window_end:
+            window_start, window_end = lowest_end, highest_end
+        target_end = min(max(target_end, window_start), window_end)
+
+        # fewest crossings, ties broken by the closest column to the balanced cut
+        crossings = profile[window_start:window_end + 1]
+        candidates = window_start + np.flatnonzero(crossings == crossings.min())
+        end = int(candidates[np.argmin(np.abs(candidates - target_end))])
+        logging.debug(f"cut {start_column + end}|{start_column + end + 1}, blocks crossed {profile[end]}")
+        start_end.append([start_column + start, start_column + end])
+        start = end + 1
+    start_end.append([start_column + start, end_column])
+    return start_end
+
+def submsa_index(vertical_blocks, nrows, ncols, max_positions_msa, threshold_vertical_blocks=1, msa=None):
+    """Return a list with starting and ending column for each subMSA, 
+    those are the positions in between vertical blocks with length at least threshold_vertical_blocks.
+    If the MSA is given, long subMSAs are split where the fewest blocks are crossed"""
+    vertical_blocks = [vb for vb in vertical_blocks if vb[2]-vb[1]+1 >= threshold_vertical_blocks] 
+
+    if len(vertical_blocks) == 0:
+        start = 0 # start MSA  
+        end   = -1 # end MSA 
+        logging.info(f"No Vertical Blocks {start} {end}")
+        return [[start, end]]
+
+    # sort vertical blocks by starting position
+    vertical_blocks = sorted(vertical_blocks, key=lambda b: (b[1],b[2]))
+
+    # Include auxiliar first and last block if needed
+    first_vb = vertical_blocks[0]
+    if first_vb[1] > 0:
+        vertical_blocks.insert(0, [[],-1,-1,"N"])
+    
+    last_vb = vertical_blocks[-1]
+    if last_vb[2] < ncols-1: 
+        vertical_blocks.append([[],ncols,ncols,"N"])
+    
+    pairs_blocks = zip(vertical_blocks[:-1], vertical_blocks[1:])
+
+    # starting and ending positions for each subMSA
+    index = []
+    for j, pair in enumerate(pairs_blocks):
+        left_block, right_block = pair
+
+        start = left_block[2] + 1 # start submsa = end of left block + 1  
+        end   = right_block[1] - 1 # end submsa = start of right block - 1
+
+        submsas = split_submsa(max_positions_msa=max_positions_msa, nrows=nrows, start_column=start, end_column=end, msa=msa)
+        for submsa in submsas:
+            _start, _end = submsa
+            logging.info(f"Vertical Block {left_block[1:3]} {right_block[1:3]} {_start} {_end}")
+            index.append([_start, _end])
+    return index
+
+def save_submsa_index(index, output):
+    "Save the starting and ending column of each subMSA, one per line"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as fp: 
+        for start, end in index:
+            fp.writelines(f"{start}\t{end}\n")
     
 if __name__=="__main__":
     """
@@ -52,6 +164,7 @@ if __name__=="__main__":
     parser.add_argument("--max-positions-submsas", help="subMSAs with more than this number of positions will be divided into \
                         smaller subMSAs", type=int, dest="max_positions_msa", default=100000)
     parser.add_argument("--log-level", default='ERROR', help="set log level (ERROR/WARNING/INFO/DEBUG). Default ERROR", dest="log_level")
+    parser.add_argument("--msa-cache-dir", help="directory to cache the encoded MSA, shared by all stages of the pipeline", dest="msa_cache_dir", default=None)
     args = parser.parse_args()
 
     logging.basicConfig(level=args.log_level,
@@ -59,50 +172,12 @@ if __name__=="__main__":
                     datefmt='%Y-%m-%d@%H:%M:%S')
     logging.info(f"filename MSA: '{args.path_msa}'")
     logging.info(f"filename vertical blocks: '{args.path_vertical_blocks}'") 
-    # logging.info(f"subMSA columns [start, end] = {[args.start_column, args.end_column]}")
-    # logging.info(f"Output only vertical blocks = {args.only_vertical}")
-    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
 
     with open(args.path_vertical_blocks, "r") as fp:
-        vertical_blocks = [vb for vb in json.load(fp) if vb[2]-vb[1]+1 >= args.threshold_vertical_blocks] 
-
-    nrows, ncols = info_msa(args.path_msa)
+        vertical_blocks = json.load(fp)
 
-    if len(vertical_blocks) == 0:
-        
-        with open(args.output, "w") as fp: 
-            
-            start = 0 # start MSA  
-            end   = -1 # end MSA 
-            logging.info("No Vertical Blocks", start, end)
-            fp.writelines(f"{start}\t{end}\n")
+    msa = MsaContext.load(args.path_msa, cache_dir=args.msa_cache_dir)
 
-    else:   
-        # sort vertical blocks by starting position
-        vertical_blocks = sorted(vertical_blocks, key=lambda b: (b[1],b[2]))
-
-        # Include auxiliar first and last block if needed
-        first_vb = vertical_blocks[0]
-        if first_vb[1] > 0:
-            vertical_blocks.insert(0, [[],-1,-1,"N"])
-        
-        last_vb = vertical_blocks[-1]
-        if last_vb[2] < ncols-1: 
-            vertical_blocks.append([[],ncols,ncols,"N"])
-        
-        pairs_blocks = zip(vertical_blocks[:-1], vertical_blocks[1:])
-    
-        # save starting and ending positions for each subMSA
-        with open(args.output, "w") as fp: 
-            for j, pair in enumerate(pairs_blocks):
-                left_block, right_block = pair
-
-                start = left_block[2] + 1 # start submsa = end of left block + 1  
-                end   = right_block[1] - 1 # end submsa = start of right block - 1
-
-                submsas = split_submsa(max_positions_msa=args.max_positions_msa, nrows=nrows, start_column=start, end_column=end)
-                for submsa in submsas:
-                    _start, _end = submsa
-                    logging.info("Vertical Block",left_block, right_block, _start, _end)
-        
-                    fp.writelines(f"{_start}\t{_end}\n")
\ No newline at end of file
+    index = submsa_index(vertical_blocks, msa.nrows, msa.ncols, 
+                         max_positions_msa=args.max_positions_msa, threshold_vertical_blocks=args.threshold_vertical_blocks, msa=msa)
+    save_submsa_index(index, args.output)
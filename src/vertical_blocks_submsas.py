@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Compute vertical blocks and the subMSA index for several thresholds (alpha) of vertical blocks,
+loading and scanning the MSA only once.
+Outputs are the same as running greedy_vertical_blocks.py and submsas.py for each alpha.
+"""
+import json
+import logging
+import argparse
+from pathlib import Path
+
+from msa import MsaContext
+from blocks.maximal_blocks.greedy_vertical_blocks import vertical_blocks_by_alpha
+from submsas import submsa_index, save_submsa_index
+
+if __name__=="__main__":
+    # Command line options
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", help="MSA filename")
+    parser.add_argument("--alphas", help="thresholds of vertical blocks, vertical blocks with length at least the threshold will be considered to split the MSA",
+                        type=int, nargs="+", dest="alphas", default=[1])
+    parser.add_argument("--output-vertical-blocks", help="json file to save vertical blocks, '{alpha}' is replaced by each threshold", dest="output_vertical_blocks")
+    parser.add_argument("--output-submsa-index", help="file .txt to save the subMSA index, '{alpha}' is replaced by each threshold", dest="output_submsa_index")
+    parser.add_argument("--max-positions-submsas", help="subMSAs with more than this number of positions will be divided into \
+                        smaller subMSAs", type=int, dest="max_positions_msa", default=100000)
+    parser.add_argument("--log-level", default='ERROR', help="set log level (ERROR/WARNING/INFO/DEBUG)", dest="log_level")
+    parser.add_argument("--msa-cache-dir", help="directory to cache the encoded MSA, shared by all stages of the pipeline", dest="msa_cache_dir", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level,
+                    format='[vertical_blocks_submsas] %(asctime)s.%(msecs)03d | %(message)s',
+                    datefmt='%Y-%m-%d@%H:%M:%S', force=True) # blocks package sets its own logging config on import
+    logging.info(f"filename MSA: '{args.filename}'")
+    logging.info(f"thresholds vertical blocks: {args.alphas}")
+
+    msa = MsaContext.load(args.filename, cache_dir=args.msa_cache_dir)
+    blocks_by_alpha = vertical_blocks_by_alpha(msa, alphas=args.alphas)
+
+    for alpha, vertical_blocks in blocks_by_alpha.items():
+        logging.info(f"alpha {alpha}: number of vertical blocks {len(vertical_blocks)}")
+
+        if args.output_vertical_blocks:
+            output = Path(args.output_vertical_blocks.format(alpha=alpha))
+            output.parent.mkdir(parents=True, exist_ok=True)
+            with open(output, "w") as fp:
+                json.dump(vertical_blocks, fp,)
+
+        if args.output_submsa_index:
+            index = submsa_index(vertical_blocks, msa.nrows, msa.ncols, max_positions_msa=args.max_positions_msa, msa=msa)
+            save_submsa_index(index, args.output_submsa_index.format(alpha=alpha))